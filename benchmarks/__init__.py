@@ -0,0 +1,57 @@
+"""性能基准
+
+每个基准是一个函数 ``setup(rows) -> (run, n)``：setup 阶段准备输入，
+``run()`` 是被计时的热路径，n 是它处理的行数。
+
+运行::
+
+    python -m benchmarks.bench_parse --rows 5000
+"""
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Callable
+from typing import Dict
+from typing import Tuple
+
+__all__ = ("register", "main")
+
+Setup = Callable[[int], Tuple[Callable[[], object], int]]
+
+
+def register(registry: Dict[str, Setup], name: str):
+    "将基准注册到 registry"
+    def deco(setup: Setup) -> Setup:
+        registry[name] = setup
+        return setup
+
+    return deco
+
+
+def measure(setup: Setup, rows: int, repeat: int) -> Tuple[float, float, int]:
+    "返回 (行/秒, 峰值内存 MiB, 行数)，计时取多次中的最好成绩"
+    run, n = setup(rows)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n / best, peak / 2**20, n
+
+
+def main(registry: Dict[str, Setup], prog: str):
+    parser = ArgumentParser(prog, description="输出每个基准的吞吐量与峰值内存")
+    parser.add_argument("--rows", help="合成数据的行数", type=int, default=2000)
+    parser.add_argument("--repeat", help="计时重复次数", type=int, default=3)
+    parser.add_argument("only", help="只运行名字包含这些字符串的基准", nargs="*")
+    args = parser.parse_args()
+    print(f"{'benchmark':<32}{'rows':>10}{'rows/s':>14}{'peak MiB':>12}")
+    for name, setup in registry.items():
+        if args.only and not any(s in name for s in args.only):
+            continue
+        speed, peak, n = measure(setup, args.rows, args.repeat)
+        print(f"{name:<32}{n:>10}{speed:>14.0f}{peak:>12.2f}")
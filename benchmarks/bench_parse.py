@@ -0,0 +1,159 @@
+"""解析与导出热路径的基准"""
+import json
+import random
+import tempfile
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from cli_cqu.data.parser import parse_transcript
+from cli_cqu.data.parser import parse_transcript_tree
+from cli_cqu.data.route import parse_personal_courses_table
+from cli_cqu.data.route import parse_whole_assignment
+from cli_cqu.data.schedule import ShaPingBaSchedule
+from cli_cqu.model import Course
+from cli_cqu.model import ExperimentCourse
+from cli_cqu.util.calendar import make_ical
+from cli_cqu.util.calendar import write_ical
+from cli_cqu.util.datetime import materialize_calendar
+from cli_cqu.util.datetime import materialize_calendars
+from cli_cqu.util.gpa import TranscriptTable
+from cli_cqu.util.snapshot import Snapshot
+from cli_cqu.util.snapshot import write_snapshot
+from cli_cqu.util.stream import parse_html
+from tests.fixtures import synth_courses_table
+from tests.fixtures import synth_transcript
+
+from . import main
+from . import register
+
+BENCHMARKS = {}
+
+
+def _courses_page(rows: int) -> str:
+    return synth_courses_table(rows - rows // 4, rows // 4)
+
+
+@register(BENCHMARKS, "courses_table[bs4]")
+def bench_courses_bs4(rows):
+    text = _courses_page(rows)
+    return lambda: parse_personal_courses_table(text, "bs4"), rows
+
+
+@register(BENCHMARKS, "courses_table[lxml]")
+def bench_courses_lxml(rows):
+    text = _courses_page(rows)
+    return lambda: parse_personal_courses_table(text, "lxml"), rows
+
+
+@register(BENCHMARKS, "courses_table[lxml,compact]")
+def bench_courses_compact(rows):
+    text = _courses_page(rows)
+    return lambda: parse_personal_courses_table(text, "lxml", compact=True), rows
+
+
+@register(BENCHMARKS, "whole_assignment[bs4]")
+def bench_transcript_bs4(rows):
+    text = synth_transcript(rows)
+    return lambda: parse_whole_assignment(text, "bs4"), rows
+
+
+@register(BENCHMARKS, "whole_assignment[lxml]")
+def bench_transcript_lxml(rows):
+    text = synth_transcript(rows)
+    return lambda: parse_whole_assignment(text, "lxml"), rows
+
+
+def _response(body: bytes) -> Response:
+    "尚未读取响应体的 Response，相当于 stream=True 的请求"
+    resp = Response()
+    resp.status_code = 200
+    resp.headers = CaseInsensitiveDict({"Content-Type": "text/html"})
+    resp.raw = BytesIO(body)
+    return resp
+
+
+@register(BENCHMARKS, "whole_assignment[content]")
+def bench_transcript_content(rows):
+    # 读取完整的 content 再整体 decode，同时持有 bytes、str 和树
+    body = synth_transcript(rows).encode("gbk")
+    return lambda: parse_transcript(_response(body).content.decode("gbk")), rows
+
+
+@register(BENCHMARKS, "whole_assignment[stream]")
+def bench_transcript_stream(rows):
+    body = synth_transcript(rows).encode("gbk")
+    return lambda: parse_transcript_tree(parse_html(_response(body), "gbk")), rows
+
+
+@register(BENCHMARKS, "transcript_stats")
+def bench_transcript_stats(rows):
+    # 每份成绩单 50 门课程
+    transcripts = [parse_whole_assignment(synth_transcript(50, seed=i, student_id=str(i))) for i in range(rows // 50)]
+    return lambda: TranscriptTable.from_transcripts(transcripts).summarize(("student", "category")), rows
+
+
+@register(BENCHMARKS, "make_ical")
+def bench_make_ical(rows):
+    courses = parse_personal_courses_table(_courses_page(rows))
+    return lambda: make_ical(courses, date(2020, 2, 17)).to_ical(), rows
+
+
+@register(BENCHMARKS, "write_ical")
+def bench_write_ical(rows):
+    courses = parse_personal_courses_table(_courses_page(rows))
+    return lambda: write_ical(courses, date(2020, 2, 17), ShaPingBaSchedule(), BytesIO()), rows
+
+
+def _lesson_pairs(rows: int):
+    courses = parse_personal_courses_table(_courses_page(rows), compact=True)
+    return [(c.week_schedule.split("-")[0].split(",")[0], c.day_schedule) for c in courses]
+
+
+@register(BENCHMARKS, "materialize_calendar")
+def bench_materialize(rows):
+    pairs = _lesson_pairs(rows)
+    return lambda: [materialize_calendar(w, l, date(2020, 2, 17)) for w, l in pairs], rows
+
+
+@register(BENCHMARKS, "materialize_calendars")
+def bench_materialize_batch(rows):
+    pairs = _lesson_pairs(rows)
+    return lambda: materialize_calendars(pairs, date(2020, 2, 17)), rows
+
+
+def _cohort(rows: int):
+    "每名学生每学期 12 门课程，取自同一批教学班的 (学号, 学年学期, 课程) 序列"
+    sections = parse_personal_courses_table(_courses_page(max(rows // 20, 12)))
+    rnd = random.Random(0)
+    return [(str(i // 2), f"学期{i % 2}", [c.dict() for c in rnd.sample(sections, 12)]) for i in range(rows // 12)]
+
+
+@register(BENCHMARKS, "cohort[json]")
+def bench_cohort_json(rows):
+    # 每名学生一份缩进的 courses-json 导出
+    files = {}
+    for student, semester, courses in _cohort(rows):
+        files.setdefault(student, {})[semester] = courses
+    texts = [json.dumps(data, indent=2, ensure_ascii=False) for data in files.values()]
+
+    def run():
+        return [[(ExperimentCourse if "project_name" in c else Course)(**c) for c in table]
+                for text in texts for table in json.loads(text).values()]
+
+    return run, rows // 12 * 12
+
+
+@register(BENCHMARKS, "cohort[snapshot]")
+def bench_cohort_snapshot(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_snapshot(Path(tmp) / "cohort.snap", _cohort(rows))
+        data = (Path(tmp) / "cohort.snap").read_bytes()
+    return lambda: [list(table) for table in Snapshot(data).tables()], rows // 12 * 12
+
+
+if __name__ == "__main__":
+    main(BENCHMARKS, "python -m benchmarks.bench_parse")
@@ -0,0 +1,249 @@
+"""针对本地 mock 服务器的压力测试
+
+启动 cli_cqu.mock 服务器，用不同的方式并发登录多个帐号，报告每秒登录数与延迟分位数::
+
+    python -m benchmarks.load --users 200 --concurrency 32 --mode app
+    python -m benchmarks.load --users 200 --mode aio --courses
+    python -m benchmarks.load --users 64 --mode batch --processes 4 --latency 0.02 --error-rate 0.01
+
+mode:
+
+- app：线程池中逐个构造 App（完整登录），--courses 时再获取一学期课表
+- app-legacy：与 app 相同，但使用原来的登录流程（固定等待 680 ms、每次获取并用 bs4 解析登录表单），作为对照
+- aio：cli_cqu.aio.AsyncClient，登录并获取课表
+- batch：cli_cqu.batch.run_batch，在进程池中执行 courses-json 任务
+
+默认放开 jxgl、oldjw 的限速以测量吞吐上限，--rate 给出时按该速率限速。
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from cli_cqu.mock import MockConfig
+from cli_cqu.mock import MockServer
+from cli_cqu.util.scheduler import SCHEDULER
+
+__all__ = ("percentile", "run_load", "main")
+
+PASSWORD = "123456"
+
+
+def percentile(values: List[float], p: float) -> float:
+    "最近秩法的第 p 百分位数"
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    # 秩为 ceil(p / 100 * n)，p 为 0 时取最小值
+    k = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+def _timed(func: Callable[[], object]) -> Tuple[float, Exception]:
+    t0 = time.perf_counter()
+    try:
+        func()
+        return time.perf_counter() - t0, None
+    except Exception as err:
+        return time.perf_counter() - t0, err
+
+
+def load_app(users: List[str], concurrency: int, courses: bool) -> List[Tuple[float, Exception]]:
+    from cli_cqu.app import App
+    from cli_cqu.util.login import DSafeWait
+    # 与 daemon 一样在进程内登录很多次，探测更短的 DSafeId 等待
+    wait = DSafeWait()
+
+    def one(username: str):
+        app = App(username, PASSWORD, dsafe_wait=wait)
+        if courses:
+            app.courses_by_semester("0", workers=1)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda u: _timed(lambda: one(u)), users))
+
+
+def legacy_login(username: str, password: str):
+    "原来 App.__login 的流程，只用于对照"
+    from bs4 import BeautifulSoup
+    from cli_cqu.data import HOST
+    from cli_cqu.data.js_equality import chkpwd
+    from cli_cqu.data.route import Route
+    from cli_cqu.util.http import make_session
+    s = make_session()
+    url = f"{HOST.PREFIX}{Route.home}"
+    m = re.search(r"(?<=document.cookie=')DSafeId=([A-Z0-9]+);(?=';)", s.get(url).text)
+    if m:
+        s.cookies.set("DSafeId", m[1])
+        time.sleep(0.680)
+        new_cookie = s.get(url).headers.get("set-cookie")
+        s.cookies.set("ASP.NET_SessionId", re.search("(?<=ASP.NET_SessionId=)([a-zA-Z0-9]+)(?=;)", new_cookie)[1])
+        s.cookies.set("_D_SID", re.search("(?<=_D_SID=)([A-Z0-9]+)(?=;)", new_cookie)[1])
+    url = f"{HOST.PREFIX}{Route.index_login}"
+    html = BeautifulSoup(s.get(url).text, "lxml")
+    login_form = {
+        "__VIEWSTATE": html.select_one("#Logon > input[name=__VIEWSTATE]")["value"],
+        "__VIEWSTATEGENERATOR": html.select_one("#Logon > input[name=__VIEWSTATEGENERATOR]")["value"],
+        "Sel_Type": "STU",
+        "txt_dsdsdsdjkjkjc": username,
+        "txt_dsdfdfgfouyy": "",
+        "txt_ysdsdsdskgf": "",
+        "pcInfo": "",
+        "typeName": "",
+        "aerererdsdxcxdfgfg": "",
+        "efdfdfuuyyuuckjg": chkpwd(username, password),
+    }
+    page = s.post(url, data=login_form)
+    page.encoding = "gbk"
+    if "正在加载权限数据..." not in page.text:
+        raise ValueError("登录失败")
+
+
+def load_app_legacy(users: List[str], concurrency: int) -> List[Tuple[float, Exception]]:
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda u: _timed(lambda: legacy_login(u, PASSWORD)), users))
+
+
+def load_aio(users: List[str], concurrency: int, courses: bool) -> List[Tuple[float, Exception]]:
+    from cli_cqu.aio import AsyncClient
+
+    async def run():
+        async with AsyncClient(limit_per_host=concurrency) as client:
+
+            async def one(username: str):
+                t0 = time.perf_counter()
+                try:
+                    if courses:
+                        await client.courses_table(username, PASSWORD)
+                    else:
+                        await client.login(username, PASSWORD)
+                    return time.perf_counter() - t0, None
+                except Exception as err:
+                    return time.perf_counter() - t0, err
+
+            return await asyncio.gather(*(one(u) for u in users))
+
+    return asyncio.run(run())
+
+
+def load_batch(users: List[str], processes: int) -> List[Tuple[float, Exception]]:
+    from cli_cqu.batch import run_batch
+    with tempfile.TemporaryDirectory() as tmp:
+        # 任务会保存登录会话，不要写进用户的缓存目录
+        os.environ["XDG_CACHE_HOME"] = tmp
+        jobs = [{
+            "id": u,
+            "username": u,
+            "password": PASSWORD,
+            "command": "courses-json",
+            "semester": 0,
+            "output": os.path.join(tmp, u),
+        } for u in users]
+        return [(r["elapsed"], None if r["ok"] else RuntimeError(r["error"]))
+                for r in run_batch(jobs, os.path.join(tmp, "logs"), processes)]
+
+
+def run_load(mode: str = "app",
+             users: int = 100,
+             concurrency: int = 16,
+             processes: int = None,
+             courses: bool = False,
+             rate: float = None,
+             config: MockConfig = MockConfig()) -> Dict[str, object]:
+    """启动 mock 服务器并执行一轮压力测试，返回报告
+
+    报告字段：mode、users、ok、failed、seconds、logins_per_second、p50、p99（秒）、errors（前几个错误）、
+    server（mock 服务器计数）、scheduler（调度器计数的增量）
+    """
+    accounts = [f"2017{i:04d}" for i in range(users)]
+    with MockServer(config) as server:
+        # 结束后恢复调度器原来的限速
+        rates = {host: SCHEDULER.rates.get(host) for host in server.hosts()}
+        for host in server.hosts():
+            SCHEDULER.set_rate(host, (rate, rate * 2) if rate else (1e9, 1e9))
+        # 批量任务的子进程沿用本进程的 HOST_OVERRIDES，load_batch 会改写缓存目录
+        env = {k: os.environ.get(k) for k in ("XDG_CACHE_HOME", )}
+        before = SCHEDULER.stats()
+        t0 = time.perf_counter()
+        try:
+            if mode == "app":
+                results = load_app(accounts, concurrency, courses)
+            elif mode == "app-legacy":
+                results = load_app_legacy(accounts, concurrency)
+            elif mode == "aio":
+                results = load_aio(accounts, concurrency, courses)
+            elif mode == "batch":
+                results = load_batch(accounts, processes)
+            else:
+                raise ValueError(f"未知的模式 {mode}")
+        finally:
+            for k, v in env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+            for host, r in rates.items():
+                SCHEDULER.set_rate(host, r)
+        seconds = time.perf_counter() - t0
+        after = SCHEDULER.stats()
+        server_stats = server.stats()
+    latencies = [t for t, err in results if err is None]
+    errors = [f"{type(err).__name__}: {err}" for _, err in results if err is not None]
+    return {
+        "mode": mode,
+        "users": users,
+        "ok": len(latencies),
+        "failed": len(errors),
+        "seconds": round(seconds, 3),
+        "logins_per_second": round(len(latencies) / seconds, 2),
+        "p50": round(percentile(latencies, 50), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "errors": errors[:5],
+        "server": server_stats,
+        "scheduler": {k: round(after[k] - before[k], 3) for k in after},
+    }
+
+
+def main():
+    parser = ArgumentParser("python -m benchmarks.load", description="针对本地 mock 服务器的压力测试")
+    parser.add_argument("--mode", choices=("app", "app-legacy", "aio", "batch"), default="app")
+    parser.add_argument("--users", help="帐号数", type=int, default=100)
+    parser.add_argument("--concurrency", help="app、aio 模式的并发数", type=int, default=16)
+    parser.add_argument("--processes", help="batch 模式的进程数", type=int, default=None)
+    parser.add_argument("--courses", help="登录后再获取一学期课表", action="store_true")
+    parser.add_argument("--rate", help="每个主机每秒请求数，默认不限速", type=float, default=None)
+    parser.add_argument("--dsafeid-wait", type=float, default=MockConfig._field_defaults["dsafeid_wait"])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="以 JSON 输出报告", action="store_true")
+    args = parser.parse_args()
+    config = MockConfig(dsafeid_wait=args.dsafeid_wait,
+                        latency=args.latency,
+                        jitter=args.jitter,
+                        error_rate=args.error_rate,
+                        drop_rate=args.drop_rate)
+    report = run_load(args.mode, args.users, args.concurrency, args.processes, args.courses, args.rate, config)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(f"{report['mode']}: {report['ok']}/{report['users']} 成功，用时 {report['seconds']} 秒")
+    print(f"logins/s {report['logins_per_second']}  p50 {report['p50'] * 1e3:.1f} ms  p99 {report['p99'] * 1e3:.1f} ms")
+    print(f"server {report['server']}")
+    print(f"scheduler {report['scheduler']}")
+    for err in report["errors"]:
+        print(f"  {err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,195 +1,20 @@
 """CLI CQU 是重庆大学教务系统的命令行界面
+
+为了加快启动速度，导入本包时不会加载 requests、bs4、icalendar 等依赖，
+App 等对象在第一次访问时才从 cli_cqu.app 导入。
 """
-import json
-import logging
-import re
-import time
 from argparse import ArgumentParser
-from datetime import date
-from getpass import getpass
-
-from bs4 import BeautifulSoup
-from requests import Response
-from requests import Session
-
-from .data import HOST
-from .data.js_equality import chkpwd
-from .data.route import Parsed
-from .data.ua import UA_IE11
-from .excpetion.signal import *
-from .util.calendar import make_ical
-from .data.schedule import HuxiSchedule, ShaPingBaSchedule
+
 __version__ = '0.4.1'
 
-__all__ = ("App")
-
-
-class App:
-    def __init__(self, username: str = None, password: str = None):
-        self.username = username if username is not None else input("username> ")
-        self.password = password if password is not None else getpass("password> ").rstrip('\n')
-        self.session = Session()
-        self.session.headers.update({
-            'host': HOST.DOMAIN,
-            'connection': "keep-alive",
-            'cache-control': "max-age=0",
-            'upgrade-insecure-requests': "1",
-            'user-agent': UA_IE11,
-            'accept':
-            "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3",
-            'referer': HOST.PREFIX,
-            'accept-encoding': "gzip, deflate",
-            'accept-language': "zh-CN,zh;q=0.9",
-        })
-        self.__login()
-
-    def mainloop(self, one_cmd: str = None):
-        """命令行界面，解析指令执行对应功能"""
-        def again(one_cmd: str = None) -> str:
-            if one_cmd:
-                yield one_cmd
-            else:
-                while True:
-                    yield input("cli cqu> ").strip()
-
-        again = again(one_cmd)
-
-        for cmd in again:
-            try:
-                self.__run_cmd(cmd)
-            except SigHelp as signal:
-                show_help()
-                print(signal.args[0])
-            except SigContinue:
-                continue
-            except SigExit:
-                print("=== Bye ===")
-                return
-            except Signal as err:
-                print(f"!!! 未处理的信号 {err}，由 {cmd} 产生 !!!")
-
-    def __run_cmd(self, cmd: str):
-        """执行指令，返回控制信号
-
-        :raises Signal: 各种信号
-        """
-        if cmd == "":
-            raise SigContinue("空指令")
-        elif cmd == "exit":
-            raise SigExit("主动退出")
-        elif cmd == "?" or cmd == "h" or cmd == "help":
-            show_help()
-        elif cmd == "courses-json":
-            self.courses_json()
-        elif cmd == "courses-ical":
-            self.courses_ical()
-        else:
-            raise SigHelp(f"!!! 未处理的命令： {cmd} !!!")
-        raise SigDone
-
-    def __login(self):
-        """向主页发出请求，发送帐号密码表单，获取 cookie
-        帐号或密码错误则抛出异常
-        """
-        # 初始化 Cookie
-        url = f"{HOST.PREFIX}/home.aspx"
-        resp = self.session.get(url)
-        # fix: 偶尔不需要设置 cookie, 直接就进入主页了
-        # 这是跳转页 JavaScript 的等效代码
-        pattern = re.compile(r"(?<=document.cookie=')DSafeId=([A-Z0-9]+);(?=';)")
-        if pattern.search(resp.text):
-            first_cookie = re.search(pattern, resp.text)[1]
-            self.session.cookies.set("DSafeId", first_cookie)
-            time.sleep(0.680)
-            resp = self.session.get(url)
-            new_cookie = resp.headers.get("set-cookie", self.session.cookies.get_dict())
-            c = {
-                1: re.search("(?<=ASP.NET_SessionId=)([a-zA-Z0-9]+)(?=;)", new_cookie)[1],
-                2: re.search("(?<=_D_SID=)([A-Z0-9]+)(?=;)", new_cookie)[1]
-            }
-            self.session.cookies.set("ASP.NET_SessionId", c[1])
-            self.session.cookies.set("_D_SID", c[2])
-
-        # 发送表单
-        url = f"{HOST.PREFIX}/_data/index_login.aspx"
-        html = BeautifulSoup(self.session.get(url).text, "lxml")
-        login_form = {
-            "__VIEWSTATE": html.select_one("#Logon > input[name=__VIEWSTATE]")["value"],
-            "__VIEWSTATEGENERATOR": html.select_one("#Logon > input[name=__VIEWSTATEGENERATOR]")["value"],
-            "Sel_Type": "STU",
-            "txt_dsdsdsdjkjkjc": self.username,  # 学号
-            "txt_dsdfdfgfouyy": "",  # 密码, 实际上的密码加密后赋值给 efdfdfuuyyuuckjg
-            "txt_ysdsdsdskgf": "",
-            "pcInfo": "",
-            "typeName": "",
-            "aerererdsdxcxdfgfg": "",
-            "efdfdfuuyyuuckjg": chkpwd(self.username, self.password),
-        }
-        page_text = self.session.post(url, data=login_form).content.decode(encoding='GBK')
-        if "正在加载权限数据..." in page_text:
-            return
-        if "账号或密码不正确！请重新输入。" in page_text:
-            raise ValueError("账号或密码错误")
-        if "该账号尚未分配角色!" in page_text:
-            raise ValueError("不存在该账号")
-        else:
-            raise ValueError("意料之外的登陆返回页面")
-
-    def courses_json(self):
-        """选择课程表，下载为 JSON 文件"""
-        print("=== 下载课程表，保存为 JSON ===")
-        courses = self.__get_courses()
-        filename = input("文件名（可忽略 json 后缀）> ").strip()
-        if not filename.endswith(".json"):
-            filename = f"{filename}.json"
-        with open(filename, "wt", encoding="utf-8") as out:
-            json.dump([i.dict() for i in courses], out, indent=2, ensure_ascii=False)
-
-    def courses_ical(self):
-        "获取课程表，转化为 icalendar 格式日历日程"
-        print("=== 下载课程表，保存为 ICalendar ===")
-        print("=== 选择校区 ===")
-        print("0: 沙坪坝校区\n1: 虎溪校区")
-        schedule = ShaPingBaSchedule() if input('选择校区[0|1]> ').strip() == '0' else HuxiSchedule()
-        courses = self.__get_courses()
-
-        d_start: date = date.fromisoformat(input("学期开始日期 yyyy-mm-dd> ").strip())
-        cal = make_ical(courses, d_start, schedule)
-        filename = input("文件名（可忽略 ics 后缀）> ").strip()
-        if not filename.endswith(".ics"):
-            filename = f"{filename}.ics"
-        with open(filename, "wb") as out:
-            out.write(cal.to_ical())
-
-    def __get_courses(self):
-        info = Parsed.TeachingArrangement.personal_courses(self.session)
-        print("=== 选择学年学期 ===")
-        xnxq_list = info["Sel_XNXQ"]
-        for i, li in enumerate(xnxq_list):
-            print(f"{i}: {li['text']}")
-        xnxq_i = int(input("学年学期[0|1]> ").rstrip())
-        xnxq = info["Sel_XNXQ"][xnxq_i]["value"]
-
-        param = {"Sel_XNXQ": xnxq, "px": 0, "rad": "on"}
-        courses = Parsed.TeachingArrangement.personal_courses_table(self.session, param)
-        return courses
-
-
-def show_help():
-    print("=== help ===")
-    print("""在 `cli cqu>` 提示符后输入指令
-
-    目前提供以下指令：
-    * courses-json * 获取 JSON 格式的课程表
-    * courses-ical * 获取 ICalendar 日历日程格式的课程表
-    * help | h | ? * 获取帮助信息
-    * exit * 退出程序
-    """)
-
-
-def welcome():
-    print("=== welcome ===")
-    print("""欢迎使用 CLI CQU，你可以输入 help 查看帮助""")
+__all__ = ("App", "cli_main")
+
+
+def __getattr__(name: str):
+    if name == "App":
+        from .app import App
+        return App
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def cli_main():
@@ -197,32 +22,310 @@ def cli_main():
     parser.add_argument("-u", "--username", help="输入用户名", default=None)
     parser.add_argument("-p", "--password", help="输入密码", default=None)
     parser.add_argument("cmd", help="要执行的指令", nargs="?", default=None)
+    parser.add_argument("--no-session-cache", help="不复用、不保存登录会话", action="store_true")
+    parser.add_argument("--no-response-cache", help="不缓存学年学期、课程表等页面", action="store_true")
+    parser.add_argument("--offline", help="离线模式，不登录，只使用缓存的页面", action="store_true")
+    parser.add_argument("-s", "--semesters", help="学年学期序号范围，如 all、0-3、0,2，并发获取多个学期的课程表", default=None)
+    parser.add_argument("-w", "--workers", help="并发获取多个学期时的并发数", type=int, default=4)
+    parser.add_argument("-o", "--output", help="输出文件名，给出时不再询问", default=None)
+    parser.add_argument("--campus", help="校区序号或名称，0 为沙坪坝校区，1 为虎溪校区，可在 schedules.json 中添加", default=None)
+    parser.add_argument("--start", help="学期开始日期 yyyy-mm-dd", default=None)
+    batch = parser.add_argument_group("批量任务", "cmd 为 batch 时，按任务文件在进程池中执行多个帐号的指令")
+    batch.add_argument("--jobs", help="任务文件，每行一个 JSON 对象，字段参考 cli_cqu.batch", default=None)
+    batch.add_argument("--log-dir", help="每个任务的结果日志保存目录", default="cli-cqu-logs")
+    batch.add_argument("--processes", help="进程数，默认为 CPU 核数", type=int, default=None)
+    rooms = parser.add_argument_group("空闲教室", "cmd 为 rooms 时，用导出的课表建立教室占用索引并查询空闲教室")
+    rooms.add_argument("--index", help="教室占用索引文件", default="rooms.json")
+    rooms.add_argument("--add", help="加入索引的 courses-json、courses-ndjson 导出文件", nargs="+", default=())
+    rooms.add_argument("--week", help="查询的周次", type=int, default=None)
+    rooms.add_argument("--day", help="查询的星期，一至日或 1 至 7", default=None)
+    rooms.add_argument("--lessons", help="查询的节次，如 3-4", default=None)
+    rooms.add_argument("--building", help="只查询这栋楼，如 D、DYC", default=None)
+    rooms.add_argument("--semester", help="rooms、search 只加入这个学年学期的课程，如 2019-2020学年第一学期；导出文件包含多个学期时必须给出", default=None)
+    conflicts = parser.add_argument_group("课表冲突", "cmd 为 conflicts 时，检查多份导出的课表中上课时间重叠的课程")
+    conflicts.add_argument("--tables", help="courses-json、courses-ndjson 导出文件，每个文件的每个学期为一份课表", nargs="+", default=())
+    search = parser.add_argument_group("课程索引", "cmd 为 search 时，用 --add 的课表（文件名即学号）更新课程索引，再按教师、课程、类别、地点查询")
+    search.add_argument("--course-index", help="课程索引文件", default="courses-index.json")
+    search.add_argument("--remove", help="从索引中删除的学生", nargs="+", default=())
+    search.add_argument("--teacher", help="任课教师", default=None)
+    search.add_argument("--identifier", help="课程号+名字", default=None)
+    search.add_argument("--classifier", help="课程类别", default=None)
+    search.add_argument("--location", help="地点", default=None)
+    search.add_argument("--students", help="输出选了这些课程的学生，而不是课程", action="store_true")
+    snapshot = parser.add_argument_group("课表快照", "cmd 为 snapshot 时，把 --add 的课表（文件名即学号）合并进快照，给出 -u 时输出该学生各学期的课表")
+    snapshot.add_argument("--snapshot", help="课表快照文件", default="courses.snap")
+    daemon = parser.add_argument_group("常驻进程", "cmd 为 daemon 时启动常驻进程，保持登录会话；--via-daemon 把指令转发给它")
+    daemon.add_argument("--socket", help="常驻进程的 Unix 域套接字，默认为 $XDG_RUNTIME_DIR/cli_cqu.sock", default=None)
+    daemon.add_argument("--via-daemon", help="把指令转发给常驻进程执行，cmd 还可以是 ping、stop", action="store_true")
+    daemon.add_argument("--keepalive", help="常驻进程保活会话的间隔（秒）", type=float, default=300)
+    parser.add_argument("--profile",
+                        help="记录登录、请求、解析、导出各阶段的耗时；给出文件名时保存为 Chrome trace JSON，否则在标准错误输出汇总表",
+                        nargs="?",
+                        const="",
+                        default=None,
+                        metavar="TRACE_JSON")
+    parser.add_argument("--hosts",
+                        help="仅用于测试：把发往这些主机的请求（包括登录）改发到给出的地址，如 jxgl.cqu.edu.cn=127.0.0.1:8000",
+                        default=None,
+                        metavar="主机=地址[:端口],...")
     parser.add_argument("--version", help="显示应用版本", action="version", version=f"%(prog)s {__version__}")
     args = parser.parse_args()
-    if args.cmd.startswith("assignments-"):
-        single_assignments_json(args.username, args.password)
+    if args.profile is None:
+        return run_main(parser, args)
+    from .util.trace import recording
+    with recording() as tracer:
+        try:
+            return run_main(parser, args)
+        finally:
+            if args.profile:
+                tracer.dump_chrome(args.profile)
+            else:
+                import sys
+                print(tracer.summary_table(), file=sys.stderr)
+
+
+def run_main(parser: ArgumentParser, args):
+    "按解析后的命令行参数执行指令"
+    if args.via_daemon:
+        return client_main(parser, args)
+    if args.hosts:
+        from .util.scheduler import override_hosts
+        override_hosts(args.hosts)
+    if args.cmd == "daemon":
+        return daemon_main(parser, args)
+    if args.cmd == "batch":
+        return batch_main(parser, args)
+    if args.cmd == "rooms":
+        return rooms_main(parser, args)
+    if args.cmd == "conflicts":
+        return conflicts_main(parser, args)
+    if args.cmd == "search":
+        return search_main(parser, args)
+    if args.cmd == "snapshot":
+        return snapshot_main(parser, args)
+    from .help import HELP_COMMANDS, show_help
+    if args.cmd in HELP_COMMANDS:
+        return show_help()
+    # 解析参数之后再导入 App，--version、--help、help 不需要加载 requests、bs4 等依赖
+    from .app import App, single_assignments_json, single_assignments_ndjson, welcome
+    from .util.cache import ResponseCache
+    from .util.session import SessionStore
+    if args.cmd == "assignments-ndjson":
+        single_assignments_ndjson(args.username, args.password, args.output)
+    elif args.cmd is not None and args.cmd.startswith("assignments-"):
+        single_assignments_json(args.username, args.password, args.output)
     else:
-        app = App(args.username, args.password)
+        store = None if args.no_session_cache else SessionStore()
+        cache = None if args.no_response_cache and not args.offline else ResponseCache()
+        app = App(args.username, args.password, store, cache=cache, offline=args.offline)
         if not (args.username is not None and args.password is not None and args.cmd is not None):
             welcome()
+        options = {
+            "semesters": args.semesters,
+            "workers": args.workers,
+            "output": args.output,
+            "campus": args.campus,
+            "start": args.start,
+        }
         if args.cmd is not None:
-            app.mainloop(args.cmd)
+            app.mainloop(args.cmd, **options)
         else:
-            app.mainloop()
+            app.mainloop(**options)
 
 
-def single_assignments_json(username, password):
-    """从老教务网接口获取成绩单数据，保存为 JSON。
+def batch_main(parser: ArgumentParser, args):
+    "执行批量任务，每行输出一个任务的结果摘要，有任务失败时以 1 退出"
+    import json
+    import sys
+    from .batch import load_jobs, run_batch
+    from .util.trace import current_tracer
+    if args.jobs is None:
+        parser.error("batch 需要 --jobs 任务文件")
+    jobs = load_jobs(args.jobs)
+    tracer = current_tracer()
+    if tracer is not None:
+        for job in jobs:
+            job.setdefault("profile", True)
+    failed = 0
+    for result in run_batch(jobs, args.log_dir, args.processes):
+        failed += not result["ok"]
+        if tracer is not None:
+            tracer.merge(result.get("spans", ()))
+        summary = {k: result.get(k) for k in ("id", "command", "ok", "output", "elapsed", "error")}
+        print(json.dumps(summary, ensure_ascii=False), flush=True)
+    sys.exit(1 if failed else 0)
+
+
+def rooms_main(parser: ArgumentParser, args):
+    "把 --add 的课表加入教室索引；给出 --week、--day、--lessons 时每行输出一间空闲教室"
+    from .model import record_from_dict
+    from .util.ndjson import one_semester, read_records
+    from .util.rooms import RoomIndex
+    query = (args.week, args.day, args.lessons)
+    if not args.add and None in query:
+        parser.error("rooms 需要 --add 课表文件，或 --week、--day、--lessons 查询条件")
+    index = RoomIndex.load(args.index)
+    if args.add:
+        # 索引不区分学期，不同学期的课表不能混在一起
+        seen = set()
+        try:
+            for filename in args.add:
+                index.add_all(record_from_dict(c) for c in one_semester(read_records(filename), args.semester, seen))
+        except ValueError as err:
+            parser.error(str(err))
+        index.save(args.index)
+    if None not in query:
+        try:
+            rooms = index.free_rooms(*query, building=args.building)
+        except ValueError as err:
+            parser.error(str(err))
+        for room in rooms:
+            print(room)
+
+
+def conflicts_main(parser: ArgumentParser, args):
+    "每行输出一处冲突，有冲突时以 1 退出"
+    import sys
+    from .data.schedule import find_schedule
+    from .model import record_from_dict
+    from .util.conflict import find_cohort_conflicts
+    from .util.ndjson import read_records
+    if not args.tables:
+        parser.error("conflicts 需要 --tables 课表文件")
+    try:
+        schedule = find_schedule("0" if args.campus is None else args.campus)
+    except ValueError as err:
+        parser.error(str(err))
+    tables = {}
+    for filename in args.tables:
+        for course in read_records(filename):
+            owner = filename if "semester" not in course else f"{filename} {course['semester']}"
+            tables.setdefault(owner, []).append(record_from_dict(course))
+    conflicts = find_cohort_conflicts(tables, schedule)
+    for conflict in conflicts:
+        print(conflict)
+    sys.exit(1 if conflicts else 0)
+
+
+def search_main(parser: ArgumentParser, args):
+    "更新课程索引；给出查询条件时每行输出一门课程（JSON）或一名学生"
+    import json
+    from pathlib import Path
+    from .model import record_from_dict
+    from .util.ndjson import one_semester, read_records
+    from .util.search import FIELDS, CourseIndex
+    terms = {field: getattr(args, field) for field in FIELDS if getattr(args, field) is not None}
+    if not (args.add or args.remove or terms or args.week is not None):
+        parser.error("search 需要 --add、--remove 或 --teacher、--identifier、--classifier、--location、--week 查询条件")
+    index = CourseIndex.load(args.course_index)
+    if args.add or args.remove:
+        for student in args.remove:
+            index.remove(student)
+        # 索引不区分学期，不同学期的课表不能混在一起
+        seen = set()
+        try:
+            for filename in args.add:
+                courses = one_semester(read_records(filename), args.semester, seen)
+                index.add(Path(filename).name.split(".")[0], [record_from_dict(c) for c in courses])
+        except ValueError as err:
+            parser.error(str(err))
+        index.save(args.course_index)
+    if terms or args.week is not None:
+        if args.students:
+            for student in index.students(args.week, **terms):
+                print(student)
+        else:
+            for course in index.query(args.week, **terms):
+                print(json.dumps(course.dict(), ensure_ascii=False))
+
+
+def snapshot_main(parser: ArgumentParser, args):
+    "把 --add 的课表合并进快照；给出 -u 时按 courses-json 的格式输出该学生的课表，否则输出快照的统计"
+    import json
+    import os
+    from pathlib import Path
+    from .util.ndjson import open_output, read_records
+    from .util.snapshot import Snapshot, write_snapshot
+    if args.add:
+        added = {}
+        for filename in args.add:
+            student = Path(filename).name.split(".")[0]
+            for course in read_records(filename):
+                added.setdefault((student, course.get("semester", "")), []).append(course)
+
+        def merged():
+            if os.path.exists(args.snapshot):
+                # 旧快照在写出新文件之前关闭，Windows 上才能替换
+                with Snapshot.open(args.snapshot) as old:
+                    for table in old.tables():
+                        if (table.student, table.semester) not in added:
+                            yield table.student, table.semester, table.records()
+            for (student, semester), courses in added.items():
+                yield student, semester, courses
+
+        write_snapshot(args.snapshot, merged())
+    elif not os.path.exists(args.snapshot):
+        parser.error(f"snapshot 需要 --add 课表文件，或已有的快照 {args.snapshot}")
+    with Snapshot.open(args.snapshot) as snap:
+        if args.username is None:
+            print(json.dumps(snap.stats(), ensure_ascii=False))
+            return
+        tables = snap.tables(args.username)
+        if not tables:
+            parser.error(f"快照中没有 {args.username} 的课表")
+        data = {table.semester: [c.dict() for c in table] for table in tables}
+    with open_output(args.output or "-") as out:
+        json.dump(data, out, indent=2, ensure_ascii=False)
+
 
-    注意，密码和新教务网不一样，默认为身份证后 6 位，所以单独使用。
+def daemon_main(parser: ArgumentParser, args):
+    "在前台运行常驻进程，直到收到 stop 请求，无法启动时以 2 退出"
+    import sys
+    from .daemon import Daemon, default_socket_path, serve
+    from .util.cache import ResponseCache
+    from .util.session import SessionStore
+    store = None if args.no_session_cache else SessionStore()
+    cache = None if args.no_response_cache else ResponseCache()
+    path = args.socket or default_socket_path()
+    print(f"=== daemon 监听 {path} ===", flush=True)
+    try:
+        serve(Daemon(store, cache, keepalive=args.keepalive), path)
+    except OSError as err:
+        print(f"无法启动常驻进程：{err}", file=sys.stderr)
+        sys.exit(2)
 
-    只能通过命令行参数调用。"""
-    data = Parsed.Assignment.whole_assignment(username, password)
-    json_obj = json.dumps(data, ensure_ascii=False, indent=2)
 
-    print("=== 保存成绩单 ===")
-    filename = input("保存路径（可忽略 json 扩展名）").strip()
-    if not filename.endswith(".json"):
-        filename = f"{filename}.json"
-    with open(filename, "wt", encoding="utf-8") as out:
-        out.write(json_obj)
+def client_main(parser: ArgumentParser, args):
+    "把指令转发给常驻进程，输出其标准输出，失败时以 1 退出"
+    import os
+    import sys
+    from .daemon import request
+    if args.cmd is None:
+        parser.error("--via-daemon 需要给出 cmd")
+    job = {"command": args.cmd}
+    if args.cmd not in ("ping", "stop"):
+        if args.username is None:
+            parser.error("--via-daemon 需要 -u 学号")
+        if args.password is None:
+            from getpass import getpass
+            args.password = getpass("password> ")
+        single = args.cmd.startswith("courses-ical") and args.semesters is not None and args.semesters.isdigit()
+        job.update(username=args.username,
+                   password=args.password,
+                   output=args.output if args.output in (None, "-") else os.path.abspath(args.output),
+                   semesters=args.semesters,
+                   semester=int(args.semesters) if single else None,
+                   workers=args.workers,
+                   campus=args.campus,
+                   start=args.start)
+    try:
+        result = request({k: v for k, v in job.items() if v is not None}, args.socket)
+    except OSError as err:
+        print(f"无法连接常驻进程：{err}，请先运行 cli-cqu daemon", file=sys.stderr)
+        sys.exit(2)
+    if args.cmd == "ping":
+        print(f"pid {result['pid']}，已登录：{'、'.join(result['users']) or '无'}")
+    sys.stdout.write(result.get("log", ""))
+    if not result.get("ok"):
+        print(result.get("error"), file=sys.stderr)
+        sys.exit(1)
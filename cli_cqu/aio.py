@@ -0,0 +1,117 @@
+"""App 的异步版本，用于并发获取大量帐号的课程表
+
+底层仍然是 requests：阻塞的请求被放进线程池执行，所有帐号共享同一个连接池，
+连接池对每个主机的连接数设有上限。这样 N 个帐号的总耗时约等于最慢的那个，而不是所有帐号耗时之和。
+
+>>> async def main():
+...     async with AsyncClient(limit_per_host=8) as client:
+...         async for username, courses in client.courses_tables(accounts):
+...             ...
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from typing import Iterable
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from . import App
+from .data.route import Parsed
+from .model import Course
+from .model import ExperimentCourse
+from .util.http import DEFAULT_LIMIT_PER_HOST
+from .util.http import make_adapter
+from .util.http import make_session
+
+__all__ = ("AsyncApp", "AsyncClient", "courses_tables")
+
+Courses = List[Union[Course, ExperimentCourse]]
+
+
+class AsyncApp:
+    "已登录的 App，所有方法都是协程"
+    def __init__(self, app: App, client: "AsyncClient"):
+        self.app = app
+        self.client = client
+
+    async def personal_courses(self) -> dict:
+        "参考 Parsed.TeachingArrangement.personal_courses"
+        return await self.client.run(Parsed.TeachingArrangement.personal_courses, self.app.session)
+
+    async def personal_courses_table(self, data: dict) -> Courses:
+        "参考 Parsed.TeachingArrangement.personal_courses_table"
+        return await self.client.run(Parsed.TeachingArrangement.personal_courses_table, self.app.session, data)
+
+    async def courses(self, semester: int = 0) -> Courses:
+        "获取第 semester 个学年学期（与交互界面中的序号相同）的课程表"
+        info = await self.personal_courses()
+        xnxq = info["Sel_XNXQ"][semester]["value"]
+        return await self.personal_courses_table({"Sel_XNXQ": xnxq, "px": 0, "rad": "on"})
+
+
+class AsyncClient:
+    """管理共享连接池和线程池
+
+    :param int limit_per_host: 每个主机的最大并发连接数
+    :param int max_workers: 执行阻塞请求的线程数，默认为 limit_per_host 的 4 倍
+    """
+    def __init__(self, limit_per_host: int = DEFAULT_LIMIT_PER_HOST, max_workers: int = None):
+        self.adapter = make_adapter(limit_per_host)
+        self.executor = ThreadPoolExecutor(max_workers or limit_per_host * 4)
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.adapter.close()
+
+    async def run(self, func, *args):
+        "在线程池中执行阻塞函数"
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def login(self, username: str, password: str) -> AsyncApp:
+        "登录，帐号或密码错误时抛出 ValueError"
+        app = await self.run(lambda: App(username, password, session=make_session(self.adapter)))
+        return AsyncApp(app, self)
+
+    async def courses_table(self, username: str, password: str, semester: int = 0) -> Courses:
+        "登录并获取一个帐号的课程表"
+        app = await self.login(username, password)
+        return await app.courses(semester)
+
+    async def courses_tables(self, accounts: Iterable[Tuple[str, str]],
+                             semester: int = 0) -> AsyncIterator[Tuple[str, Union[Courses, Exception]]]:
+        """并发获取多个帐号的课程表，按完成的先后顺序产出 (学号, 课程表)
+
+        单个帐号失败时产出 (学号, 异常)，不影响其他帐号
+        """
+        async def one(username: str, password: str):
+            try:
+                return username, await self.courses_table(username, password, semester)
+            except Exception as err:
+                return username, err
+
+        tasks = [asyncio.ensure_future(one(u, p)) for u, p in accounts]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def courses_tables(accounts: Iterable[Tuple[str, str]],
+                   semester: int = 0,
+                   limit_per_host: int = DEFAULT_LIMIT_PER_HOST) -> List[Tuple[str, Union[Courses, Exception]]]:
+    "AsyncClient.courses_tables 的同步包装，返回所有结果"
+    async def collect():
+        async with AsyncClient(limit_per_host) as client:
+            return [i async for i in client.courses_tables(accounts, semester)]
+
+    return asyncio.run(collect())
@@ -0,0 +1,437 @@
+"""App 对象，负责登录以及交互式命令行中各条指令的实现
+"""
+import json
+import logging
+import re
+import time
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from datetime import date
+from getpass import getpass
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from requests import Response
+from requests import Session
+
+from .data import HOST
+from .data.route import Parsed
+from .data.ua import UA_IE11
+from .excpetion.signal import *
+from .help import HELP_COMMANDS
+from .help import show_help
+from .help import welcome
+from .util.cache import CacheAdapter
+from .util.cache import ResponseCache
+from .util.http import make_session
+from .util.login import DSafeWait
+from .util.login import LoginFlow
+from .util.ndjson import open_output
+from .util.ndjson import write_ndjson
+from .util.trace import span
+from .util.session import SessionStore
+from .util.session import is_session_alive
+from .data.schedule import ArraySchedule
+from .data.schedule import available_schedules
+from .data.schedule import find_schedule
+
+__all__ = ("App", "show_help", "welcome", "single_assignments_json", "single_assignments_ndjson")
+
+
+class App:
+    # 学年学期列表的解析结果在这段时间（秒）内复用，长期运行的 App（如 daemon）不必每条指令都重新获取
+    SEMESTERS_TTL = 3600
+    # (获取时刻, personal_courses 的结果)
+    __semesters = None
+
+    def __init__(self,
+                 username: str = None,
+                 password: str = None,
+                 store: SessionStore = None,
+                 session: Session = None,
+                 cache: ResponseCache = None,
+                 offline: bool = False,
+                 dsafe_wait: DSafeWait = None):
+        """
+        :param SessionStore store: 登录会话的缓存
+        :param Session session: 使用指定的 Session，例如共享连接池的 Session
+        :param ResponseCache cache: jxgl 响应的缓存
+        :param bool offline: 离线模式，不登录，只从 cache 中读取
+        :param DSafeWait dsafe_wait: 登录时 DSafeId 的等待策略，默认为进程内共享的 util.login.DSAFE_WAIT
+        """
+        if offline and cache is None:
+            raise ValueError("离线模式需要提供响应缓存")
+        self.username = username if username is not None else input("username> ")
+        if password is None and not offline:
+            password = getpass("password> ").rstrip('\n')
+        self.password = password
+        self.session = session if session is not None else make_session()
+        self.session.headers.update({
+            'host': HOST.DOMAIN,
+            'connection': "keep-alive",
+            'cache-control': "max-age=0",
+            'upgrade-insecure-requests': "1",
+            'user-agent': UA_IE11,
+            'accept':
+            "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3",
+            'referer': HOST.PREFIX,
+            'accept-encoding': "gzip, deflate",
+            'accept-language': "zh-CN,zh;q=0.9",
+        })
+        if cache is not None:
+            inner = self.session.get_adapter(HOST.PREFIX)
+            self.session.mount(HOST.PREFIX, CacheAdapter(cache, self.username, inner, offline))
+        self.store = store
+        self.dsafe_wait = dsafe_wait
+        if offline:
+            return
+        if not self.__restore():
+            self.__login()
+            if self.store is not None:
+                self.store.save(self.username, self.password, self.session.cookies.get_dict())
+
+    def mainloop(self, one_cmd: str = None, **options):
+        """命令行界面，解析指令执行对应功能
+
+        options 是命令行参数给出的选项，会传给各条指令，参考 __run_cmd
+        """
+        def again(one_cmd: str = None) -> str:
+            if one_cmd:
+                yield one_cmd
+            else:
+                while True:
+                    yield input("cli cqu> ").strip()
+
+        again = again(one_cmd)
+
+        for cmd in again:
+            try:
+                self.__run_cmd(cmd, **options)
+            except SigHelp as signal:
+                show_help()
+                print(signal.args[0])
+            except SigContinue:
+                continue
+            except SigExit:
+                print("=== Bye ===")
+                return
+            except Signal as err:
+                print(f"!!! 未处理的信号 {err}，由 {cmd} 产生 !!!")
+
+    def __run_cmd(self,
+                  cmd: str,
+                  semesters: str = None,
+                  workers: int = 4,
+                  output: str = None,
+                  campus: str = None,
+                  start: str = None):
+        """执行指令，返回控制信号
+
+        给出的选项不再询问，全部给出时指令可以无人值守地执行。
+
+        :param str semesters: 学年学期的序号范围，如 ``all``、``0-3``、``0,2``，给出时 courses-json 一次获取多个学期；
+                              日历相关的指令只接受单个序号
+        :param int workers: 同时获取多个学期时的并发数
+        :param str output: 输出文件名
+        :param str campus: 校区，参考 choose_schedule
+        :param str start: 学期开始日期 yyyy-mm-dd
+        :raises Signal: 各种信号
+        """
+        if cmd == "":
+            raise SigContinue("空指令")
+        elif cmd == "exit":
+            raise SigExit("主动退出")
+        elif cmd in HELP_COMMANDS:
+            show_help()
+        elif cmd == "courses-json":
+            self.courses_json(output, semesters, workers)
+        elif cmd == "courses-ndjson":
+            self.courses_ndjson(output, semesters, workers)
+        elif cmd == "courses-ical":
+            self.courses_ical(output, campus, single_semester(semesters), start)
+        elif cmd == "courses-ical-sync":
+            self.courses_ical_sync(output, campus, single_semester(semesters), start)
+        elif cmd == "courses-conflicts":
+            self.courses_conflicts(campus, single_semester(semesters))
+        else:
+            raise SigHelp(f"!!! 未处理的命令： {cmd} !!!")
+        raise SigDone
+
+    def __restore(self) -> bool:
+        """尝试复用磁盘上缓存的会话，成功则返回 True
+
+        缓存的会话失效时会被丢弃，由调用者走完整的登录流程
+        """
+        if self.store is None:
+            return False
+        with span("login", "restore"):
+            return self.__do_restore()
+
+    def __do_restore(self) -> bool:
+        cookies = self.store.load(self.username, self.password)
+        if cookies is None:
+            return False
+        for name, value in cookies.items():
+            self.session.cookies.set(name, value)
+        if is_session_alive(self.session):
+            # 顺延过期时间
+            self.store.save(self.username, self.password, cookies)
+            return True
+        logging.info("缓存的会话已失效，重新登录")
+        self.store.discard(self.username)
+        self.session.cookies.clear()
+        return False
+
+    def __login(self):
+        """向主页发出请求，发送帐号密码表单，获取 cookie
+        帐号或密码错误则抛出异常
+        """
+        with span("login", "login"):
+            self.__do_login()
+
+    def __do_login(self):
+        LoginFlow(self.session, self.username, self.password, self.dsafe_wait).run()
+
+    def courses_json(self, filename: str = None, semesters: str = None, workers: int = 4, semester: int = None):
+        """选择课程表，下载为 JSON 文件
+
+        给出 semesters 时不再询问学年学期，并发获取这些学期的课程表，
+        保存为以学年学期名称为键的 JSON 对象；给出 semester 时只获取这一个学期
+        """
+        print("=== 下载课程表，保存为 JSON ===")
+        if semester is not None:
+            data = [i.dict() for i in self.__get_courses(semester)]
+        elif semesters is not None:
+            tables = self.courses_by_semester(semesters, workers)
+            data = {k: [i.dict() for i in v] for k, v in tables.items()}
+        else:
+            data = [i.dict() for i in self.__get_courses()]
+        if filename is None:
+            filename = input("文件名（可忽略 json 后缀）> ").strip()
+        if not filename.endswith(".json"):
+            filename = f"{filename}.json"
+        with span("export", "courses_json"), open(filename, "wt", encoding="utf-8") as out:
+            json.dump(data, out, indent=2, ensure_ascii=False)
+
+    def courses_ndjson(self, filename: str = None, semesters: str = None, workers: int = 4):
+        """获取课程表，以 NDJSON 格式逐条写出，filename 为 ``-`` 时写到标准输出
+
+        给出 semesters 时并发获取多个学期，每条记录带有 semester 字段（学年学期名称），
+        按学期获取完成的先后顺序写出
+        """
+        # 输出到标准输出时，提示信息改为输出到标准错误，以免混入数据。
+        # 不替换 sys.stdout：daemon 中各线程的标准输出是分开捕获的
+        status = sys.stderr if filename == "-" else sys.stdout
+        print("=== 下载课程表，保存为 NDJSON ===", file=status)
+        if semesters is None:
+            records = (i.dict() for i in self.__iter_courses())
+        else:
+            records = ({
+                "semester": text,
+                **i.dict()
+            } for text, table in self.iter_courses_by_semester(semesters, workers) for i in table)
+        if filename is None:
+            filename = input("文件名（可忽略 ndjson 后缀，- 表示标准输出）> ").strip()
+        if filename != "-" and not filename.endswith(".ndjson"):
+            filename = f"{filename}.ndjson"
+        with span("export", "courses_ndjson") as sp, open_output(filename) as out:
+            sp.set(rows=write_ndjson(records, out, flush=filename == "-"))
+
+    def iter_courses_by_semester(self, semesters: str = "all", workers: int = 4) -> Iterator[Tuple[str, list]]:
+        "与 courses_by_semester 相同，但按完成的先后顺序产出 (学年学期名称, 课程表)"
+        chosen = self.__chosen_semesters(semesters)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for fut in as_completed([pool.submit(self.__fetch_semester, xnxq) for xnxq in chosen]):
+                yield fut.result()
+
+    def courses_by_semester(self, semesters: str = "all", workers: int = 4) -> Dict[str, list]:
+        """在同一个会话上并发获取多个学年学期的课程表
+
+        :param str semesters: 学年学期序号范围，参考 parse_semesters
+        :param int workers: 最大并发数
+        :return: {学年学期名称: 课程表}，顺序与学年学期列表一致
+        """
+        chosen = self.__chosen_semesters(semesters)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return dict(pool.map(self.__fetch_semester, chosen))
+
+    def personal_courses(self) -> dict:
+        "可选的学年学期，参考 Parsed.TeachingArrangement.personal_courses，SEMESTERS_TTL 内复用上次的结果"
+        cached = self.__semesters
+        if cached is not None and time.monotonic() - cached[0] < self.SEMESTERS_TTL:
+            return cached[1]
+        info = Parsed.TeachingArrangement.personal_courses(self.session)
+        self.__semesters = (time.monotonic(), info)
+        return info
+
+    def __chosen_semesters(self, semesters: str) -> List[dict]:
+        info = self.personal_courses()
+        xnxq_list = info["Sel_XNXQ"]
+        return [xnxq_list[i] for i in parse_semesters(semesters, len(xnxq_list))]
+
+    def __fetch_semester(self, xnxq: dict) -> Tuple[str, list]:
+        param = {"Sel_XNXQ": xnxq["value"], "px": 0, "rad": "on"}
+        return xnxq["text"], Parsed.TeachingArrangement.personal_courses_table(self.session, param, compact=True)
+
+    def courses_ical(self, filename: str = None, campus: str = None, semester: int = None, start: str = None):
+        "获取课程表，转化为 icalendar 格式日历日程，给出的参数不再询问"
+        # icalendar 较重，只在需要时导入
+        from .util.calendar import write_ical
+        print("=== 下载课程表，保存为 ICalendar ===")
+        schedule, courses, d_start = self.__ical_inputs(campus, semester, start)
+        if filename is None:
+            filename = input("文件名（可忽略 ics 后缀）> ").strip()
+        if not filename.endswith(".ics"):
+            filename = f"{filename}.ics"
+        with span("export", "courses_ical") as sp, open(filename, "wb") as out:
+            sp.set(events=write_ical(courses, d_start, schedule, out))
+
+    def courses_ical_sync(self, filename: str = None, campus: str = None, semester: int = None, start: str = None):
+        """获取课程表，与上次同步时的快照对比，只导出新增、变更和取消的日程
+
+        快照保存在输出文件旁的 ``<文件名>.snapshot.json`` 中
+        """
+        from .util.sync import sync_ical
+        print("=== 下载课程表，增量同步为 ICalendar ===")
+        schedule, courses, d_start = self.__ical_inputs(campus, semester, start)
+        if filename is None:
+            filename = input("文件名（可忽略 ics 后缀）> ").strip()
+        if not filename.endswith(".ics"):
+            filename = f"{filename}.ics"
+        with span("export", "courses_ical_sync") as sp, open(filename, "wb") as out:
+            counts = sync_ical(courses, d_start, schedule, f"{filename[:-4]}.snapshot.json", out)
+            sp.set(**counts)
+        print(f"新增 {counts['added']}，变更 {counts['changed']}，取消 {counts['cancelled']}，未变 {counts['unchanged']}")
+
+    def courses_conflicts(self, campus: str = None, semester: int = None) -> list:
+        "获取课程表，列出上课时间重叠的课程，给出的参数不再询问"
+        from .util.conflict import find_conflicts
+        print("=== 检查课程表冲突 ===")
+        schedule = self.__choose_campus(campus)
+        conflicts = find_conflicts(self.__get_courses(semester), schedule)
+        for conflict in conflicts:
+            print(conflict)
+        print(f"共 {len(conflicts)} 处冲突")
+        return conflicts
+
+    def __choose_campus(self, campus: str = None) -> ArraySchedule:
+        "询问校区，返回作息时间；输入的校区不存在时重新询问，参数给出的校区不存在时提示帮助"
+        if campus is not None:
+            try:
+                return choose_schedule(campus)
+            except ValueError as err:
+                raise SigHelp(f"!!! {err} !!!")
+        schedules = available_schedules()
+        print("=== 选择校区 ===")
+        for i, s in enumerate(schedules):
+            print(f"{i}: {s.name}")
+        while True:
+            campus = input(f"选择校区[0-{len(schedules) - 1}]> ").strip()
+            try:
+                return find_schedule(campus, schedules)
+            except ValueError as err:
+                print(f"!!! {err} !!!")
+
+    def __ical_inputs(self, campus: str = None, semester: int = None, start: str = None):
+        "询问校区、学年学期和学期开始日期，已给出的不再询问"
+        schedule = self.__choose_campus(campus)
+        courses = self.__get_courses(semester)
+        if start is None:
+            start = input("学期开始日期 yyyy-mm-dd> ").strip()
+        d_start: date = date.fromisoformat(start)
+        return schedule, courses, d_start
+
+    def __iter_courses(self, semester: int = None):
+        "与 __get_courses 相同，但逐条产出解析到的课程"
+        param = {"Sel_XNXQ": self.__choose_semester(semester), "px": 0, "rad": "on"}
+        return Parsed.TeachingArrangement.iter_personal_courses_table(self.session, param, compact=True)
+
+    def __choose_semester(self, semester: int = None) -> int:
+        "询问学年学期，返回 Sel_XNXQ 的值"
+        info = self.personal_courses()
+        xnxq_list = info["Sel_XNXQ"]
+        if semester is None:
+            print("=== 选择学年学期 ===")
+            for i, li in enumerate(xnxq_list):
+                print(f"{i}: {li['text']}")
+            semester = int(input("学年学期[0|1]> ").rstrip())
+        return xnxq_list[semester]["value"]
+
+    def __get_courses(self, semester: int = None):
+        xnxq = self.__choose_semester(semester)
+        param = {"Sel_XNXQ": xnxq, "px": 0, "rad": "on"}
+        courses = Parsed.TeachingArrangement.personal_courses_table(self.session, param, compact=True)
+        return courses
+
+
+def parse_semesters(spec: str, n: int) -> List[int]:
+    """将学年学期序号范围解析为序号列表，序号与交互界面中显示的相同
+
+    >>> parse_semesters("all", 3)
+    [0, 1, 2]
+    >>> parse_semesters("0-1,4", 6)
+    [0, 1, 4]
+    """
+    if spec == "all":
+        return list(range(n))
+    indices = []
+    for component in spec.split(","):
+        if re.fullmatch(r"\d+", component):
+            indices.append(int(component))
+        elif re.fullmatch(r"\d+-\d+", component):
+            a, b = component.split("-")
+            indices.extend(range(int(a), int(b) + 1))
+        else:
+            raise ValueError(f"学年学期范围 {spec} 格式有问题，{component} 无法解析")
+    for i in indices:
+        if not 0 <= i < n:
+            raise ValueError(f"学年学期序号 {i} 超出范围 0-{n - 1}")
+    return indices
+
+
+def single_semester(spec: str = None) -> int:
+    "日历相关的指令只能处理一个学期，将序号范围转换为单个序号"
+    if spec is None:
+        return None
+    if not spec.isdigit():
+        raise SigHelp(f"!!! 该指令只能指定一个学年学期序号，而不是 {spec} !!!")
+    return int(spec)
+
+
+def choose_schedule(campus: str) -> ArraySchedule:
+    "根据序号、名称或别名选择作息时间，如 0 或 沙坪坝 为沙坪坝校区，1 或 虎溪 为虎溪校区，参考 data.schedule"
+    return find_schedule(campus)
+
+
+def single_assignments_json(username, password, filename: str = None):
+    """从老教务网接口获取成绩单数据，保存为 JSON。
+
+    注意，密码和新教务网不一样，默认为身份证后 6 位，所以单独使用。
+
+    只能通过命令行参数调用。"""
+    data = Parsed.Assignment.whole_assignment(username, password)
+    json_obj = json.dumps(data, ensure_ascii=False, indent=2)
+
+    print("=== 保存成绩单 ===")
+    if filename is None:
+        filename = input("保存路径（可忽略 json 扩展名）").strip()
+    if not filename.endswith(".json"):
+        filename = f"{filename}.json"
+    with span("export", "assignments_json"), open(filename, "wt", encoding="utf-8") as out:
+        out.write(json_obj)
+
+
+def single_assignments_ndjson(username, password, filename: str = None):
+    """从老教务网接口获取成绩单，每行一门课程，写为 NDJSON。
+
+    filename 为 ``-`` 时写到标准输出。参数参考 single_assignments_json"""
+    rows = Parsed.Assignment.iter_whole_assignment(username, password)
+    if filename is None:
+        filename = input("保存路径（可忽略 ndjson 扩展名，- 表示标准输出）").strip()
+    if filename != "-" and not filename.endswith(".ndjson"):
+        filename = f"{filename}.ndjson"
+    with span("export", "assignments_ndjson") as sp, open_output(filename) as out:
+        sp.set(rows=write_ndjson(rows, out, flush=filename == "-"))
@@ -0,0 +1,177 @@
+"""批量任务
+
+从任务文件读取多个帐号要执行的指令，在进程池中并发执行，每个任务单独写一份结果日志。
+
+任务文件每行一个 JSON 对象（JSON Lines），字段为::
+
+    id          任务名，用作日志文件名（字母、数字、-、_、. 以外的字符替换为 _），默认为 "<行号>-<学号>"
+    username    学号
+    password    密码（assignments-json 为老教务网密码）
+    command     courses-json | courses-ical | courses-ical-sync | assignments-json
+    output      输出文件名
+    semester    学年学期序号（courses-* 指令）
+    semesters   学年学期序号范围，如 all、0-3（只用于 courses-json，与 semester 二选一）
+    campus      校区序号、名称或别名，如 0 或 沙坪坝、1 或 虎溪（courses-ical*），参考 data.schedule
+    start       学期开始日期 yyyy-mm-dd（courses-ical*）
+    profile     为 true 时记录各阶段耗时，汇总写入结果的 profile 字段，参考 util.trace
+
+任务不会询问任何输入，缺少的参数会使该任务失败。
+"""
+import io
+import json
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Set
+from typing import Tuple
+
+__all__ = ("load_jobs", "run_job", "run_batch")
+
+# 指令 -> 必须给出的字段
+REQUIRED = {
+    "courses-json": ("output", ),
+    "courses-ical": ("output", "semester", "campus", "start"),
+    "courses-ical-sync": ("output", "semester", "campus", "start"),
+    "assignments-json": ("output", ),
+}
+# 本进程执行任务时共用的 DSafeWait，参考 _dsafe_wait
+_DSAFE_WAIT = None
+
+
+def log_name(job_id, used: Set[str]) -> str:
+    "任务 id 对应的日志文件名，不含路径分隔符等字符，与 used 中已有的文件名不重复"
+    stem = re.sub(r"[^\w.-]", "_", str(job_id)).lstrip(".") or "_"
+    name, n = stem, 1
+    while name in used:
+        n += 1
+        name = f"{stem}-{n}"
+    used.add(name)
+    return f"{name}.json"
+
+
+def load_jobs(path: Path) -> List[dict]:
+    "读取任务文件，跳过空行和以 # 开头的行"
+    jobs = []
+    with open(path, "rt", encoding="utf-8") as fp:
+        for lineno, line in enumerate(fp, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            job = json.loads(line)
+            job.setdefault("id", f"{lineno}-{job.get('username', '')}")
+            jobs.append(job)
+    return jobs
+
+
+def check_job(job: dict, required: Dict[str, Tuple[str, ...]] = REQUIRED):
+    "检查任务字段，缺少时抛出 ValueError；required 为 指令 -> 必须给出的字段"
+    command = job.get("command")
+    if command not in required:
+        raise ValueError(f"未知的指令 {command}，可用的指令有 {', '.join(required)}")
+    missing = [k for k in ("username", "password") + required[command] if job.get(k) is None]
+    if command == "courses-json" and job.get("semester") is None and job.get("semesters") is None:
+        missing.append("semester | semesters")
+    if missing:
+        raise ValueError(f"任务缺少字段：{', '.join(missing)}")
+
+
+def run_job(job: dict) -> dict:
+    """执行一个任务，返回结果记录，任何异常都记录在结果中而不是抛出
+
+    结果字段：id、command、ok、output、elapsed、log（任务的标准输出）、error、traceback；
+    开启 profile 时另有 profile（Tracer.summary）和 spans（记录的区间，不写入日志）
+    """
+    from .util.trace import Tracer
+    from .util.trace import recording
+    tracer = Tracer() if job.get("profile") else None
+    if tracer is None:
+        return _run_job(job)
+    with recording(tracer):
+        result = _run_job(job)
+    result["profile"] = tracer.summary()
+    result["spans"] = tracer.spans
+    return result
+
+
+def _dsafe_wait():
+    "本进程执行任务时共用的 DSafeId 等待策略；进程池中的进程依次执行多个任务，值得探测更短的等待"
+    global _DSAFE_WAIT
+    if _DSAFE_WAIT is None:
+        from .util.login import DSafeWait
+        _DSAFE_WAIT = DSafeWait()
+    return _DSAFE_WAIT
+
+
+def _run_job(job: dict) -> dict:
+    # 延迟导入，子进程只加载需要的模块
+    from .app import App
+    from .app import single_assignments_json
+    from .util.session import SessionStore
+
+    result = {"id": job.get("id"), "command": job.get("command"), "ok": False, "output": job.get("output")}
+    log = io.StringIO()
+    stdin = sys.stdin
+    # 任务中出现意料之外的询问时立即失败，而不是卡住
+    sys.stdin = io.StringIO()
+    t0 = time.perf_counter()
+    try:
+        with redirect_stdout(log):
+            check_job(job)
+            command = job["command"]
+            if command == "assignments-json":
+                single_assignments_json(job["username"], job["password"], job["output"])
+            else:
+                app = App(job["username"], job["password"], SessionStore(), dsafe_wait=_dsafe_wait())
+                if command == "courses-json":
+                    app.courses_json(job["output"], job.get("semesters"), job.get("workers", 4), job.get("semester"))
+                elif command == "courses-ical":
+                    app.courses_ical(job["output"], str(job["campus"]), int(job["semester"]), job["start"])
+                else:
+                    app.courses_ical_sync(job["output"], str(job["campus"]), int(job["semester"]), job["start"])
+        result["ok"] = True
+    except EOFError:
+        result["error"] = "任务缺少参数，程序试图询问输入"
+        result["traceback"] = traceback.format_exc()
+    except Exception as err:
+        result["error"] = f"{type(err).__name__}: {err}"
+        result["traceback"] = traceback.format_exc()
+    finally:
+        sys.stdin = stdin
+    result["elapsed"] = round(time.perf_counter() - t0, 3)
+    result["log"] = log.getvalue()
+    return result
+
+
+def _init_worker(hosts: Dict[str, str]):
+    from .util.scheduler import HOST_OVERRIDES
+    HOST_OVERRIDES.update(hosts)
+
+
+def run_batch(jobs: List[dict], log_dir: Path, processes: int = None, hosts: Dict[str, str] = None) -> Iterator[dict]:
+    """在进程池中执行任务，每完成一个任务就把结果写入 ``<log_dir>/<id>.json`` 并产出结果
+
+    结果按完成的先后顺序产出；文件名参考 log_name。
+    hosts 为子进程的 util.scheduler.HOST_OVERRIDES，默认与本进程相同
+    """
+    if hosts is None:
+        from .util.scheduler import HOST_OVERRIDES
+        hosts = dict(HOST_OVERRIDES)
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    used: Set[str] = set()
+    names = [log_name(job.get("id"), used) for job in jobs]
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(hosts, )) as pool:
+        futures = {pool.submit(run_job, job): name for job, name in zip(jobs, names)}
+        for fut in as_completed(futures):
+            result = fut.result()
+            with open(log_dir / futures[fut], "wt", encoding="utf-8") as fp:
+                json.dump({k: v for k, v in result.items() if k != "spans"}, fp, ensure_ascii=False, indent=2)
+            yield result
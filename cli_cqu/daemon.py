@@ -0,0 +1,329 @@
+"""常驻进程
+
+``cli-cqu daemon`` 启动后在 Unix 域套接字上接受指令，按学号保留已登录的 App，
+定期用轻量请求保持会话有效（失效时重新登录），并复用已解析的学年学期列表。
+``cli-cqu --via-daemon ...`` 把一条指令转发给它，省去解释器加载依赖和登录的时间。
+
+协议：每个请求、响应都是一行 JSON。请求的字段与 batch 的任务相同（参考 cli_cqu.batch）::
+
+    {"username": "20170001", "password": "...", "command": "courses-json", "semesters": "0", "output": "/abs/a.json"}
+
+command 还可以是 courses-ndjson、assignments-json、assignments-ndjson，以及
+
+    ping    返回 daemon 的进程号、已登录的学号
+    stop    关闭 daemon
+
+响应字段：ok、command、output、elapsed、log（指令的标准输出）、error。
+output 是 daemon 所在目录下的路径，客户端应当发送绝对路径；为 ``-`` 时数据在 log 中返回。
+指令不会询问任何输入，缺少的参数会使该指令失败。
+
+本模块顶层只导入标准库，客户端不会加载 requests 等依赖。
+没有 Unix 域套接字的平台（Windows）上可以导入本模块，但 request 和 serve 抛出 OSError。
+"""
+import hmac
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import TextIO
+
+__all__ = ("Daemon", "default_socket_path", "request", "serve")
+
+# 会话保活的间隔（秒），ASP.NET 会话默认 20 分钟无访问后过期
+DEFAULT_KEEPALIVE = 5 * 60
+# 超过这段时间（秒）没有指令的学号会被登出
+DEFAULT_IDLE = 12 * 3600
+# 当前平台是否支持 Unix 域套接字
+UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+
+
+def _check_platform():
+    if not UNIX_SOCKETS:
+        raise OSError("当前平台不支持 Unix 域套接字，无法使用 daemon")
+
+
+def default_socket_path() -> Path:
+    "套接字的默认位置：$CLI_CQU_SOCKET，或 $XDG_RUNTIME_DIR/cli_cqu.sock，或缓存目录下的 daemon.sock"
+    if os.environ.get("CLI_CQU_SOCKET"):
+        return Path(os.environ["CLI_CQU_SOCKET"])
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(os.environ["XDG_RUNTIME_DIR"]) / "cli_cqu.sock"
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "cli_cqu" / "daemon.sock"
+
+
+def request(message: dict, path: Path = None, timeout: float = 300) -> dict:
+    "向 daemon 发送一个请求并等待响应，daemon 未启动或平台不支持时抛出 OSError"
+    _check_platform()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path if path is not None else default_socket_path()))
+        sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as fp:
+            line = fp.readline()
+    if not line:
+        raise ConnectionError("daemon 没有返回响应")
+    return json.loads(line)
+
+
+class _ThreadStream(io.TextIOBase):
+    "按线程分发的输出流，安装为 sys.stdout 后各线程的 print 互不混杂"
+    def __init__(self, default: TextIO):
+        self.default = default
+        self.local = threading.local()
+
+    def write(self, s: str) -> int:
+        return (getattr(self.local, "target", None) or self.default).write(s)
+
+    def flush(self):
+        (getattr(self.local, "target", None) or self.default).flush()
+
+    @contextmanager
+    def capture(self, target: TextIO) -> Iterator[TextIO]:
+        self.local.target = target
+        try:
+            yield target
+        finally:
+            self.local.target = None
+
+
+@contextmanager
+def _capture(target: TextIO) -> Iterator[TextIO]:
+    "把当前线程的标准输出写入 target"
+    stream = sys.stdout
+    if isinstance(stream, _ThreadStream):
+        with stream.capture(target):
+            yield target
+    else:
+        with redirect_stdout(target):
+            yield target
+
+
+class _Account:
+    "一个学号已登录的 App"
+    __slots__ = ("app", "fingerprint", "checked", "used")
+
+    def __init__(self, app, fingerprint: str):
+        self.app = app
+        self.fingerprint = fingerprint
+        self.checked = self.used = time.monotonic()
+
+
+class Daemon:
+    """保留已登录的 App，执行转发来的指令
+
+    :param store: 登录会话的缓存，参考 util.session.SessionStore
+    :param cache: jxgl 响应的缓存，参考 util.cache.ResponseCache
+    :param keepalive: 会话保活的间隔（秒）
+    :param idle: 超过这段时间没有指令的学号会被登出
+    """
+    # 指令 -> 必须给出的字段
+    REQUIRED = {
+        "courses-json": ("output", ),
+        "courses-ndjson": ("output", ),
+        "courses-ical": ("output", "semester", "campus", "start"),
+        "courses-ical-sync": ("output", "semester", "campus", "start"),
+        "assignments-json": ("output", ),
+        "assignments-ndjson": ("output", ),
+    }
+
+    def __init__(self, store=None, cache=None, keepalive: float = DEFAULT_KEEPALIVE, idle: float = DEFAULT_IDLE):
+        from .util.http import make_adapter
+        from .util.login import DSafeWait
+        self.store = store
+        self.cache = cache
+        self.keepalive = keepalive
+        self.idle = idle
+        self.adapter = make_adapter()
+        # 常驻进程会登录很多次，值得探测更短的 DSafeId 等待；只用于本 daemon 的登录，不改变进程内共享的 DSAFE_WAIT
+        self.dsafe_wait = DSafeWait()
+        self.accounts: Dict[str, _Account] = {}
+        self.__lock = threading.Lock()
+        # 学号 -> 登录锁，同一学号同时只登录一次
+        self.__logins: Dict[str, threading.Lock] = {}
+        self.__stop = threading.Event()
+
+    def __login_lock(self, username: str) -> threading.Lock:
+        with self.__lock:
+            return self.__logins.setdefault(username, threading.Lock())
+
+    def __login(self, username: str, password: str):
+        "登录一个新的 App，调用者应持有该学号的登录锁"
+        from .app import App
+        from .util.http import make_session
+        return App(username,
+                   password,
+                   self.store,
+                   session=make_session(self.adapter),
+                   cache=self.cache,
+                   dsafe_wait=self.dsafe_wait)
+
+    def app(self, username: str, password: str):
+        "已登录的 App，没有或密码不一致时登录"
+        from .data.js_equality import chkpwd
+        fingerprint = chkpwd(username, password)
+        with self.__login_lock(username):
+            account = self.accounts.get(username)
+            if account is None or not hmac.compare_digest(account.fingerprint, fingerprint):
+                account = self.accounts[username] = _Account(self.__login(username, password), fingerprint)
+            account.used = time.monotonic()
+            return account.app
+
+    def execute(self, job: dict) -> dict:
+        "执行一个请求，返回响应，任何异常都记录在响应中而不是抛出"
+        command = job.get("command")
+        if command == "ping":
+            return {"ok": True, "command": command, "pid": os.getpid(), "users": sorted(self.accounts)}
+        if command == "stop":
+            self.__stop.set()
+            return {"ok": True, "command": command}
+        from .app import single_assignments_json, single_assignments_ndjson
+        from .batch import check_job
+        result = {"ok": False, "command": command, "output": job.get("output")}
+        log = io.StringIO()
+        t0 = time.perf_counter()
+        try:
+            with _capture(log):
+                check_job(job, self.REQUIRED)
+                username, password, output = job["username"], job["password"], job["output"]
+                if command == "assignments-json":
+                    single_assignments_json(username, password, output)
+                elif command == "assignments-ndjson":
+                    single_assignments_ndjson(username, password, output)
+                else:
+                    app = self.app(username, password)
+                    if command == "courses-json":
+                        app.courses_json(output, job.get("semesters"), job.get("workers", 4), job.get("semester"))
+                    elif command == "courses-ndjson":
+                        semesters = job.get("semesters", job.get("semester"))
+                        app.courses_ndjson(output, None if semesters is None else str(semesters),
+                                           job.get("workers", 4))
+                    elif command == "courses-ical":
+                        app.courses_ical(output, str(job["campus"]), int(job["semester"]), job["start"])
+                    else:
+                        app.courses_ical_sync(output, str(job["campus"]), int(job["semester"]), job["start"])
+            result["ok"] = True
+        except EOFError:
+            result["error"] = "缺少参数，程序试图询问输入"
+        except Exception as err:
+            result["error"] = f"{type(err).__name__}: {err}"
+            logging.debug(traceback.format_exc())
+        result["elapsed"] = round(time.perf_counter() - t0, 3)
+        result["log"] = log.getvalue()
+        return result
+
+    def refresh(self):
+        "检查所有学号的会话：登出空闲的，保活到期的，已失效的重新登录"
+        from .util.session import is_session_alive
+        now = time.monotonic()
+        for username, account in list(self.accounts.items()):
+            if now - account.used > self.idle:
+                self.accounts.pop(username, None)
+                continue
+            if now - account.checked < self.keepalive:
+                continue
+            app = account.app
+            try:
+                if is_session_alive(app.session):
+                    if self.store is not None:
+                        self.store.save(username, app.password, app.session.cookies.get_dict())
+                else:
+                    logging.info("%s 的会话已失效，重新登录", username)
+                    # 与 app 使用同一把锁，避免与转发来的指令同时登录、互相覆盖会话
+                    with self.__login_lock(username):
+                        # 等待期间指令可能已经重新登录或换了密码，此时不再登录
+                        if self.accounts.get(username) is account:
+                            new = _Account(self.__login(username, app.password), account.fingerprint)
+                            # 重新登录不算作使用，保留原来的空闲时间
+                            new.used = account.used
+                            account = self.accounts[username] = new
+                account.checked = now
+            except Exception as err:
+                # 网络问题时保留 App，下一轮再试
+                logging.warning("刷新 %s 的会话失败：%s", username, err)
+
+    def refresh_forever(self, interval: float = 30):
+        while not self.__stop.wait(interval):
+            self.refresh()
+
+    @property
+    def stopped(self) -> bool:
+        return self.__stop.is_set()
+
+    def close(self):
+        self.__stop.set()
+        self.adapter.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: Daemon = self.server.daemon
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = daemon.execute(json.loads(line))
+            except ValueError as err:
+                response = {"ok": False, "error": f"请求不是 JSON：{err}"}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if daemon.stopped:
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+if UNIX_SOCKETS:
+
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def serve(daemon: Daemon, path: Path = None, ready: threading.Event = None):
+    """在 path 上服务，直到收到 stop 请求
+
+    套接字只允许本人访问；path 上已有其他 daemon 在运行，或平台不支持时抛出 OSError
+    """
+    _check_platform()
+    path = Path(path if path is not None else default_socket_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        try:
+            request({"command": "ping"}, path, timeout=1)
+        except OSError:
+            # 上次没有正常退出留下的套接字文件
+            path.unlink()
+        else:
+            raise OSError(f"{path} 上已有 daemon 在运行")
+    umask = os.umask(0o077)
+    try:
+        server = _Server(str(path), _Handler)
+    finally:
+        os.umask(umask)
+    server.daemon = daemon
+    stdout = sys.stdout
+    sys.stdout = _ThreadStream(stdout)
+    # 指令中意料之外的询问立即失败
+    stdin, sys.stdin = sys.stdin, io.StringIO()
+    refresher = threading.Thread(target=daemon.refresh_forever, daemon=True)
+    refresher.start()
+    try:
+        if ready is not None:
+            ready.set()
+        server.serve_forever()
+    finally:
+        sys.stdout, sys.stdin = stdout, stdin
+        server.server_close()
+        daemon.close()
+        if path.exists():
+            path.unlink()
@@ -0,0 +1,275 @@
+"""基于 lxml 的课程表、成绩单解析器
+
+与 route.make_course 的结果完全一致，但不构建 BeautifulSoup 树，
+而是对每张表只判断一次列布局（13 列为 Course，12 列为 ExperimentCourse），
+再对每一行套用预先编译好的取列方案。
+
+parse_transcript 与 route 中基于 BeautifulSoup 的成绩单解析结果一致。
+
+以 _tree 结尾的函数接受已经解析好的文档根节点，例如 util.stream.parse_html 边下载边解析的结果；
+以 _rows 结尾的函数接受边解析边产出的 tr 元素（util.stream.iter_elements），处理完一行就删除一行。
+"""
+import logging
+import re
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Sequence
+from typing import Type
+from typing import Union
+
+from lxml import etree
+from lxml import html as lhtml
+
+from ..model import Course
+from ..model import CourseRecord
+from ..model import ExperimentCourse
+from ..model import ExperimentCourseRecord
+from ..model import Record
+from ..util.stream import release
+
+__all__ = ("parse_courses_table", "iter_courses_table", "iter_courses_tree", "iter_courses_rows", "parse_transcript",
+           "parse_transcript_tree", "iter_transcript", "iter_transcript_tree", "iter_transcript_rows")
+
+
+class Column(NamedTuple):
+    "一列的取值方式"
+    # 字段名
+    name: str
+    # 列序号，第 0 列是序号，忽略
+    index: int
+    # 文本为空时是否回退到 hidevalue 属性
+    fallback: bool
+    # 类型转换
+    convert: Callable[[str], object]
+
+
+class Plan:
+    "一种表格布局的取列方案"
+    def __init__(self, model: Type[Union[Course, ExperimentCourse]], record: Type[Record], columns: Sequence[Column]):
+        self.model = model
+        self.record = record
+        self.columns = tuple(columns)
+        self.names = tuple(c.name for c in self.columns)
+        self.width = len(self.columns) + 1
+
+    def apply(self, tds: list, compact: bool = False) -> Union[Course, ExperimentCourse, Record]:
+        "compact 为真时产生不经校验的 Record"
+        values = []
+        for _, index, fallback, convert in self.columns:
+            td = tds[index]
+            text = td.text_content()
+            if fallback and text == "":
+                text = td.get("hidevalue", "")
+            values.append(convert(text))
+        if compact:
+            return self.record(*values)
+        return self.model(**dict(zip(self.names, values)))
+
+
+def _columns(*spec) -> List[Column]:
+    return [Column(name, i, fallback, convert) for i, (name, fallback, convert) in enumerate(spec, start=1)]
+
+
+COURSE_PLAN = Plan(
+    Course,
+    CourseRecord,
+    _columns(
+        ("identifier", True, str),
+        ("score", True, float),
+        ("time_total", True, float),
+        ("time_teach", True, float),
+        ("time_practice", True, float),
+        ("classifier", True, str),
+        ("teach_type", True, str),
+        ("exam_type", True, str),
+        ("teacher", True, str),
+        ("week_schedule", False, str),
+        ("day_schedule", False, str),
+        ("location", False, str),
+    ),
+)
+
+EXPERIMENT_COURSE_PLAN = Plan(
+    ExperimentCourse,
+    ExperimentCourseRecord,
+    _columns(
+        ("identifier", True, str),
+        ("score", True, float),
+        ("time_total", True, float),
+        ("time_teach", True, float),
+        ("time_practice", True, float),
+        ("project_name", True, str),
+        ("teacher", True, str),
+        ("hosting_teacher", True, str),
+        ("week_schedule", True, str),
+        ("day_schedule", True, str),
+        ("location", True, str),
+    ),
+)
+
+# 列数 -> 取列方案
+PLANS: Dict[int, Plan] = {p.width: p for p in (COURSE_PLAN, EXPERIMENT_COURSE_PLAN)}
+
+_tables = etree.XPath("//table[tbody]")
+_header_cells = etree.XPath("(thead/tr | tr)[last()]/*[self::td or self::th]")
+_rows = etree.XPath("tbody/tr")
+_cells = etree.XPath(".//td")
+
+
+def _detect(table) -> Plan:
+    "根据表头判断表格布局，没有表头时根据第一行判断"
+    width = len(_header_cells(table))
+    if width not in PLANS:
+        rows = _rows(table)
+        width = len(_cells(rows[0])) if rows else 0
+    return PLANS.get(width)
+
+
+def parse_courses_table(text: str, compact: bool = False) -> List[Union[Course, ExperimentCourse, Record]]:
+    """解析个人课表查询结果的 HTML，等价于 route.parse_personal_courses_table
+
+    :param bool compact: 为真时直接产生 CourseRecord、ExperimentCourseRecord，跳过 pydantic 校验
+    """
+    return list(iter_courses_table(text, compact))
+
+
+def iter_courses_table(text: str, compact: bool = False) -> Iterator[Union[Course, ExperimentCourse, Record]]:
+    "与 parse_courses_table 相同，但逐行产出"
+    if not text.strip():
+        return
+    yield from iter_courses_tree(lhtml.document_fromstring(text), compact)
+
+
+def iter_courses_tree(root, compact: bool = False) -> Iterator[Union[Course, ExperimentCourse, Record]]:
+    "与 iter_courses_table 相同，但从文档根节点开始"
+    for table in _tables(root):
+        plan = _detect(table)
+        for tr in _rows(table):
+            yield _apply(plan, tr, compact)
+
+
+def iter_courses_rows(trs: Iterable, compact: bool = False) -> Iterator[Union[Course, ExperimentCourse, Record]]:
+    """与 iter_courses_tree 相同，但输入是文档中依次结束的 tr 元素
+
+    每张表的第一行数据结束时表头已经完整，据此判断布局；处理完的行随即从树中删除
+    """
+    table = plan = None
+    for tr in trs:
+        tbody = tr.getparent()
+        parent = tbody.getparent() if tbody is not None and tbody.tag == "tbody" else None
+        if parent is None or parent.tag != "table":
+            continue
+        if parent is not table:
+            table, plan = parent, _detect(parent)
+        yield _apply(plan, tr, compact)
+        release(tr)
+
+
+def _apply(plan: Plan, tr, compact: bool) -> Union[Course, ExperimentCourse, Record]:
+    tds = _cells(tr)
+    if plan is None or len(tds) != plan.width:
+        # 表头与数据行不一致时逐行判断
+        row_plan = PLANS.get(len(tds))
+        if row_plan is None:
+            logging.error("未知的数据结构")
+            logging.error(etree.tostring(tr, encoding="unicode", pretty_print=True))
+            raise ValueError("未知的数据结构")
+        return row_plan.apply(tds, compact)
+    return plan.apply(tds, compact)
+
+
+# 成绩单 详细 的字段，依次为第 1 至 10 列
+TRANSCRIPT_FIELDS = ("课程编码", "课程名称", "成绩", "学分", "选修", "类别", "教师", "考别", "备注", "时间")
+
+_transcript_header = etree.XPath("(//td/*[2][self::p])[1]")
+_all_rows = etree.XPath("//tr")
+_query_time = re.compile(r"查询时间：(2\d{3}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}:\d{1,2})")
+_query_time_text = etree.XPath("//text()[contains(., '查询时间：')]")
+
+
+def _squeeze(text: str) -> str:
+    "去掉全部空白字符"
+    return "".join(text.split())
+
+
+def _transcript_header_fields(root) -> List[str]:
+    "表头段落中以 <b> 分隔的各段，去掉空白"
+    p = _transcript_header(root)
+    if not p:
+        return []
+    p = p[0]
+    parts = [p.text or ""] + [b.text_content() + (b.tail or "") for b in p.iterchildren("b")]
+    return [t for t in map(_squeeze, parts) if t != ""]
+
+
+def _transcript_rows(root) -> Iterator[dict]:
+    # 前三行是表头、查询时间和列名，最后一行是合计
+    for tr in _all_rows(root)[3:-1]:
+        yield _transcript_row(tr)
+
+
+def _transcript_row(tr) -> dict:
+    return _transcript_record(_transcript_cells(tr))
+
+
+def _transcript_cells(tr) -> List[str]:
+    return [_squeeze(td.text_content()) for td in _cells(tr)]
+
+
+def _transcript_record(tds: List[str]) -> dict:
+    "一行成绩，第一列是序号；单元格不足时抛出 ValueError，而不是产出缺少字段的记录"
+    if len(tds) <= len(TRANSCRIPT_FIELDS):
+        raise ValueError(f"成绩单的行只有 {len(tds)} 个单元格，至少需要 {len(TRANSCRIPT_FIELDS) + 1} 个：{tds}")
+    return dict(zip(TRANSCRIPT_FIELDS, tds[1:]))
+
+
+def parse_transcript(text: str) -> dict:
+    "解析老教务网的成绩单页面，等价于 route.parse_whole_assignment"
+    return parse_transcript_tree(lhtml.document_fromstring(text))
+
+
+def parse_transcript_tree(root) -> dict:
+    "与 parse_transcript 相同，但从文档根节点开始"
+    header = _transcript_header_fields(root)
+    query_time = next(filter(None, map(_query_time.search, _query_time_text(root))))
+    return {
+        "学号": header[0][3:],
+        "姓名": header[1][3:],
+        "专业": header[2][3:],
+        "GPA": header[3][4:],
+        "查询时间": query_time[1],
+        "详细": list(_transcript_rows(root)),
+    }
+
+
+def iter_transcript(text: str) -> Iterator[dict]:
+    "逐行产出成绩单中的课程，每行附带 学号 字段，等价于 route.iter_whole_assignment"
+    return iter_transcript_tree(lhtml.document_fromstring(text))
+
+
+def iter_transcript_tree(root) -> Iterator[dict]:
+    "与 iter_transcript 相同，但从文档根节点开始"
+    student_id = _transcript_header_fields(root)[0][3:]
+    for row in _transcript_rows(root):
+        yield {"学号": student_id, **row}
+
+
+def iter_transcript_rows(trs: Iterable) -> Iterator[dict]:
+    """与 iter_transcript_tree 相同，但输入是文档中依次结束的 tr 元素
+
+    学号取自前三行表头；最后一行是合计，所以每行在下一行结束后才产出，处理完的行随即从树中删除
+    """
+    student_id = pending = None
+    for i, tr in enumerate(trs):
+        if i < 3:
+            continue
+        if i == 3:
+            student_id = _transcript_header_fields(tr)[0][3:]
+        if pending is not None:
+            yield {"学号": student_id, **_transcript_record(pending)}
+        pending = _transcript_cells(tr)
+        release(tr)
@@ -5,18 +5,37 @@ import re
 from typing import *
 
 from bs4 import BeautifulSoup
+from requests import Response
 from requests import Session
 
 from ..model import Course
 from ..model import ExperimentCourse
+from ..model import Record
+from ..model import to_record
+from ..util.http import make_session
+from ..util.stream import iter_elements
+from ..util.stream import parse_html
+from ..util.stream import read_text
+from ..util.trace import span
 from . import HOST
+from .parser import iter_courses_rows
+from .parser import iter_courses_table
+from .parser import iter_transcript
+from .parser import iter_transcript_rows
+from .parser import parse_transcript
+from .parser import parse_transcript_tree
 
 __all__ = ("Route", "Parsed")
 
+# 课程表的默认解析后端
+DEFAULT_BACKEND = "lxml"
+
 
 class Route:
     home = "/home.aspx"
     mainform = "/MAINFRM.aspx"
+    # 登录表单
+    index_login = "/_data/index_login.aspx"
 
     class TeachingArrangement:
         "教学安排模块"
@@ -36,6 +55,25 @@ class Route:
         whole_assignment = "http://oldjw.cqu.edu.cn:8088/score/sel_score/sum_score_sel.asp"
 
 
+# 可以缓存的 jxgl 路由及其缓存有效期（秒），参考 util.cache
+ROUTE_TTL = {
+    # 学年学期列表一学期才变一次
+    Route.TeachingArrangement.personal_courses: 7 * 24 * 3600,
+    Route.TeachingArrangement.personal_courses_table: 24 * 3600,
+}
+
+# 各路由页面的编码，参考 util.stream；jxgl 的路由以路径为键，oldjw 的以完整网址为键
+ROUTE_ENCODING = {
+    Route.home: "gbk",
+    Route.mainform: "gbk",
+    Route.index_login: "gbk",
+    Route.TeachingArrangement.personal_courses: "gbk",
+    Route.TeachingArrangement.personal_courses_table: "gbk",
+    Route.Assignment.oldjw_login: "gbk",
+    Route.Assignment.whole_assignment: "gbk",
+}
+
+
 class Parsed:
     class TeachingArrangement:
         "教学安排模块"
@@ -45,28 +83,41 @@ class Parsed:
             "解析个人课表页面，获取可得的信息"
             url = f"{HOST.PREFIX}{Route.TeachingArrangement.personal_courses}"
             # 需要填写的表单数据以及说明
-            resp = s.get(url)
-            html = BeautifulSoup(resp.text, "lxml")
-            el_学年学期 = html.select("select[name=Sel_XNXQ] > option")
-            学年学期 = [{"text": i.text, "value": int(i.attrs["value"])} for i in el_学年学期]
-            el_排序 = html.select("select[name=px] > option")
-            return {"Sel_XNXQ": 学年学期, "rad": {"text": "总是 on，不知道干嘛的", "value": "on"}, "###": "始终全量获取"}
+            resp = s.get(url, stream=True)
+            return parse_personal_courses(read_text(resp, ROUTE_ENCODING[Route.TeachingArrangement.personal_courses]))
 
         @staticmethod
-        def personal_courses_table(s: Session, data: dict) -> List[Union[Course, ExperimentCourse]]:
+        def personal_courses_table(s: Session,
+                                   data: dict,
+                                   backend: str = DEFAULT_BACKEND,
+                                   compact: bool = False) -> List[Union[Course, ExperimentCourse, Record]]:
             """查询个人课表，需要的表单信息可以通过
             Route.TeachingArrangement.personal_courses 获取
+
+            :param str backend: 解析后端，``lxml`` 或 ``bs4``
+            :param bool compact: 为真时返回不经校验的 CourseRecord、ExperimentCourseRecord
             """
             url = f"{HOST.PREFIX}{Route.TeachingArrangement.personal_courses_table}"
-            resp = s.post(url, data=data)
-            html = BeautifulSoup(resp.text, "lxml")
-            listing = html.select("table > tbody > tr")
-            courses = [make_course(i) for i in listing]
+            resp = s.post(url, data=data, stream=True)
+            # 边下载边解析，区间中包含下载响应体的时间
+            with span("parse", f"personal_courses_table[{backend}]") as sp:
+                courses = list(iter_personal_courses_response(resp, backend, compact))
+                sp.set(rows=len(courses))
             return courses
 
+        @staticmethod
+        def iter_personal_courses_table(s: Session,
+                                        data: dict,
+                                        backend: str = DEFAULT_BACKEND,
+                                        compact: bool = False) -> Iterator[Union[Course, ExperimentCourse, Record]]:
+            "与 personal_courses_table 相同，但逐行产出解析到的课程"
+            url = f"{HOST.PREFIX}{Route.TeachingArrangement.personal_courses_table}"
+            resp = s.post(url, data=data, stream=True)
+            return iter_personal_courses_response(resp, backend, compact)
+
     class Assignment:
         @staticmethod
-        def whole_assignment(u: str, p: str) -> dict:
+        def whole_assignment(u: str, p: str, backend: str = DEFAULT_BACKEND) -> dict:
             """通过老教务网接口获取成绩单。
 
             登录密码和新教务网不同，如果没修改过，应为身份证后 6 位。
@@ -93,6 +144,31 @@ class Parsed:
                     备注（str）
                     时间（str）
             """
+            resp = Parsed.Assignment.whole_assignment_response(u, p)
+            with span("parse", f"whole_assignment[{backend}]"):
+                if backend == "lxml":
+                    return parse_transcript_tree(parse_html(resp, ROUTE_ENCODING[Route.Assignment.whole_assignment]))
+                return _parse_whole_assignment(read_text(resp, ROUTE_ENCODING[Route.Assignment.whole_assignment]),
+                                               backend)
+
+        @staticmethod
+        def iter_whole_assignment(u: str, p: str, backend: str = DEFAULT_BACKEND) -> Iterator[dict]:
+            "逐行产出成绩单中的课程，参考 route.iter_whole_assignment"
+            resp = Parsed.Assignment.whole_assignment_response(u, p)
+            if backend == "lxml":
+                encoding = ROUTE_ENCODING[Route.Assignment.whole_assignment]
+                return iter_transcript_rows(iter_elements(resp, encoding, "tr"))
+            return iter_whole_assignment(read_text(resp, ROUTE_ENCODING[Route.Assignment.whole_assignment]), backend)
+
+        @staticmethod
+        def whole_assignment_page(u: str, p: str) -> str:
+            "登录老教务网，获取成绩单页面的 HTML，参数参考 whole_assignment"
+            resp = Parsed.Assignment.whole_assignment_response(u, p)
+            return read_text(resp, ROUTE_ENCODING[Route.Assignment.whole_assignment])
+
+        @staticmethod
+        def whole_assignment_response(u: str, p: str) -> Response:
+            "登录老教务网，以 stream=True 请求成绩单页面，响应体尚未读取"
             login_form = {
                 # 学号，非统一身份认证号
                 "username": u,
@@ -104,46 +180,16 @@ class Parsed:
                 # 院系快速导航
                 "select1": "#"
             }
-            session = Session()
-            resp = session.post(Route.Assignment.oldjw_login, data=login_form)
-            resp_text = resp.content.decode("gbk")
+            session = make_session()
+            with span("login", "oldjw_login"):
+                resp = session.post(Route.Assignment.oldjw_login, data=login_form)
+            resp_text = read_text(resp, ROUTE_ENCODING[Route.Assignment.oldjw_login])
             if "你的密码不正确，请到教务处咨询(学生密码错误请向学院教务人员或辅导员查询)!" in resp_text:
                 raise ValueError("学号或密码错误，老教务处的密码默认为身份证后六位，"
                                  #
                                  "或到教务处咨询(学生密码错误请向学院教务人员或辅导员查询)!")
 
-            assignments = session.get(Route.Assignment.whole_assignment).content.decode("gbk")
-            assparse = BeautifulSoup(assignments, "lxml")
-
-            header_text = str(assparse.select_one("td > p:nth-child(2)"))
-            header = [t for t in (re.sub(r"</b>|</?p>|\s", "", t) for t in header_text.split("<b>")) if t != ""]
-
-            details = []
-            for tr in assparse.select("tr")[3:-1]:
-                tds = [re.sub(r"\s", "", td.text) for td in tr.select("td")]
-                data = {
-                    "课程编码": tds[1],
-                    "课程名称": tds[2],
-                    "成绩": tds[3],
-                    "学分": tds[4],
-                    "选修": tds[5],
-                    "类别": tds[6],
-                    "教师": tds[7],
-                    "考别": tds[8],
-                    "备注": tds[9],
-                    "时间": tds[10],
-                }
-                details.append(data)
-
-            table = {
-                "学号": header[0][3:],
-                "姓名": header[1][3:],
-                "专业": header[2][3:],
-                "GPA": header[3][4:],
-                "查询时间": re.search(r"查询时间：(2\d{3}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}:\d{1,2})", assignments)[1],
-                "详细": details,
-            }
-            return table
+            return session.get(Route.Assignment.whole_assignment, stream=True)
 
 
 def makeurl(path: str) -> str:
@@ -151,6 +197,120 @@ def makeurl(path: str) -> str:
     return f"{HOST.PREFIX}{path}"
 
 
+def parse_personal_courses(text: str) -> dict:
+    "解析个人课表页面的 HTML，获取可选的学年学期"
+    with span("parse", "personal_courses"):
+        html = BeautifulSoup(text, "lxml")
+        el_学年学期 = html.select("select[name=Sel_XNXQ] > option")
+        学年学期 = [{"text": i.text, "value": int(i.attrs["value"])} for i in el_学年学期]
+    return {"Sel_XNXQ": 学年学期, "rad": {"text": "总是 on，不知道干嘛的", "value": "on"}, "###": "始终全量获取"}
+
+
+def parse_personal_courses_table(text: str,
+                                 backend: str = DEFAULT_BACKEND,
+                                 compact: bool = False) -> List[Union[Course, ExperimentCourse, Record]]:
+    """解析个人课表查询结果的 HTML
+
+    :param str backend: ``lxml`` 使用 parser.parse_courses_table；``bs4`` 使用 BeautifulSoup 逐行 make_course
+    :param bool compact: 为真时返回不经校验的 CourseRecord、ExperimentCourseRecord
+    """
+    with span("parse", f"personal_courses_table[{backend}]") as sp:
+        courses = list(iter_personal_courses_table(text, backend, compact))
+        sp.set(rows=len(courses))
+    return courses
+
+
+def iter_personal_courses_response(resp: Response,
+                                   backend: str = DEFAULT_BACKEND,
+                                   compact: bool = False) -> Iterator[Union[Course, ExperimentCourse, Record]]:
+    """与 iter_personal_courses_table 相同，但直接解析 personal_courses_table 的响应
+
+    lxml 后端把响应体边下载边喂给解析器，每解析完一行就产出并从树中删除，
+    内存中只有当前的分块、表头和尚未处理的行；响应在读完或生成器关闭时关闭
+    """
+    encoding = ROUTE_ENCODING[Route.TeachingArrangement.personal_courses_table]
+    if backend == "lxml":
+        return iter_courses_rows(iter_elements(resp, encoding, "tr"), compact)
+    return iter_personal_courses_table(read_text(resp, encoding), backend, compact)
+
+
+def iter_personal_courses_table(text: str,
+                                backend: str = DEFAULT_BACKEND,
+                                compact: bool = False) -> Iterator[Union[Course, ExperimentCourse, Record]]:
+    "与 parse_personal_courses_table 相同，但逐行产出"
+    if backend == "lxml":
+        yield from iter_courses_table(text, compact)
+        return
+    elif backend != "bs4":
+        raise ValueError(f"未知的解析后端 {backend}")
+    html = BeautifulSoup(text, "lxml")
+    for tr in html.select("table > tbody > tr"):
+        course = make_course(tr)
+        yield to_record(course) if compact else course
+
+
+def parse_whole_assignment(assignments: str, backend: str = DEFAULT_BACKEND) -> dict:
+    """解析老教务网的成绩单页面，字段参考 Parsed.Assignment.whole_assignment
+
+    :param str backend: ``lxml`` 使用 parser.parse_transcript；``bs4`` 使用 BeautifulSoup
+    """
+    with span("parse", f"whole_assignment[{backend}]"):
+        return _parse_whole_assignment(assignments, backend)
+
+
+def _parse_whole_assignment(assignments: str, backend: str) -> dict:
+    if backend == "lxml":
+        return parse_transcript(assignments)
+    elif backend != "bs4":
+        raise ValueError(f"未知的解析后端 {backend}")
+    assparse = BeautifulSoup(assignments, "lxml")
+    header = _assignment_header(assparse)
+    table = {
+        "学号": header[0][3:],
+        "姓名": header[1][3:],
+        "专业": header[2][3:],
+        "GPA": header[3][4:],
+        "查询时间": re.search(r"查询时间：(2\d{3}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}:\d{1,2})", assignments)[1],
+        "详细": list(_assignment_details(assparse)),
+    }
+    return table
+
+
+def iter_whole_assignment(assignments: str, backend: str = DEFAULT_BACKEND) -> Iterator[dict]:
+    "逐行产出成绩单中的课程，每行附带 学号 字段，其余字段与 whole_assignment 的 详细 相同"
+    if backend == "lxml":
+        yield from iter_transcript(assignments)
+        return
+    elif backend != "bs4":
+        raise ValueError(f"未知的解析后端 {backend}")
+    assparse = BeautifulSoup(assignments, "lxml")
+    student_id = _assignment_header(assparse)[0][3:]
+    for data in _assignment_details(assparse):
+        yield {"学号": student_id, **data}
+
+
+def _assignment_header(assparse: BeautifulSoup) -> List[str]:
+    header_text = str(assparse.select_one("td > p:nth-child(2)"))
+    return [t for t in (re.sub(r"</b>|</?p>|\s", "", t) for t in header_text.split("<b>")) if t != ""]
+
+
+def _assignment_details(assparse: BeautifulSoup) -> Iterator[dict]:
+    for tr in assparse.select("tr")[3:-1]:
+        tds = [re.sub(r"\s", "", td.text) for td in tr.select("td")]
+        yield {
+            "课程编码": tds[1],
+            "课程名称": tds[2],
+            "成绩": tds[3],
+            "学分": tds[4],
+            "选修": tds[5],
+            "类别": tds[6],
+            "教师": tds[7],
+            "考别": tds[8],
+            "备注": tds[9],
+            "时间": tds[10],
+        }
+
+
 def make_course(tr: BeautifulSoup) -> Union[Course, ExperimentCourse]:
     "根据传入的 tr 元素，获取对应的 Course 对象"
     td = tr.select("td")
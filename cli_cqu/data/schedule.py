@@ -1,11 +1,33 @@
 """作息时间表
+
+各校区的作息时间保存在同目录的 schedules.json 中，每一项为::
+
+    {"name": "校区名", "aliases": ["别名", ...], "lessons": [["08:00", "08:45"], ...], "full_day": ["08:00", "23:59"]}
+
+lessons 依次为第 1 节起每一节的开始、结束时间；full_day 可省略，默认为第 1 节开始至 23:59，
+用于 13、14 节（全天）以及超出范围的节次。
+
+用户可以在 ``$XDG_CONFIG_HOME/cli_cqu/schedules.json``（默认 ``~/.config/cli_cqu/schedules.json``）
+中以相同格式添加校区或暑期作息，同名的项会覆盖内置的作息时间。
 """
+import json
+import os
 from abc import abstractclassmethod
 from abc import abstractmethod
+from array import array
 from datetime import timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Sequence
 from typing import Tuple
 
-__all__ = ("HuxiSchedule", "ShaPingBaSchedule")
+__all__ = ("ArraySchedule", "HuxiSchedule", "ShaPingBaSchedule", "load_schedules", "available_schedules",
+           "find_schedule")
+
+# 内置作息时间
+BUILTIN_SCHEDULES = Path(__file__).with_name("schedules.json")
 
 
 class Schedule:
@@ -20,68 +42,157 @@ class Schedule:
         ...
 
 
-class HuxiSchedule(Schedule):
-    """重庆大学虎溪校区作息时间
+def _minutes(hhmm: str) -> int:
+    "``08:30`` -> 510"
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
 
-    节次 ：（开始时间，结束时间）
+
+class ArraySchedule(Schedule):
+    """以数组保存的作息时间
+
+    starts[i]、ends[i] 为第 i 节的开始、结束时间，单位为当天零点起的分钟数；
+    下标 0 保存全天使用的时间。
+
+    :param str name: 校区名
+    :param lessons: 每一节的 (开始, 结束)，格式为 ``HH:MM``
+    :param aliases: 选择校区时可用的别名
+    :param full_day: 全天的 (开始, 结束)，默认为第 1 节开始至 23:59
     """
-    __MAP__ = {
-        1: (timedelta(hours=8, minutes=30), timedelta(hours=9, minutes=15)),
-        2: (timedelta(hours=9, minutes=25), timedelta(hours=10, minutes=10)),
-        3: (timedelta(hours=10, minutes=30), timedelta(hours=11, minutes=15)),
-        4: (timedelta(hours=11, minutes=25), timedelta(hours=12, minutes=10)),
-        5: (timedelta(hours=14), timedelta(hours=14, minutes=45)),
-        6: (timedelta(hours=14, minutes=55), timedelta(hours=15, minutes=40)),
-        7: (timedelta(hours=16), timedelta(hours=16, minutes=45)),
-        8: (timedelta(hours=16, minutes=55), timedelta(hours=17, minutes=40)),
-        9: (timedelta(hours=19), timedelta(hours=19, minutes=45)),
-        10: (timedelta(hours=19, minutes=55), timedelta(hours=20, minutes=40)),
-        11: (timedelta(hours=20, minutes=50), timedelta(hours=21, minutes=35)),
-        12: (timedelta(hours=21, minutes=35), timedelta(hours=23, minutes=59)),
-    }
+    def __init__(self,
+                 name: str,
+                 lessons: Sequence[Sequence[str]],
+                 aliases: Sequence[str] = (),
+                 full_day: Sequence[str] = None):
+        if not lessons:
+            raise ValueError(f"作息时间 {name} 没有节次")
+        self.name = name
+        self.aliases = tuple(aliases)
+        minutes = [(_minutes(a), _minutes(b)) for a, b in lessons]
+        if full_day is None:
+            full = (minutes[0][0], 23 * 60 + 59)
+        else:
+            full = (_minutes(full_day[0]), _minutes(full_day[1]))
+        self.starts = array("H", [full[0]] + [a for a, _ in minutes])
+        self.ends = array("H", [full[1]] + [b for _, b in minutes])
+        self.__deltas = [(timedelta(minutes=a), timedelta(minutes=b)) for a, b in zip(self.starts, self.ends)]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ArraySchedule":
+        return cls(data["name"], data["lessons"], data.get("aliases", ()), data.get("full_day"))
+
+    def __len__(self) -> int:
+        "节数"
+        return len(self.starts) - 1
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r}, {len(self)} 节)"
+
+    def index(self, lesson: int) -> int:
+        "节次在数组中的下标，超出范围（包括 13、14 节）时为 0，即全天"
+        return lesson if 1 <= lesson <= len(self) else 0
+
+    def span(self, first: int, last: int) -> Tuple[int, int]:
+        "第 first 至 last 节的开始、结束分钟数"
+        return self.starts[self.index(first)], self.ends[self.index(last)]
+
+    def get(self, index: int, default: Tuple[timedelta, timedelta] = None) -> Tuple[timedelta, timedelta]:
+        "获取指定节次的开始、结束时间，超出范围时返回 default，default 为 None 时返回全天"
+        if 1 <= index <= len(self):
+            return self.__deltas[index]
+        return self.__deltas[0] if default is None else default
 
     def __getitem__(self, index: int) -> Tuple[timedelta, timedelta]:
         return self.get(index)
 
-    @classmethod
-    def get(
-        cls, index: int, default=(timedelta(hours=8, minutes=30), timedelta(hours=23, minutes=59))
-    ) -> Tuple[timedelta, timedelta]:
-        "获取指定节次的开始、结束时间，节次在 1-12 范围之内"
-        if 1 <= index <= 12:
-            return cls.__MAP__[index]
-        else:
-            return default
+    def matches(self, campus: str) -> bool:
+        "campus 是否为本校区的名称或别名"
+        campus = campus.strip().lower()
+        return campus in (n.lower() for n in (self.name, ) + self.aliases)
 
 
-class ShaPingBaSchedule(Schedule):
-    """沙坪坝校区作息时间
+def load_schedules(path: Path) -> List[ArraySchedule]:
+    "从 JSON 文件读取作息时间列表"
+    with open(path, "rt", encoding="utf-8") as fp:
+        return [ArraySchedule.from_dict(item) for item in json.load(fp)]
+
+
+@lru_cache(1)
+def _builtin() -> Dict[str, dict]:
+    with open(BUILTIN_SCHEDULES, "rt", encoding="utf-8") as fp:
+        return {item["name"]: item for item in json.load(fp)}
+
+
+def default_schedules_path() -> Path:
+    "用户自定义作息时间的路径"
+    config = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return Path(config) / "cli_cqu" / "schedules.json"
 
-    节次 ：（开始时间，结束时间）
+
+def available_schedules(path: Path = None) -> List[ArraySchedule]:
+    """内置的作息时间，加上 path（默认为 default_schedules_path）中用户定义的作息时间
+
+    用户定义的同名作息时间替换内置的，其余追加在末尾
     """
-    __MAP__ = {
-        1: (timedelta(hours=8), timedelta(hours=8, minutes=45)),
-        2: (timedelta(hours=8, minutes=55), timedelta(hours=9, minutes=40)),
-        3: (timedelta(hours=10, minutes=10), timedelta(hours=10, minutes=55)),
-        4: (timedelta(hours=11, minutes=5), timedelta(hours=11, minutes=50)),
-        5: (timedelta(hours=14, minutes=30), timedelta(hours=15, minutes=15)),
-        6: (timedelta(hours=15, minutes=25), timedelta(hours=16, minutes=10)),
-        7: (timedelta(hours=16, minutes=40), timedelta(hours=17, minutes=25)),
-        8: (timedelta(hours=17, minutes=35), timedelta(hours=18, minutes=20)),
-        9: (timedelta(hours=19, minutes=30), timedelta(hours=20, minutes=15)),
-        10: (timedelta(hours=20, minutes=25), timedelta(hours=21, minutes=10)),
-        11: (timedelta(hours=21, minutes=20), timedelta(hours=22, minutes=5)),
-        12: (timedelta(hours=22, minutes=5), timedelta(hours=23, minutes=59)),
-    }
+    schedules = [ArraySchedule.from_dict(item) for item in _builtin().values()]
+    path = default_schedules_path() if path is None else Path(path)
+    if path.exists():
+        for extra in load_schedules(path):
+            names = [s.name for s in schedules]
+            if extra.name in names:
+                schedules[names.index(extra.name)] = extra
+            else:
+                schedules.append(extra)
+    return schedules
 
-    def __getitem__(self, index: int) -> Tuple[timedelta, timedelta]:
-        return self.get(index)
 
-    @classmethod
-    def get(cls, index: int, default=(timedelta(hours=8), timedelta(hours=23,
-                                                                    minutes=59))) -> Tuple[timedelta, timedelta]:
-        "获取指定节次的开始、结束时间，节次在 1-12 范围之内"
-        if 1 <= index <= 12:
-            return cls.__MAP__[index]
-        else:
-            return default
+def find_schedule(campus: str, schedules: List[ArraySchedule] = None) -> ArraySchedule:
+    "按序号、名称或别名选择作息时间，找不到时抛出 ValueError"
+    if schedules is None:
+        schedules = available_schedules()
+    campus = str(campus).strip()
+    if campus.isdigit() and int(campus) < len(schedules):
+        return schedules[int(campus)]
+    for schedule in schedules:
+        if schedule.matches(campus):
+            return schedule
+    choices = "、".join(f"{i} {s.name}" for i, s in enumerate(schedules))
+    raise ValueError(f"未知的校区 {campus}，可选的有 {choices}")
+
+
+class _SharedGet:
+    """通过类访问时绑定到该类的共享实例的 ArraySchedule.get
+
+    HuxiSchedule.get、ShaPingBaSchedule.get 原来是类方法，``HuxiSchedule.get(1)`` 这样的调用仍然有效
+    """
+    def __get__(self, obj, cls):
+        if obj is None:
+            obj = _shared(cls)
+        return ArraySchedule.get.__get__(obj, cls)
+
+
+@lru_cache(None)
+def _shared(cls) -> ArraySchedule:
+    return cls()
+
+
+class HuxiSchedule(ArraySchedule):
+    """重庆大学虎溪校区作息时间
+
+    节次 ：（开始时间，结束时间），数据见 schedules.json
+    """
+    get = _SharedGet()
+
+    def __init__(self):
+        super().__init__(**_builtin()["虎溪"])
+
+
+class ShaPingBaSchedule(ArraySchedule):
+    """沙坪坝校区作息时间
+
+    节次 ：（开始时间，结束时间），数据见 schedules.json
+    """
+    get = _SharedGet()
+
+    def __init__(self):
+        super().__init__(**_builtin()["沙坪坝"])
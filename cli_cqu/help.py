@@ -0,0 +1,32 @@
+"""帮助与欢迎信息
+
+只用到标准库，``cli-cqu help`` 不需要导入 App 及其依赖。
+"""
+
+__all__ = ("HELP_COMMANDS", "show_help", "welcome")
+
+# 显示帮助的指令
+HELP_COMMANDS = ("help", "h", "?")
+
+
+def show_help():
+    print("=== help ===")
+    print("""在 `cli cqu>` 提示符后输入指令
+
+    目前提供以下指令：
+    * courses-json * 获取 JSON 格式的课程表
+    * courses-ndjson * 获取课程表，每行一门课程，-o - 表示输出到标准输出
+    * courses-ical * 获取 ICalendar 日历日程格式的课程表
+    * courses-ical-sync * 与上次同步的结果对比，只导出新增、变更和取消的日程
+    * courses-conflicts * 列出课程表中上课时间重叠的课程
+    * help | h | ? * 获取帮助信息
+    * exit * 退出程序
+
+    命令行参数 -s/--semesters（如 all、0-3）可让 courses-json 并发获取多个学期，
+    -o/--output 指定输出文件名。
+    """)
+
+
+def welcome():
+    print("=== welcome ===")
+    print("""欢迎使用 CLI CQU，你可以输入 help 查看帮助""")
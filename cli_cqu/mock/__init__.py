@@ -0,0 +1,16 @@
+"""jxgl、oldjw 的本地替身
+
+- cli_cqu.mock.server 模拟登录流程与查询接口的 HTTP 服务器
+- cli_cqu.mock.pages 页面生成器
+
+命令行启动::
+
+    python -m cli_cqu.mock --port 8000 --latency 0.05 --error-rate 0.01
+
+再给 cli-cqu 加上 ``--hosts jxgl.cqu.edu.cn=127.0.0.1:8000,oldjw.cqu.edu.cn=127.0.0.1:8000``
+即可让它访问本地服务器。
+"""
+from .server import MockConfig
+from .server import MockServer
+
+__all__ = ("MockConfig", "MockServer")
@@ -0,0 +1,36 @@
+"启动 mock 服务器"
+from argparse import ArgumentParser
+
+from .server import MockConfig
+from .server import MockServer
+
+
+def main():
+    parser = ArgumentParser("python -m cli_cqu.mock", description="jxgl、oldjw 的本地替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--password", help="任意学号都可以用此密码登录 jxgl 和老教务网", default="123456")
+    parser.add_argument("--dsafeid-wait", help="设置 DSafeId 后至少等待的秒数", type=float, default=0.5)
+    parser.add_argument("--latency", help="每个请求的延迟（秒）", type=float, default=0.0)
+    parser.add_argument("--jitter", help="延迟的随机增量上限（秒）", type=float, default=0.0)
+    parser.add_argument("--error-rate", help="返回 500 的比例", type=float, default=0.0)
+    parser.add_argument("--drop-rate", help="直接断开连接的比例", type=float, default=0.0)
+    args = parser.parse_args()
+    config = MockConfig(default_password=args.password,
+                        dsafeid_wait=args.dsafeid_wait,
+                        latency=args.latency,
+                        jitter=args.jitter,
+                        error_rate=args.error_rate,
+                        drop_rate=args.drop_rate)
+    server = MockServer(config, args.host, args.port)
+    hosts = ",".join(f"{host}={target}" for host, target in server.hosts().items())
+    print(f"mock 服务器运行在 http://{server.address}")
+    print(f"cli-cqu --hosts {hosts} ...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""jxgl、oldjw 页面的生成器
+
+按线上页面的结构生成任意行数的个人课表、课表查询结果和成绩单页面，
+供 mock 服务器、测试和性能基准使用。相同的 seed 总是生成相同的页面。
+"""
+import random
+
+__all__ = ("synth_courses_table", "synth_transcript", "synth_personal_courses")
+
+_SURNAMES = "赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦尤许何吕施张孔曹严华金魏陶姜"
+_GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂"
+_SUBJECTS = ("高等数学", "线性代数", "大学英语", "大学物理", "程序设计", "数据结构", "概率论", "电路原理", "马克思主义基本原理", "体育")
+_CLASSIFIERS = ("必修", "选修", "通识", "公共基础")
+_DAYS = "一二三四五六日"
+_LESSONS = ("1-2", "3-4", "5-6", "7-8", "9-11", "9-12", "14")
+_WEEKS = ("1-16", "1-8", "9-16", "1-9,11-16", "2-17", "5")
+_BUILDINGS = ("D", "A", "B", "C", "DYC", "LT")
+
+
+def _name(rnd: random.Random) -> str:
+    return rnd.choice(_SURNAMES) + "".join(rnd.choice(_GIVEN) for _ in range(rnd.randint(1, 2)))
+
+
+def _location(rnd: random.Random) -> str:
+    return f"{rnd.choice(_BUILDINGS)}{rnd.randint(1, 5)}{rnd.randint(1, 4)}{rnd.randint(1, 20):02d}"
+
+
+def _td(value, hidden: bool) -> str:
+    return f'<td hidevalue="{value}"></td>' if hidden else f"<td>{value}</td>"
+
+
+def _course_rows(rnd: random.Random, n: int) -> str:
+    rows = []
+    i = 0
+    while i < n:
+        identifier = f"[{rnd.randint(10000000, 99999999)}]{rnd.choice(_SUBJECTS)}"
+        score = rnd.choice((1.0, 2.0, 3.0, 4.0, 5.0))
+        total = score * 16
+        teach = total - rnd.choice((0, 8, 16)) if total > 16 else total
+        fixed = (identifier, score, total, teach, total - teach, rnd.choice(_CLASSIFIERS), "讲授", rnd.choice(("考试", "考查")),
+                 _name(rnd))
+        # 同一门课的后续时间段用 hidevalue 合并单元格
+        for k in range(min(rnd.randint(1, 3), n - i)):
+            i += 1
+            cells = "".join(_td(v, k > 0) for v in fixed)
+            week = rnd.choice(_WEEKS)
+            day = f"{rnd.choice(_DAYS[:5])}[{rnd.choice(_LESSONS)}节]"
+            rows.append(f"<tr><td>{i}</td>{cells}<td>{week}</td><td>{day}</td><td>{_location(rnd)}</td></tr>")
+    return "\n".join(rows)
+
+
+def _experiment_rows(rnd: random.Random, n: int) -> str:
+    rows = []
+    i = 0
+    while i < n:
+        fixed = (f"[{rnd.randint(10000000, 99999999)}]{rnd.choice(_SUBJECTS)}实验", 1.0, 32.0, 0.0, 32.0)
+        teacher, hosting, location = _name(rnd), _name(rnd), f"{rnd.choice(_SUBJECTS)}实验室"
+        for k in range(min(rnd.randint(1, 4), n - i)):
+            i += 1
+            cells = "".join(_td(v, k > 0) for v in fixed)
+            project = f"实验项目{rnd.randint(1, 30)}"
+            week = str(rnd.randint(1, 17))
+            day = f"{rnd.choice(_DAYS)}[{rnd.choice(_LESSONS[:5])}节]"
+            rows.append(f"<tr><td>{i}</td>{cells}<td>{project}</td>{_td(teacher, k > 0)}{_td(hosting, k > 0)}"
+                        f"<td>{week}</td><td>{day}</td>{_td(location, k > 0)}</tr>")
+    return "\n".join(rows)
+
+
+_COURSE_HEAD = ("序号", "课程", "学分", "总学时", "讲授学时", "上机学时", "类别", "授课方式", "考核方式", "任课教师", "周次", "节次", "地点")
+_EXPERIMENT_HEAD = ("序号", "课程", "学分", "总学时", "讲授学时", "上机学时", "项目名称", "任课教师", "值班教师", "周次", "节次", "地点")
+
+
+def _table(head, rows: str) -> str:
+    cells = "".join(f"<td>{h}</td>" for h in head)
+    return f'<table class="page_table"><thead><tr>{cells}</tr></thead>\n<tbody>\n{rows}\n</tbody></table>'
+
+
+def synth_courses_table(n_courses: int, n_experiments: int = 0, seed: int = 0) -> str:
+    "生成个人课表查询结果页面，包含 n_courses 行理论课和 n_experiments 行实验课"
+    rnd = random.Random(seed)
+    tables = [_table(_COURSE_HEAD, _course_rows(rnd, n_courses))]
+    if n_experiments:
+        tables.append(_table(_EXPERIMENT_HEAD, _experiment_rows(rnd, n_experiments)))
+    body = "\n<br/>\n".join(tables)
+    return f"<html><head><title>个人课表</title></head><body>\n{body}\n</body></html>"
+
+
+def synth_personal_courses(n_semesters: int = 4, first_year: int = 2017) -> str:
+    "生成个人课表页面（学年学期选择框）"
+    options = []
+    for k in range(n_semesters):
+        year, term = first_year + k // 2, k % 2
+        options.append(f'<option value="{year}{term}">{year}-{year + 1}学年第{"一二"[term]}学期</option>')
+    options.reverse()
+    return ('<html><body><form name="frm" method="post" action="Pri_StuSel_rpt.aspx">'
+            f'<select name="Sel_XNXQ">{"".join(options)}</select>'
+            '<select name="px"><option value="0">按课程</option><option value="1">按时间</option></select>'
+            '<input type="radio" name="rad" value="on" checked>'
+            '</form></body></html>')
+
+
+_GRADES = ("优", "良", "中", "及格", "不及格", "合格")
+
+
+def synth_transcript(n_rows: int, seed: int = 0, student_id: str = "20170001") -> str:
+    "生成老教务网的成绩单页面"
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(1, n_rows + 1):
+        grade = str(rnd.randint(40, 100)) if rnd.random() < 0.85 else rnd.choice(_GRADES)
+        year = 2017 + rnd.randint(0, 3)
+        term = f"{year}-{year + 1}({rnd.randint(1, 2)})"
+        cells = (i, f"{rnd.randint(10000000, 99999999)}", rnd.choice(_SUBJECTS), grade, rnd.choice(("1.0", "2.0", "3.0", "4.0")),
+                 rnd.choice(("必修", "任选")), rnd.choice(("公共基础", "专业基础", "专业", "通识")), _name(rnd),
+                 rnd.choice(("初修", "重修", "补考")), "", term)
+        rows.append("<tr>" + "".join(f"<td>\n  {c}\n</td>" for c in cells) + "</tr>")
+    rows = "\n".join(rows)
+    return f"""<html><head><meta http-equiv="Content-Type" content="text/html; charset=gb2312"><title>成绩单</title></head>
+<body>
+<table width="100%">
+<tr><td><p align="center">重庆大学学生成绩总表</p><p><b>学号：{student_id}</b>　<b>姓名：{_name(rnd)}</b>　<b>专业：软件工程</b>　<b>GPA：{rnd.uniform(2, 4):.2f}</b></p></td></tr>
+<tr><td>查询时间：2020-02-20 10:00:00</td></tr>
+<tr><td>序号</td><td>课程编码</td><td>课程名称</td><td>成绩</td><td>学分</td><td>选修</td><td>类别</td><td>教师</td><td>考别</td><td>备注</td><td>时间</td></tr>
+{rows}
+<tr><td colspan="11">共 {n_rows} 门课程</td></tr>
+</table>
+</body></html>"""
@@ -0,0 +1,386 @@
+"""jxgl、oldjw 的本地替身服务器
+
+按线上的行为实现登录与查询流程，用于测试和压力测试：
+
+- ``/home.aspx``：没有有效的 DSafeId 时返回设置 DSafeId 的跳转页；
+  设置 DSafeId 满 ``dsafeid_wait`` 秒之后再访问，才下发 ASP.NET_SessionId 和 _D_SID，
+  等待不足时重新返回跳转页
+- ``/_data/index_login.aspx``：GET 返回带 __VIEWSTATE 的登录表单，POST 按 chkpwd 校验密码，
+  返回 GBK 编码的结果页面。与 WebForms 一样 __VIEWSTATE 属于页面而不是会话，所有会话相同，
+  ``MockServer.rotate_viewstate`` 模拟重新部署后的变化；过期的 __VIEWSTATE 会重新得到登录表单
+- ``/MAINFRM.aspx``：已登录时返回主页，否则返回跳转页
+- ``/znpk/Pri_StuSel.aspx``、``/znpk/Pri_StuSel_rpt.aspx``：学年学期列表和课表
+- ``/login.asp``、``/score/sel_score/sum_score_sel.asp``：老教务网登录和 GBK 编码的成绩单
+
+页面由 cli_cqu.mock.pages 按学号和学期生成，同一帐号每次得到相同的页面。
+可以为每个请求加上延迟，并按比例返回 500 或直接断开连接。
+"""
+import random
+import secrets
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+from zlib import crc32
+
+from ..data import HOST
+from ..data.js_equality import chkpwd
+from ..data.route import Route
+from .pages import synth_courses_table
+from .pages import synth_personal_courses
+from .pages import synth_transcript
+
+__all__ = ("MockConfig", "MockServer")
+
+DSAFEID_PAGE = """<html><head><script type="text/javascript">
+document.cookie='DSafeId=%s;';
+window.location.reload();
+</script></head><body></body></html>"""
+
+LOGIN_PAGE = """<html><body>
+<form name="Logon" method="post" action="index_login.aspx" id="Logon">
+<input type="hidden" name="__VIEWSTATE" value="%s" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" value="%s" />
+<input name="txt_dsdsdsdjkjkjc" type="text" />
+</form></body></html>"""
+
+LOGIN_OK = "<html><body><span>正在加载权限数据...</span></body></html>"
+LOGIN_WRONG = "<html><body><script>alert('账号或密码不正确！请重新输入。');</script></body></html>"
+LOGIN_UNKNOWN = "<html><body><script>alert('该账号尚未分配角色!');</script></body></html>"
+MAIN_PAGE = "<html><head><title>教学管理信息系统</title></head><body><frameset></frameset></body></html>"
+OLDJW_WRONG = "<html><body>你的密码不正确，请到教务处咨询(学生密码错误请向学院教务人员或辅导员查询)!</body></html>"
+OLDJW_OK = "<html><body><script>location='score/sel_score/sum_score_sel.asp'</script></body></html>"
+
+OLDJW_LOGIN = urlsplit(Route.Assignment.oldjw_login).path
+OLDJW_TRANSCRIPT = urlsplit(Route.Assignment.whole_assignment).path
+
+
+class MockConfig(NamedTuple):
+    "mock 服务器的行为"
+    # 学号 -> (jxgl 密码, 老教务网密码)；为 None 时接受任何学号，密码均为 default_password
+    accounts: Optional[Dict[str, tuple]] = None
+    default_password: str = "123456"
+    # 设置 DSafeId 之后至少等待的秒数
+    dsafeid_wait: float = 0.5
+    # 每个请求的延迟（秒），在 [latency, latency + jitter] 之间均匀分布
+    latency: float = 0.0
+    jitter: float = 0.0
+    # 返回 500 的比例
+    error_rate: float = 0.0
+    # 不应答直接断开连接的比例
+    drop_rate: float = 0.0
+    # 学年学期数
+    semesters: int = 4
+    # 每学期的课程行数、实验课行数，以及成绩单行数
+    courses: int = 12
+    experiments: int = 4
+    transcript_rows: int = 60
+    seed: int = 0
+
+
+class _State:
+    "服务器端的会话"
+    def __init__(self):
+        self.lock = threading.Lock()
+        # DSafeId -> 下发时刻
+        self.dsafe: Dict[str, float] = {}
+        # ASP.NET_SessionId -> 已登录的学号，未登录为 None
+        self.sessions: Dict[str, Optional[str]] = {}
+        # 登录表单的 (__VIEWSTATE, __VIEWSTATEGENERATOR)
+        self.viewstate = self.new_viewstate()
+        # 老教务网会话 -> 学号
+        self.oldjw: Dict[str, str] = {}
+        self.stats = {
+            "requests": 0,
+            "logins": 0,
+            "login_failures": 0,
+            "errors_injected": 0,
+            "dropped": 0,
+            "dsafe_pages": 0,
+            "login_forms": 0,
+            "stale_forms": 0,
+        }
+
+    @staticmethod
+    def new_viewstate() -> tuple:
+        return secrets.token_urlsafe(24), secrets.token_hex(4).upper()
+
+    def count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---- 工具 ----
+
+    @property
+    def config(self) -> MockConfig:
+        return self.server.config
+
+    @property
+    def state(self) -> _State:
+        return self.server.state
+
+    def cookies(self) -> Dict[str, str]:
+        jar = SimpleCookie()
+        for header in self.headers.get_all("Cookie", ()):
+            jar.load(header)
+        return {k: m.value for k, m in jar.items()}
+
+    def form(self) -> Dict[str, str]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+        return {k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()}
+
+    def reply(self, body: str, status: int = 200, encoding: str = "utf-8", cookies: Dict[str, str] = None):
+        data = body.encode(encoding)
+        self.send_response(status)
+        self.send_header("Content-Type", f"text/html; charset={encoding}")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (cookies or {}).items():
+            self.send_header("Set-Cookie", f"{name}={value}; path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def password(self, username: str, oldjw: bool = False) -> Optional[str]:
+        "帐号的密码，帐号不存在时为 None"
+        accounts = self.config.accounts
+        if accounts is None:
+            return self.config.default_password
+        if username not in accounts:
+            return None
+        return accounts[username][1 if oldjw else 0]
+
+    def user(self) -> Optional[str]:
+        "当前 jxgl 会话已登录的学号"
+        with self.state.lock:
+            return self.state.sessions.get(self.cookies().get("ASP.NET_SessionId"))
+
+    def dsafe_page(self):
+        token = secrets.token_hex(8).upper()
+        with self.state.lock:
+            self.state.dsafe[token] = time.monotonic()
+        self.state.count("dsafe_pages")
+        self.reply(DSAFEID_PAGE % token)
+
+    def seed(self, *parts) -> int:
+        return crc32("|".join(map(str, (self.config.seed, ) + parts)).encode())
+
+    # ---- 分发 ----
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method: str):
+        self.state.count("requests")
+        form = self.form() if method == "POST" else {}
+        config = self.config
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.random() * config.jitter)
+        if config.drop_rate and random.random() < config.drop_rate:
+            self.state.count("dropped")
+            self.close_connection = True
+            return
+        if config.error_rate and random.random() < config.error_rate:
+            self.state.count("errors_injected")
+            self.reply("<html><body>Server Error</body></html>", 500)
+            return
+        path = urlsplit(self.path).path
+        handler = ROUTES.get((method, path.lower()))
+        if handler is None:
+            self.reply("<html><body>Not Found</body></html>", 404)
+            return
+        handler(self, form)
+
+    # ---- jxgl ----
+
+    def home(self, form: dict):
+        cookies = self.cookies()
+        with self.state.lock:
+            issued = self.state.dsafe.get(cookies.get("DSafeId"))
+            logged_in = cookies.get("ASP.NET_SessionId") in self.state.sessions
+        if logged_in:
+            self.reply(MAIN_PAGE)
+        elif issued is None or time.monotonic() - issued < self.config.dsafeid_wait:
+            self.dsafe_page()
+        else:
+            session_id = secrets.token_hex(12)
+            with self.state.lock:
+                self.state.sessions[session_id] = None
+            self.reply(MAIN_PAGE, cookies={"ASP.NET_SessionId": session_id, "_D_SID": secrets.token_hex(8).upper()})
+
+    def login_form(self, form: dict):
+        self.state.count("login_forms")
+        with self.state.lock:
+            viewstate = self.state.viewstate
+        self.reply(LOGIN_PAGE % viewstate)
+
+    def login(self, form: dict):
+        session_id = self.cookies().get("ASP.NET_SessionId", "")
+        username = form.get("txt_dsdsdsdjkjkjc", "")
+        password = self.password(username)
+        with self.state.lock:
+            viewstate = self.state.viewstate
+        if viewstate != (form.get("__VIEWSTATE"), form.get("__VIEWSTATEGENERATOR")):
+            # 视图状态校验在处理表单之前，过期时重新呈现登录页
+            self.state.count("stale_forms")
+            self.reply(LOGIN_PAGE % viewstate, encoding="gbk")
+            return
+        if password is None:
+            page = LOGIN_UNKNOWN
+        elif form.get("efdfdfuuyyuuckjg") != chkpwd(username, password):
+            page = LOGIN_WRONG
+        else:
+            page = LOGIN_OK
+        with self.state.lock:
+            ok = page is LOGIN_OK and session_id in self.state.sessions
+            if ok:
+                self.state.sessions[session_id] = username
+        self.state.count("logins" if ok else "login_failures")
+        self.reply(page, encoding="gbk")
+
+    def mainform(self, form: dict):
+        if self.user() is None:
+            self.dsafe_page()
+        else:
+            self.reply(MAIN_PAGE)
+
+    def personal_courses(self, form: dict):
+        if self.user() is None:
+            self.dsafe_page()
+        else:
+            self.reply(synth_personal_courses(self.config.semesters))
+
+    def personal_courses_table(self, form: dict):
+        username = self.user()
+        if username is None:
+            self.dsafe_page()
+            return
+        config = self.config
+        xnxq = form.get("Sel_XNXQ", "")
+        self.reply(synth_courses_table(config.courses, config.experiments, self.seed(username, xnxq)))
+
+    # ---- oldjw ----
+
+    def oldjw_login(self, form: dict):
+        username = form.get("username", "")
+        if self.password(username, oldjw=True) != form.get("password"):
+            self.state.count("login_failures")
+            self.reply(OLDJW_WRONG, encoding="gbk")
+            return
+        session_id = secrets.token_hex(12).upper()
+        with self.state.lock:
+            self.state.oldjw[session_id] = username
+        self.state.count("logins")
+        self.reply(OLDJW_OK, encoding="gbk", cookies={"ASPSESSIONIDMOCK": session_id})
+
+    def whole_assignment(self, form: dict):
+        with self.state.lock:
+            username = self.state.oldjw.get(self.cookies().get("ASPSESSIONIDMOCK"))
+        if username is None:
+            self.reply(OLDJW_WRONG, encoding="gbk")
+        else:
+            self.reply(synth_transcript(self.config.transcript_rows, self.seed(username), username), encoding="gbk")
+
+
+ROUTES = {
+    ("GET", Route.home.lower()): _Handler.home,
+    ("GET", "/_data/index_login.aspx"): _Handler.login_form,
+    ("POST", "/_data/index_login.aspx"): _Handler.login,
+    ("GET", Route.mainform.lower()): _Handler.mainform,
+    ("GET", Route.TeachingArrangement.personal_courses.lower()): _Handler.personal_courses,
+    ("POST", Route.TeachingArrangement.personal_courses_table.lower()): _Handler.personal_courses_table,
+    ("POST", OLDJW_LOGIN.lower()): _Handler.oldjw_login,
+    ("GET", OLDJW_TRANSCRIPT.lower()): _Handler.whole_assignment,
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: MockConfig):
+        self.config = config
+        self.state = _State()
+        super().__init__(address, _Handler)
+
+
+class MockServer:
+    """在后台线程中运行的 mock 服务器
+
+    作为上下文管理器使用时，会在 with 块内把 jxgl、oldjw 的请求改发到本服务器
+    （参考 util.scheduler.HOST_OVERRIDES）::
+
+        with MockServer(MockConfig(latency=0.05)) as server:
+            app = App("20170001", "123456")
+    """
+    def __init__(self, config: MockConfig = MockConfig(), host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.__server = _Server((host, port), config)
+        self.__thread: threading.Thread = None
+        self.__previous: Dict[str, Optional[str]] = {}
+
+    @property
+    def address(self) -> str:
+        "``地址:端口``"
+        host, port = self.__server.server_address[:2]
+        return f"{host}:{port}"
+
+    def hosts(self) -> Dict[str, str]:
+        "应当改发到本服务器的主机"
+        oldjw = urlsplit(Route.Assignment.oldjw_login).hostname
+        return {HOST.DOMAIN: self.address, oldjw: self.address}
+
+    def stats(self) -> dict:
+        "请求数、登录成功与失败次数、注入的错误数，以及下发的 DSafeId 跳转页、登录表单、过期表单的个数"
+        with self.__server.state.lock:
+            return dict(self.__server.state.stats)
+
+    def rotate_viewstate(self):
+        "更换登录表单的 __VIEWSTATE，之前取得的表单随之过期"
+        with self.__server.state.lock:
+            self.__server.state.viewstate = _State.new_viewstate()
+
+    def start(self) -> "MockServer":
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="cli-cqu-mock", daemon=True)
+        self.__thread.start()
+        return self
+
+    def serve_forever(self):
+        self.__server.serve_forever()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __enter__(self) -> "MockServer":
+        from ..util.scheduler import HOST_OVERRIDES
+        for host, target in self.hosts().items():
+            self.__previous[host] = HOST_OVERRIDES.get(host)
+            HOST_OVERRIDES[host] = target
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        from ..util.scheduler import HOST_OVERRIDES
+        for host, target in self.__previous.items():
+            if target is None:
+                HOST_OVERRIDES.pop(host, None)
+            else:
+                HOST_OVERRIDES[host] = target
+        self.stop()
@@ -1,6 +1,8 @@
+from typing import Union
+
 from pydantic import BaseModel
 
-__all__ = ("Course", "ExperimentCourse")
+__all__ = ("Course", "ExperimentCourse", "CourseRecord", "ExperimentCourseRecord", "to_record", "record_from_dict")
 
 
 class Course(BaseModel):
@@ -55,3 +57,65 @@ class ExperimentCourse(BaseModel):
     day_schedule: str
     # 地点
     location: str
+
+
+class Record:
+    """不做校验的紧凑记录，字段与对应的 pydantic 模型一致
+
+    用于批量处理大量课程，只在 API 边界处通过 to_model、from_model 与模型互相转换。
+    """
+    __slots__ = ()
+    _model = None
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def dict(self) -> dict:
+        "与 BaseModel.dict 的结果相同"
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_model(self) -> BaseModel:
+        return self._model(**self.dict())
+
+    @classmethod
+    def from_model(cls, model: BaseModel) -> "Record":
+        return cls(**model.dict())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.dict() == other.dict()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class CourseRecord(Record):
+    "Course 的紧凑版本"
+    __slots__ = tuple(Course.__fields__)
+    _model = Course
+
+
+class ExperimentCourseRecord(Record):
+    "ExperimentCourse 的紧凑版本"
+    __slots__ = tuple(ExperimentCourse.__fields__)
+    _model = ExperimentCourse
+
+
+def to_record(course: Union[Course, ExperimentCourse]) -> Record:
+    "将 Course、ExperimentCourse 转换为对应的紧凑记录"
+    if isinstance(course, Course):
+        return CourseRecord.from_model(course)
+    elif isinstance(course, ExperimentCourse):
+        return ExperimentCourseRecord.from_model(course)
+    raise TypeError(f"{course} 需要是 Course 或 ExperimentCourse，但却是 {type(course)}")
+
+
+def record_from_dict(data: dict) -> Record:
+    "由 dict() 的结果（例如 courses-json 导出的 JSON）还原紧凑记录，忽略多余的字段"
+    record = ExperimentCourseRecord if "project_name" in data else CourseRecord
+    return record(**{name: data[name] for name in record.__slots__})
@@ -0,0 +1,150 @@
+"""磁盘上的 HTTP 响应缓存
+
+学年学期列表、课程表这类页面一学期才变一次，没有必要每次运行都重新下载。
+CacheAdapter 作为 requests 的传输层挂载到 Session 上，对 route.ROUTE_TTL 中列出的路由，
+以 (方法, 路由, 表单数据, 用户) 的摘要为键缓存响应；离线模式下只从缓存读取，不发出任何请求。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+from typing import Tuple
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from ..data.route import ROUTE_TTL
+from .trace import span
+
+__all__ = ("ResponseCache", "CacheAdapter", "CacheMiss")
+
+# 会话失效时服务器仍以 200 返回 DSafeId 跳转页或登录页，与 session.is_session_alive 的判断一致
+EXPIRED_MARKERS = (b"DSafeId", b'id="Logon"')
+
+
+class CacheMiss(LookupError):
+    "离线模式下缓存中没有对应的响应"
+    pass
+
+
+def default_cache_dir() -> Path:
+    "缓存目录的默认位置，遵循 XDG_CACHE_HOME"
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "cli_cqu" / "responses"
+
+
+class ResponseCache:
+    """以请求摘要为文件名保存响应
+
+    每个文件的第一行是 JSON 格式的元数据（状态码、响应头、保存时间），其后是原始的响应体。
+    """
+    def __init__(self, root: Path = None):
+        self.root = Path(root) if root is not None else default_cache_dir()
+
+    @staticmethod
+    def key(method: str, path: str, body, user: str) -> str:
+        "表单字段排序后参与计算，字段顺序不影响缓存命中"
+        if isinstance(body, bytes):
+            body = body.decode("latin-1")
+        form = sorted(parse_qsl(body or "", keep_blank_values=True))
+        material = json.dumps([method.upper(), path, form, user], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str, ttl: float = None) -> Optional[Tuple[dict, bytes]]:
+        "读取 (元数据, 响应体)，不存在或超过 ttl 秒则返回 None；ttl 为 None 时不检查过期"
+        try:
+            with open(self.path(key), "rb") as fp:
+                meta = json.loads(fp.readline().decode("utf-8"))
+                body = fp.read()
+        except (OSError, ValueError):
+            return None
+        if ttl is not None and meta["time"] + ttl <= time.time():
+            return None
+        return meta, body
+
+    def put(self, key: str, status: int, headers: dict, body: bytes):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"status": status, "headers": headers, "time": time.time()}
+        # 每次写入独占一个临时文件，同一进程的多个线程同时写入同一个键也不会互相截断
+        fd, tmp = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=str(path.parent))
+        try:
+            with open(fd, "wb") as fp:
+                fp.write(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+                fp.write(b"\n")
+                fp.write(body)
+            os.replace(tmp, str(path))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class CacheAdapter(BaseAdapter):
+    """带缓存的传输层，未缓存的路由和缓存未命中的请求交给 inner 处理
+
+    :param ResponseCache cache: 缓存
+    :param str user: 用户名，不同用户的缓存互不影响
+    :param BaseAdapter inner: 实际发出请求的传输层
+    :param bool offline: 离线模式，只从缓存读取（忽略过期时间），未命中时抛出 CacheMiss
+    """
+    def __init__(self, cache: ResponseCache, user: str, inner: BaseAdapter = None, offline: bool = False):
+        super().__init__()
+        self.cache = cache
+        self.user = user
+        self.inner = inner if inner is not None else HTTPAdapter()
+        self.offline = offline
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        path = urlsplit(request.url).path
+        ttl = ROUTE_TTL.get(path)
+        if ttl is None:
+            if self.offline:
+                raise CacheMiss(f"离线模式下无法请求 {request.method} {request.url}")
+            return self.inner.send(request, **kwargs)
+
+        key = self.cache.key(request.method, path, request.body, self.user)
+        with span("cache", f"{request.method} {path}") as sp:
+            hit = self.cache.get(key, None if self.offline else ttl)
+            sp.set(hit=hit is not None)
+        if hit is not None:
+            meta, body = hit
+            return self.build_response(request, meta["status"], meta["headers"], body)
+        if self.offline:
+            raise CacheMiss(f"缓存中没有 {request.method} {request.url} 的响应")
+
+        resp = self.inner.send(request, **kwargs)
+        if resp.status_code == 200 and not any(m in resp.content for m in EXPIRED_MARKERS):
+            # 缓存的是解压后的内容，去掉与之不符的响应头
+            headers = {k: v for k, v in resp.headers.items() if k.lower() not in ("content-encoding", "set-cookie")}
+            self.cache.put(key, resp.status_code, headers, resp.content)
+        return resp
+
+    @staticmethod
+    def build_response(request: PreparedRequest, status: int, headers: dict, body: bytes) -> Response:
+        resp = Response()
+        resp.status_code = status
+        resp.headers = CaseInsensitiveDict(headers)
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.raw = BytesIO(body)
+        resp._content = body
+        resp._content_consumed = True
+        resp.url = request.url
+        resp.request = request
+        resp.reason = "OK (cached)"
+        return resp
+
+    def close(self):
+        self.inner.close()
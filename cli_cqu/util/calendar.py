@@ -1,54 +1,109 @@
 """制作日历日程"""
 from datetime import date
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Tuple
 from typing import Union
 import re
+from hashlib import sha1
 from icalendar import Calendar
 from icalendar import Event
-from copy import deepcopy
-from ..data.schedule import HuxiSchedule
+from icalendar import vText
+from ..data.schedule import Schedule
 from ..data.schedule import ShaPingBaSchedule
 from ..model import Course
+from ..model import CourseRecord
 from ..model import ExperimentCourse
-from ..util.datetime import materialize_calendar
+from ..model import ExperimentCourseRecord
+from ..util.datetime import materialize_calendars
 
-__all__ = ("make_ical")
+__all__ = ("make_ical", "write_ical", "event_uid", "iter_events")
 
+P_FIRST_WEEK = re.compile(r"^(\d+)")
 
-def make_ical(courses: List[Union[Course, ExperimentCourse]],
+
+def make_ical(courses: List[Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]],
               start: date,
-              schedule: Union[HuxiSchedule, ShaPingBaSchedule] = ShaPingBaSchedule()) -> Calendar:
+              schedule: Schedule = ShaPingBaSchedule()) -> Calendar:
+    cal = make_calendar()
+    for _, ev in iter_events(courses, start, schedule):
+        cal.add_component(ev)
+    return cal
+
+
+def write_ical(courses: Iterable[Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]],
+               start: date,
+               schedule: Schedule,
+               out: BinaryIO) -> int:
+    """流式导出日历，边生成边将 VEVENT 写入 out，返回写入的事件数
+
+    输出与 ``make_ical(...).to_ical()`` 完全相同，但不在内存中保留整个 Calendar。
+    """
+    head = make_calendar().to_ical()
+    tail = b"END:VCALENDAR\r\n"
+    out.write(head[:-len(tail)])
+    n = 0
+    for _, ev in iter_events(courses, start, schedule):
+        out.write(ev.to_ical())
+        n += 1
+    out.write(tail)
+    return n
+
+
+def make_calendar() -> Calendar:
+    "不含事件的日历"
     cal = Calendar()
     cal.add("prodid", "-//Zombie110year//CLI CQU//")
     cal.add("version", "2.0")
-    for course in courses:
-        for ev in build_event(course, start, schedule):
-            cal.add_component(ev)
     return cal
 
 
-def build_event(course: Union[Course, ExperimentCourse], start: date,
-                schedule: Union[HuxiSchedule, ShaPingBaSchedule]) -> List[Event]:
-    proto = Event()
-    proto.add("summary", course.identifier)
-    proto.add("location", course.location)
-    if isinstance(course, Course):
-        proto.add("description", f"教师：{course.teacher}")
-    elif isinstance(course, ExperimentCourse):
-        proto.add("description", f"教师：{course.teacher}；值班教师：{course.hosting_teacher}；\n项目：{course.project_name}")
+def iter_events(courses: Iterable[Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]], start: date,
+                schedule: Schedule) -> Iterator[Tuple[Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord],
+                                                      Event]]:
+    """逐门课程产出 (课程, 事件)，保证 UID 不重复
+
+    同一课程在同一周次段、节次有多行（地点或教师不同）时，之后的行改用把地点和教师也计入的 UID；
+    这些也完全相同的课程行只产出一次。只记录已产出的 UID，不保留事件
+    """
+    seen = set()
+    for course in courses:
+        events = build_event(course, start, schedule)
+        if any(str(ev["uid"]) in seen for ev in events):
+            events = [ev for ev in build_event(course, start, schedule, distinct=True) if str(ev["uid"]) not in seen]
+        for ev in events:
+            seen.add(str(ev["uid"]))
+            yield course, ev
+
+
+def build_event(course: Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord],
+                start: date,
+                schedule: Schedule,
+                distinct: bool = False) -> List[Event]:
+    "课程每个周次段的事件，distinct 参考 event_uid"
+    if isinstance(course, (Course, CourseRecord)):
+        description = f"教师：{course.teacher}"
+    elif isinstance(course, (ExperimentCourse, ExperimentCourseRecord)):
+        description = f"教师：{course.teacher}；值班教师：{course.hosting_teacher}；\n项目：{course.project_name}"
     else:
         raise TypeError(f"{course} 需要是 Course 或 ExperimentCourse，但却是 {type(course)}")
+    # 各周次共享的属性只编码一次
+    summary = vText(course.identifier)
+    location = vText(course.location)
+    description = vText(description)
 
     results = []
     weeks = course.week_schedule.split(",") if "," in course.week_schedule else [course.week_schedule]
-    for week in weeks:
-        ev: Event = deepcopy(proto)
-        t_week = re.match(r"^(\d+)", week)[1]
-        t_lesson = course.day_schedule
-        first_lesson = materialize_calendar(t_week, t_lesson, start, schedule)
-        dt_start, dt_end = first_lesson
-
+    first_lessons = materialize_calendars([(P_FIRST_WEEK.match(week)[1], course.day_schedule) for week in weeks], start,
+                                          schedule)
+    for week, (dt_start, dt_end) in zip(weeks, first_lessons):
+        ev = Event()
+        ev.add("uid", event_uid(course, week, distinct))
+        ev.add("summary", summary)
+        ev.add("location", location)
+        ev.add("description", description)
         ev.add("dtstart", dt_start)
         ev.add("dtend", dt_end)
 
@@ -63,6 +118,20 @@ def build_event(course: Union[Course, ExperimentCourse], start: date,
     return results
 
 
+def event_uid(course: Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord],
+              week: str,
+              distinct: bool = False) -> str:
+    """由课程、周次段和节次得到稳定的事件 UID，同一事件在多次导出之间保持不变
+
+    地点和教师不计入 UID，换教室、换教师时日历应用更新原来的事件；
+    distinct 为真时也计入，用于区分同一课程、周次段、节次的多行，参考 iter_events
+    """
+    material = f"{course.identifier}|{week}|{course.day_schedule}"
+    if distinct:
+        material = f"{material}|{course.location}|{course.teacher}"
+    return f"{sha1(material.encode('utf-8')).hexdigest()[:24]}@cli-cqu"
+
+
 # depracated
 def make_range(string: str) -> List[Tuple[str]]:
     """将 ``1-9``, ``1-4,6-9`` 这样的字符串解析为最小单位（a-b 或 n）序列。
@@ -0,0 +1,146 @@
+"""课表冲突检测
+
+把课程的每一次上课按作息时间展开为以分钟表示的区间（从第 1 周周一零点起算），
+按开始时间排序后扫描一遍，用以结束时间为键的堆维护正在进行的课程，
+新的课程开始时，堆中所有尚未结束的课程都与它冲突。
+排序 O(n log n)，扫描每个区间进出堆各一次，加上输出冲突本身的开销。
+
+一个人的课表::
+
+    find_conflicts(courses, schedule)
+
+多人的课表（或多份候选课表）在一次排序、一次扫描中完成，冲突只在同一份课表内计算::
+
+    find_cohort_conflicts({"20170001": courses_a, "20170002": courses_b}, schedule)
+
+同一对课程在各周的冲突合并为一个 Conflict。
+"""
+import heapq
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from ..data.schedule import ArraySchedule
+from ..data.schedule import ShaPingBaSchedule
+from ..model import Course
+from ..model import CourseRecord
+from ..model import ExperimentCourse
+from ..model import ExperimentCourseRecord
+from .datetime import lesson_minutes
+from .datetime import parse_weeks
+
+__all__ = ("Conflict", "find_conflicts", "find_cohort_conflicts", "format_weeks")
+
+AnyCourse = Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]
+
+WEEK_MINUTES = 7 * 24 * 60
+DAY_MINUTES = 24 * 60
+
+
+class Conflict(NamedTuple):
+    "同一份课表中时间重叠的两门课程"
+    # 课表的所有者，find_conflicts 中为 None
+    owner: Hashable
+    first: AnyCourse
+    second: AnyCourse
+    # 发生冲突的周次，升序
+    weeks: Tuple[int, ...]
+    # 星期偏移
+    day: int
+    # 重叠部分的开始、结束，当天零点起的分钟数
+    start: int
+    end: int
+
+    def __str__(self) -> str:
+        return (f"{'' if self.owner is None else f'{self.owner} '}第 {format_weeks(self.weeks)} 周 "
+                f"星期{'一二三四五六日'[self.day]} {_hhmm(self.start)}-{_hhmm(self.end)}："
+                f"{self.first.identifier} 与 {self.second.identifier}")
+
+
+def _hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_weeks(weeks: Sequence[int]) -> str:
+    """parse_weeks 的逆运算
+
+    >>> format_weeks((1, 2, 3, 5))
+    '1-3,5'
+    """
+    parts = []
+    for week in weeks:
+        if parts and parts[-1][1] == week - 1:
+            parts[-1][1] = week
+        else:
+            parts.append([week, week])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in parts)
+
+
+def find_conflicts(courses: Iterable[AnyCourse], schedule: ArraySchedule = ShaPingBaSchedule()) -> List[Conflict]:
+    "一份课表中的所有冲突"
+    return find_cohort_conflicts({None: courses}, schedule)
+
+
+def find_cohort_conflicts(tables: Mapping[Hashable, Iterable[AnyCourse]],
+                          schedule: ArraySchedule = ShaPingBaSchedule()) -> List[Conflict]:
+    """多份课表中的所有冲突，按课表、课程出现的顺序排列
+
+    没有周次或节次的课程（例如不排课的网课）不参与检测。
+
+    :param tables: 所有者 -> 课表
+    :param schedule: 作息时间
+    """
+    owners = []
+    courses: List[AnyCourse] = []
+    # (所有者序号, 开始, 结束, 课程序号)
+    events: List[Tuple[int, int, int, int]] = []
+    minutes: Dict[str, Tuple[int, int]] = {}
+    for i_owner, (owner, table) in enumerate(tables.items()):
+        owners.append(owner)
+        for course in table:
+            if not course.week_schedule.strip() or not course.day_schedule.strip():
+                continue
+            i_course = len(courses)
+            courses.append(course)
+            interval = minutes.get(course.day_schedule)
+            if interval is None:
+                interval = minutes[course.day_schedule] = lesson_minutes(course.day_schedule, schedule)
+            a, b = interval
+            for week in parse_weeks(course.week_schedule):
+                base = (week - 1) * WEEK_MINUTES
+                events.append((i_owner, base + a, base + b, i_course))
+    events.sort()
+
+    # (课程序号, 课程序号) -> 冲突的周次，以及第一次的重叠区间
+    pairs: Dict[Tuple[int, int], list] = {}
+    active: List[Tuple[int, int]] = []
+    current = -1
+    for i_owner, start, end, i_course in events:
+        if i_owner != current:
+            current = i_owner
+            active.clear()
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, other in active:
+            key = (other, i_course) if other < i_course else (i_course, other)
+            found = pairs.get(key)
+            if found is None:
+                week, offset = divmod(start, WEEK_MINUTES)
+                pairs[key] = [i_owner, [week + 1], offset, min(end, other_end) - start + offset]
+            else:
+                found[1].append(start // WEEK_MINUTES + 1)
+        heapq.heappush(active, (end, i_course))
+
+    conflicts = []
+    for (i, j), (i_owner, weeks, a, b) in sorted(pairs.items(), key=lambda item: (item[1][0], item[0])):
+        day, a = divmod(a, DAY_MINUTES)
+        conflicts.append(
+            Conflict(owners[i_owner], courses[i], courses[j], tuple(sorted(set(weeks))), day, a,
+                     b - day * DAY_MINUTES))
+    return conflicts
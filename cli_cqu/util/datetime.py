@@ -6,15 +6,26 @@ from datetime import datetime
 from datetime import time
 from datetime import timedelta
 from datetime import timezone
+from functools import lru_cache
+from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Tuple
-from ..data.schedule import HuxiSchedule, ShaPingBaSchedule
+from typing import Union
+from ..data.schedule import ArraySchedule, ShaPingBaSchedule
 import re
 import logging
 
-__all__ = ("materialize_calendar")
+__all__ = ("materialize_calendar", "materialize_calendars", "parse_lesson", "parse_weeks")
 
 # 14节 表示全天
 FULL_DAY = 14
+# timezone(timedelta(hours=8), "Asia/Shanghai"): 北京时间
+TZ = timezone(timedelta(hours=8), "Asia/Shanghai")
+
+P_DAY_LESSON = re.compile(r"^(?P<day>[一二三四五六日])\[(?P<lesson>[\d\-]+)节\]$")
+P_LESSON_RANGE = re.compile(r"\d+-\d+")
+P_WEEK_PART = re.compile(r"(\d+)(?:-(\d+))?")
 
 
 def materialize_calendar(t_week: str, t_lesson: str, start: date,
@@ -33,33 +44,93 @@ def materialize_calendar(t_week: str, t_lesson: str, start: date,
     >>> materialize_calendar(t_week="1", t_lesson="一[14节]", start=date(2020, 2, 17))
     (datetime(2019, 2, 17, 8), datetime(2017, 2, 17, 23, 59))
     """
-    p_day_lesson: re.Pattern = re.compile(r"^(?P<day>[一二三四五六日])\[(?P<lesson>[\d\-]+)节\]$")
-    m_day_lesson: re.Match = p_day_lesson.fullmatch(t_lesson)
-    d_day_lesson: dict = m_day_lesson.groupdict()
-    i_week: int = int(t_week)
-    i_day: int = DAY_MAP[d_day_lesson["day"]]
-    s_lesson: str = d_day_lesson["lesson"]
-
-    if re.match(r"\d+-\d+", s_lesson):
+    return materialize_calendars([(t_week, t_lesson)], start, schedule)[0]
+
+
+def materialize_calendars(pairs: Iterable[Tuple[Union[str, int], str]], start: date,
+                          schedule=ShaPingBaSchedule()) -> List[Tuple[datetime, datetime]]:
+    """批量具体化时间日期，结果与逐个调用 materialize_calendar 相同
+
+    学期开始时间只构造一次，同一节次字符串、同一周次在一批之内只计算一次时间偏移。
+
+    >>> materialize_calendars([("1", "一[1-2节]"), ("3", "一[1-2节]")], start=date(2020, 2, 17))
+    [(datetime(2020, 2, 17, 8), datetime(2020, 2, 17, 9, 40)), (datetime(2020, 3, 2, 8), datetime(2020, 3, 2, 9, 40))]
+    """
+    dt: datetime = datetime.combine(start, time.min, TZ)
+    results = []
+    offsets: Dict[str, Tuple[timedelta, timedelta]] = {}
+    weeks: Dict[Union[str, int], datetime] = {}
+    for t_week, t_lesson in pairs:
+        offset = offsets.get(t_lesson)
+        if offset is None:
+            offset = offsets[t_lesson] = lesson_offset(t_lesson, schedule)
+        week = weeks.get(t_week)
+        if week is None:
+            week = weeks[t_week] = dt + timedelta(days=(int(t_week) - 1) * 7)
+        results.append((week + offset[0], week + offset[1]))
+    return results
+
+
+def lesson_minutes(t_lesson: str, schedule: ArraySchedule) -> Tuple[int, int]:
+    "与 lesson_offset 相同，但以相对于周一零点的分钟数表示"
+    i_day, i_lesson = parse_lesson(t_lesson)
+    first, last = i_lesson if isinstance(i_lesson, tuple) else (i_lesson, i_lesson)
+    a, b = schedule.span(first, last)
+    day = i_day * 24 * 60
+    return day + a, day + b
+
+
+def lesson_offset(t_lesson: str, schedule) -> Tuple[timedelta, timedelta]:
+    "节次字符串相对于学期第一周周一零点的开始、结束时间偏移"
+    i_day, i_lesson = parse_lesson(t_lesson)
+    if isinstance(i_lesson, tuple):
+        partial_times: Tuple[timedelta, timedelta] = (schedule[i_lesson[0]][0], schedule[i_lesson[1]][1])
+    else:
+        partial_times: Tuple[timedelta, timedelta] = schedule[i_lesson]
+    partial_days = timedelta(days=i_day)
+    return (partial_days + partial_times[0], partial_days + partial_times[1])
+
+
+@lru_cache(maxsize=1024)
+def parse_lesson(t_lesson: str) -> Tuple[int, Union[Tuple[int, int], int]]:
+    """解析节次字符串，返回 (星期偏移, 节次)，节次为 (起, 止) 或 FULL_DAY
+
+    >>> parse_lesson("三[3-4节]")
+    (2, (3, 4))
+    >>> parse_lesson("一[14节]")
+    (0, 14)
+    """
+    m_day_lesson = P_DAY_LESSON.fullmatch(t_lesson)
+    if m_day_lesson is None:
+        raise ValueError(f"{t_lesson} 无法解析课程节次")
+    i_day: int = DAY_MAP[m_day_lesson["day"]]
+    s_lesson: str = m_day_lesson["lesson"]
+
+    if P_LESSON_RANGE.match(s_lesson):
         i_lesson: Tuple[int, int] = tuple([int(i) for i in s_lesson.split("-")])
     elif s_lesson == "14" or s_lesson == "13":
         i_lesson: int = FULL_DAY
     else:
         raise ValueError(f"{t_lesson} 无法解析课程节次")
+    return i_day, i_lesson
 
-    partial_days: int = (i_week - 1) * 7 + i_day
-    if isinstance(i_lesson, tuple):
-        partial_times: Tuple[timedelta, timedelta] = (schedule[i_lesson[0]][0], schedule[i_lesson[1]][1])
-    elif isinstance(i_lesson, int):
-        partial_times: Tuple[timedelta, timedelta] = schedule[i_lesson]
-    else:
-        raise TypeError(f"{i_lesson} 为 {type(i_lesson)} 类型")
-    partial_td: Tuple[timedelta, timedelta] = (timedelta(days=partial_days) + partial_times[0],
-                                               timedelta(days=partial_days) + partial_times[1])
-    # timezone(timedelta(hours=8), "Asia/Shanghai"): 北京时间
-    dt: datetime = datetime.combine(start, time.min, timezone(timedelta(hours=8), "Asia/Shanghai"))
-    result = (dt + partial_td[0], dt + partial_td[1])
-    return result
+
+@lru_cache(maxsize=1024)
+def parse_weeks(t_week: str) -> Tuple[int, ...]:
+    """解析周次字符串，返回升序排列的周次
+
+    >>> parse_weeks("1-3,5")
+    (1, 2, 3, 5)
+    """
+    weeks = set()
+    for part in str(t_week).split(","):
+        m = P_WEEK_PART.fullmatch(part.strip())
+        if m is None:
+            raise ValueError(f"{t_week} 无法解析周次")
+        a = int(m[1])
+        b = int(m[2]) if m[2] else a
+        weeks.update(range(a, b + 1))
+    return tuple(sorted(weeks))
 
 
 # 星期数的偏移量，以星期一为一周的起始
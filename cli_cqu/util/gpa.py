@@ -0,0 +1,205 @@
+"""成绩统计
+
+把成绩单（Parsed.Assignment.whole_assignment 的结果）按列存放在紧凑的数组中，
+一次遍历即可对任意多份成绩单计算加权 GPA、学分合计，以及按学生、类别、学期的汇总。
+
+默认的绩点对照（百分制成绩下限 -> 绩点）::
+
+    90 4.0 | 85 3.7 | 82 3.3 | 78 3.0 | 75 2.7 | 72 2.3 | 68 2.0 | 64 1.5 | 60 1.0 | 其余 0
+
+等级制成绩先换算为百分制：优 95、良 85、中 75、及格 65、不及格 0。
+合格、免修 等无法换算的成绩不计入 GPA 和加权平均分，但计入学分；合格、免修 计入获得学分。
+"""
+import math
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import repeat
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+__all__ = ("GRADE_POINTS", "TEXT_SCORES", "parse_grade", "TranscriptTable", "transcript_stats")
+
+# (百分制成绩下限, 绩点)，按下限升序
+GRADE_POINTS: Tuple[Tuple[float, float], ...] = (
+    (60, 1.0),
+    (64, 1.5),
+    (68, 2.0),
+    (72, 2.3),
+    (75, 2.7),
+    (78, 3.0),
+    (82, 3.3),
+    (85, 3.7),
+    (90, 4.0),
+)
+# 等级制成绩 -> 百分制成绩
+TEXT_SCORES = {"优": 95.0, "良": 85.0, "中": 75.0, "及格": 65.0, "不及格": 0.0}
+# 无法换算为百分制，但视为通过的成绩
+PASSED_TEXT = frozenset(("合格", "免修"))
+# 汇总时可用的分组方式
+GROUPS = ("student", "term", "category")
+
+
+@lru_cache(256)
+def parse_grade(grade: str) -> float:
+    "将成绩换算为百分制，无法换算时返回 nan"
+    try:
+        return float(grade)
+    except ValueError:
+        return TEXT_SCORES.get(grade, math.nan)
+
+
+class _Interner:
+    "字符串 <-> 序号"
+    def __init__(self):
+        self.values: List[str] = []
+        self.__index: Dict[str, int] = {}
+
+    def __call__(self, value: str) -> int:
+        i = self.__index.get(value)
+        if i is None:
+            i = self.__index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class TranscriptTable:
+    """多份成绩单的列式存储，每行一门课程
+
+    :param scale: 绩点对照，格式同 GRADE_POINTS
+    :param bool best_attempt: 为真时同一学生的同一课程编码只保留成绩最好的一次（重修、补考）
+    """
+    def __init__(self, scale: Sequence[Tuple[float, float]] = GRADE_POINTS, best_attempt: bool = True):
+        self.__lower = [lower for lower, _ in scale]
+        self.__points = [0.0] + [point for _, point in scale]
+        self.best_attempt = best_attempt
+        self.students = _Interner()
+        self.terms = _Interner()
+        self.categories = _Interner()
+        # 各列，student、term、category 存放序号
+        self.student = array("l")
+        self.term = array("l")
+        self.category = array("l")
+        self.credit = array("d")
+        # 百分制成绩和绩点，无法换算时为 nan
+        self.score = array("d")
+        self.point = array("d")
+        self.passed = array("b")
+        # (学生序号, 课程编码) -> 行号
+        self.__rows: Dict[Tuple[int, str], int] = {}
+
+    @classmethod
+    def from_transcripts(cls, transcripts: Iterable[dict], **kwargs) -> "TranscriptTable":
+        "由多份 whole_assignment 的结果构建，其余参数与构造函数相同"
+        table = cls(**kwargs)
+        for transcript in transcripts:
+            table.add(transcript)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.credit)
+
+    def grade_point(self, score: float) -> float:
+        "百分制成绩对应的绩点，score 为 nan 时返回 nan"
+        if score != score:
+            return math.nan
+        return self.__points[bisect_right(self.__lower, score)]
+
+    def add(self, transcript: dict):
+        "追加一份成绩单"
+        student = self.students(transcript["学号"])
+        for row in transcript["详细"]:
+            self.add_row(student, row)
+
+    def add_row(self, student: int, row: dict):
+        "追加一门课程，student 为 students 中的序号，row 的字段与 whole_assignment 的 详细 相同"
+        grade = row["成绩"]
+        score = parse_grade(grade)
+        point = self.grade_point(score)
+        passed = score >= 60 if score == score else grade in PASSED_TEXT
+        values = (student, self.terms(row["时间"]), self.categories(row["类别"]), float(row["学分"] or 0), score,
+                  point, passed)
+
+        if self.best_attempt:
+            key = (student, row["课程编码"])
+            i = self.__rows.get(key)
+            if i is not None:
+                if self.__rank(passed, score) > self.__rank(self.passed[i], self.score[i]):
+                    self.__set(i, values)
+                return
+            self.__rows[key] = len(self)
+        for column, value in zip(self.__columns(), values):
+            column.append(value)
+
+    @staticmethod
+    def __rank(passed: bool, score: float) -> Tuple[bool, float]:
+        return passed, score if score == score else -1.0
+
+    def __columns(self) -> tuple:
+        return self.student, self.term, self.category, self.credit, self.score, self.point, self.passed
+
+    def __set(self, i: int, values: tuple):
+        for column, value in zip(self.__columns(), values):
+            column[i] = value
+
+    def __labels(self, group: str) -> List[str]:
+        return {"student": self.students, "term": self.terms, "category": self.categories}[group].values
+
+    def summarize(self, by: Union[str, Sequence[str]] = "student") -> Dict[tuple, dict]:
+        """按 by 分组汇总，by 为 student、term、category 之一或它们的组合，空序列表示不分组
+
+        :return: {(分组取值, ...): {课程数, 学分, 获得学分, GPA, 加权平均分}}，
+                 GPA、加权平均分 在没有可换算成绩时为 None
+        """
+        by = (by, ) if isinstance(by, str) else tuple(by)
+        for group in by:
+            if group not in GROUPS:
+                raise ValueError(f"未知的分组方式 {group}，可用的有 {', '.join(GROUPS)}")
+        columns = [getattr(self, group) for group in by]
+        keys = zip(*columns) if columns else repeat((), len(self))
+
+        # 分组序号 -> [课程数, 学分, 获得学分, 计分学分, 绩点 * 学分, 成绩 * 学分]
+        acc: Dict[tuple, list] = {}
+        for key, credit, score, point, passed in zip(keys, self.credit, self.score, self.point, self.passed):
+            a = acc.get(key)
+            if a is None:
+                a = acc[key] = [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+            a[0] += 1
+            a[1] += credit
+            if passed:
+                a[2] += credit
+            if score == score:
+                a[3] += credit
+                a[4] += point * credit
+                a[5] += score * credit
+
+        labels = [self.__labels(group) for group in by]
+        result = {}
+        for key, (n, credits, earned, graded, points, scores) in acc.items():
+            label = tuple(names[i] for names, i in zip(labels, key))
+            result[label] = {
+                "课程数": n,
+                "学分": credits,
+                "获得学分": earned,
+                "GPA": points / graded if graded else None,
+                "加权平均分": scores / graded if graded else None,
+            }
+        return result
+
+
+def transcript_stats(transcript: dict, **kwargs) -> dict:
+    """一份成绩单的统计，其余参数与 TranscriptTable 相同
+
+    返回 {课程数, 学分, 获得学分, GPA, 加权平均分, 类别: {类别: {...}}, 学期: {学期: {...}}}
+    """
+    table = TranscriptTable.from_transcripts([transcript], **kwargs)
+    total = table.summarize(()).get((), {"课程数": 0, "学分": 0.0, "获得学分": 0.0, "GPA": None, "加权平均分": None})
+    return {
+        **total,
+        "类别": {key[0]: value for key, value in table.summarize("category").items()},
+        "学期": {key[0]: value for key, value in table.summarize("term").items()},
+    }
@@ -0,0 +1,34 @@
+"""HTTP 会话与连接池
+
+所有请求都经过 util.scheduler 中的全局调度器。
+"""
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from .scheduler import RequestScheduler
+from .scheduler import ScheduledAdapter
+
+__all__ = ("make_adapter", "make_session")
+
+# 每个主机默认允许的并发连接数
+DEFAULT_LIMIT_PER_HOST = 8
+
+
+def make_adapter(limit_per_host: int = DEFAULT_LIMIT_PER_HOST, scheduler: RequestScheduler = None) -> HTTPAdapter:
+    """创建一个可在多个 Session 之间共享的连接池
+
+    每个主机最多保持 ``limit_per_host`` 个连接，连接耗尽时请求会阻塞等待，
+    从而限制了对同一主机的并发数。
+    注意共享的 adapter 不能随某个 Session 一起 close。
+    """
+    return ScheduledAdapter(scheduler, pool_connections=4, pool_maxsize=limit_per_host, pool_block=True)
+
+
+def make_session(adapter: HTTPAdapter = None) -> Session:
+    "创建经过全局调度器的 Session，传入 adapter 时使用共享的连接池"
+    s = Session()
+    if adapter is None:
+        adapter = ScheduledAdapter()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
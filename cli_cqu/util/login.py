@@ -0,0 +1,274 @@
+"""jxgl 登录流程
+
+登录是一个小的状态机，每个状态是 LoginFlow 的一个方法，返回下一个状态::
+
+    home ──有 DSafeId 跳转页──> dsafe ──仍是跳转页──> dsafe
+      │                           │
+      └────────已有会话───────────┴──> form ──> submit ──> 完成
+                                         ^        │
+                                         └─表单过期┘
+
+与逐步照抄浏览器行为相比，有两处省去了大部分等待：
+
+- 登录表单的 __VIEWSTATE 等隐藏字段属于页面而不是会话，由 FormTemplate 在进程内所有帐号之间共享，
+  只在第一次登录、超过 ttl 或服务器拒绝时才重新获取 index_login.aspx。
+  服务器先校验视图状态再校验密码，所以“账号或密码不正确”说明表单本身仍然有效
+- 设置 DSafeId 之后不再固定等待 680 ms，而是由 DSafeWait 根据服务器的实际反应调整：
+  过早访问时服务器会重新下发 DSafeId，据此找出足够的最短等待
+
+会话 cookie 由 requests 按 Set-Cookie 保存在 Session 中，不再用正则表达式从响应头中提取。
+"""
+import re
+import threading
+import time
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from lxml import html as lhtml
+from requests import Session
+
+from ..data import HOST
+from ..data.js_equality import chkpwd
+from ..data.route import ROUTE_ENCODING
+from ..data.route import Route
+from .stream import parse_html
+from .stream import read_text
+from .trace import span
+
+__all__ = ("DSafeWait", "FormTemplate", "LoginFlow", "DSAFE_WAIT", "LOGIN_FORM")
+
+# 跳转页 JavaScript 设置的 DSafeId
+P_DSAFEID = re.compile(r"(?<=document.cookie=')DSafeId=([A-Z0-9]+);(?=';)")
+# 连续得到 DSafeId 跳转页的次数上限
+MAX_DSAFE_ROUNDS = 8
+
+State = Optional[Callable[[], "State"]]
+
+
+class DSafeWait:
+    """自适应的 DSafeId 等待时间，线程安全
+
+    good 是已知足够的最短等待，bad 是已知不够的最长等待。两者相差超过 resolution 时，
+    同一时刻只让一次登录以中点探测，其余登录等待 good 再加上 margin，以吸收网络延迟的抖动；
+    探测的结果收窄区间。good 加上 margin 也不够时说明服务器收紧了要求，good 增加一半。
+    每成功 reprobe 次把 bad 减半，以便发现服务器放宽了要求。
+
+    探测会让个别登录多等一轮，只有登录很多次的进程才划算，所以 adaptive 为 False 时不探测，
+    总是等待 good（起初即 initial），仍然在等待不足时增加 good。
+    进程内共享的 DSAFE_WAIT 默认不探测，daemon、批量任务等长期运行的场合创建自己的 DSafeWait，
+    通过 App 的 dsafe_wait 参数传给登录流程。
+
+    :param initial: 初始的等待（秒），即原来固定等待的 680 ms
+    :param ceiling: 等待的上限
+    :param resolution: 区间小于它时不再探测
+    :param margin: 不探测时在 good 之上多等待的秒数
+    :param reprobe: 每成功这么多次，重新向下探测
+    :param adaptive: 是否探测更短的等待
+    """
+    def __init__(self,
+                 initial: float = 0.68,
+                 ceiling: float = 5.0,
+                 resolution: float = 0.02,
+                 margin: float = 0.03,
+                 reprobe: int = 200,
+                 adaptive: bool = True):
+        self.adaptive = adaptive
+        self.ceiling = ceiling
+        self.resolution = resolution
+        self.margin = margin
+        self.reprobe = reprobe
+        self.good = initial
+        self.bad = 0.0
+        self.__probe: Optional[float] = None
+        self.__successes = 0
+        self.__lock = threading.Lock()
+
+    def next(self) -> float:
+        "下一次登录应当等待的秒数"
+        with self.__lock:
+            if not self.adaptive:
+                return min(self.ceiling, self.good)
+            if self.__probe is None and self.good - self.bad > self.resolution:
+                self.__probe = (self.good + self.bad) / 2
+                return self.__probe
+            return min(self.ceiling, self.good + self.margin)
+
+    def record(self, wait: float, ok: Optional[bool]):
+        "记录等待 wait 秒之后的结果，ok 为 None 表示请求失败、没有结果"
+        with self.__lock:
+            if wait == self.__probe:
+                self.__probe = None
+            if ok is None:
+                return
+            if ok:
+                self.good = min(self.good, wait)
+                self.__successes += 1
+                if self.__successes % self.reprobe == 0:
+                    self.bad /= 2
+            else:
+                self.bad = max(self.bad, wait)
+                if self.bad >= self.good:
+                    self.good = min(self.ceiling, max(self.bad, self.good) * 1.5 + self.resolution)
+
+
+class FormTemplate:
+    """在帐号之间共享的登录表单隐藏字段（__VIEWSTATE、__VIEWSTATEGENERATOR 等），线程安全
+
+    :param ttl: 表单缓存的最长时间（秒）
+    """
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self.__fields: Optional[Dict[str, str]] = None
+        self.__fetched = 0.0
+        self.__lock = threading.Lock()
+        self.__fetching = threading.Lock()
+
+    def get(self) -> Optional[Dict[str, str]]:
+        "缓存的隐藏字段，没有或已过期时返回 None"
+        with self.__lock:
+            if self.__fields is None or time.monotonic() - self.__fetched > self.ttl:
+                return None
+            return self.__fields
+
+    def set(self, fields: Dict[str, str]):
+        with self.__lock:
+            self.__fields = fields
+            self.__fetched = time.monotonic()
+
+    def get_or_fetch(self, fetch: Callable[[], Dict[str, str]]) -> Tuple[Dict[str, str], bool]:
+        "缓存的隐藏字段，没有时调用 fetch 获取；同时只有一个线程获取，其余线程等待其结果。返回 (字段, 是否新获取)"
+        fields = self.get()
+        if fields is not None:
+            return fields, False
+        with self.__fetching:
+            fields = self.get()
+            if fields is not None:
+                return fields, False
+            fields = fetch()
+            self.set(fields)
+            return fields, True
+
+    def invalidate(self, fields: Dict[str, str]):
+        "服务器拒绝了 fields，其他线程已经换上新的表单时保留新表单"
+        with self.__lock:
+            if self.__fields is fields:
+                self.__fields = None
+
+
+def parse_login_form(root) -> Optional[Dict[str, str]]:
+    "lxml 文档中 Logon 表单的 ASP.NET 隐藏字段，页面中没有登录表单时返回 None"
+    if root is None:
+        return None
+    inputs = root.xpath('//form[@id="Logon"]/input[@type="hidden"]')
+    fields = {i.get("name"): i.get("value", "") for i in inputs if i.get("name", "").startswith("__")}
+    return fields if "__VIEWSTATE" in fields else None
+
+
+# 进程内共享；DSAFE_WAIT 默认不探测，只运行一次的命令总是等待 680 ms
+DSAFE_WAIT = DSafeWait(adaptive=False)
+LOGIN_FORM = FormTemplate()
+
+
+class LoginFlow:
+    """在 session 上登录 jxgl，帐号或密码错误时 run 抛出 ValueError
+
+    :param wait: DSafeId 的等待策略，默认为进程内共享的 DSAFE_WAIT
+    :param template: 登录表单缓存，默认为进程内共享的 LOGIN_FORM
+    :param sleep: 等待函数，测试时可以替换
+    """
+    def __init__(self,
+                 session: Session,
+                 username: str,
+                 password: str,
+                 wait: DSafeWait = None,
+                 template: FormTemplate = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.session = session
+        self.username = username
+        self.password = password
+        self.wait = wait if wait is not None else DSAFE_WAIT
+        self.template = template if template is not None else LOGIN_FORM
+        self.sleep = sleep
+        # 当前使用的表单，以及它是否是本次登录新取得的
+        self.fields: Optional[Dict[str, str]] = None
+        self.fresh = False
+        self.dsafe_rounds = 0
+        self.__text = ""
+
+    def run(self):
+        state: State = self.home
+        while state is not None:
+            state = state()
+
+    def __get_home(self) -> str:
+        resp = self.session.get(f"{HOST.PREFIX}{Route.home}", stream=True)
+        return read_text(resp, ROUTE_ENCODING[Route.home])
+
+    def home(self) -> State:
+        "访问主页；偶尔不需要设置 DSafeId，直接就进入主页了"
+        self.__text = self.__get_home()
+        return self.dsafe if P_DSAFEID.search(self.__text) else self.form
+
+    def dsafe(self) -> State:
+        "执行跳转页 JavaScript 的等效代码：设置 DSafeId，等待之后重新访问主页"
+        self.dsafe_rounds += 1
+        if self.dsafe_rounds > MAX_DSAFE_ROUNDS:
+            raise ValueError(f"连续 {MAX_DSAFE_ROUNDS} 次得到 DSafeId 跳转页，无法建立会话")
+        self.session.cookies.set("DSafeId", P_DSAFEID.search(self.__text)[1])
+        wait, ok = self.wait.next(), None
+        try:
+            with span("login", "dsafeid_wait", seconds=round(wait, 3)):
+                self.sleep(wait)
+            self.__text = self.__get_home()
+            # 等待不足时服务器重新下发 DSafeId
+            ok = P_DSAFEID.search(self.__text) is None
+        finally:
+            self.wait.record(wait, ok)
+        return self.form if ok else self.dsafe
+
+    def form(self) -> State:
+        "取得登录表单的隐藏字段，优先使用缓存"
+        self.fields, self.fresh = self.template.get_or_fetch(self.__fetch_form)
+        return self.submit
+
+    def __fetch_form(self) -> Dict[str, str]:
+        resp = self.session.get(f"{HOST.PREFIX}{Route.index_login}", stream=True)
+        with span("parse", "index_login"):
+            fields = parse_login_form(parse_html(resp, ROUTE_ENCODING[Route.index_login]))
+        if fields is None:
+            raise ValueError("登录页面中没有登录表单")
+        return fields
+
+    def submit(self) -> State:
+        "发送表单"
+        login_form = {
+            **self.fields,
+            "Sel_Type": "STU",
+            "txt_dsdsdsdjkjkjc": self.username,  # 学号
+            "txt_dsdfdfgfouyy": "",  # 密码, 实际上的密码加密后赋值给 efdfdfuuyyuuckjg
+            "txt_ysdsdsdskgf": "",
+            "pcInfo": "",
+            "typeName": "",
+            "aerererdsdxcxdfgfg": "",
+            "efdfdfuuyyuuckjg": chkpwd(self.username, self.password),
+        }
+        url = f"{HOST.PREFIX}{Route.index_login}"
+        page_text = read_text(self.session.post(url, data=login_form, stream=True), ROUTE_ENCODING[Route.index_login])
+        if "正在加载权限数据..." in page_text:
+            return None
+        if "账号或密码不正确！请重新输入。" in page_text:
+            raise ValueError("账号或密码错误")
+        if "该账号尚未分配角色!" in page_text:
+            raise ValueError("不存在该账号")
+        if self.fresh:
+            raise ValueError("意料之外的登陆返回页面")
+        # 缓存的表单已经过期：换成返回页面中的新表单，没有则重新获取，只重试一次
+        self.template.invalidate(self.fields)
+        fields = parse_login_form(lhtml.document_fromstring(page_text)) if page_text.strip() else None
+        if fields is None:
+            return self.form
+        self.template.set(fields)
+        self.fields, self.fresh = fields, True
+        return self.submit
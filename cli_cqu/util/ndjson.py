@@ -0,0 +1,77 @@
+"""NDJSON（每行一个 JSON 对象）输出
+
+记录边产生边写出，内存占用与记录总数无关，下游程序可以在获取结束之前就开始处理。
+"""
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import Set
+from typing import TextIO
+
+__all__ = ("write_ndjson", "open_output", "read_records", "one_semester")
+
+
+def write_ndjson(records: Iterable[dict], out: TextIO, flush: bool = False) -> int:
+    "逐条写出记录，返回写出的条数；flush 为真时每条记录之后都刷新缓冲区"
+    n = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+        if flush:
+            out.flush()
+        n += 1
+    return n
+
+
+@contextmanager
+def open_output(filename: str) -> Iterator[TextIO]:
+    "打开输出文件，``-`` 表示标准输出"
+    if filename == "-":
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        with open(filename, "wt", encoding="utf-8") as out:
+            yield out
+
+
+def read_records(path: Path) -> Iterator[dict]:
+    """读取 courses-json 或 courses-ndjson 导出的文件，逐条产出课程
+
+    courses-json 按学期导出的 {学年学期: [课程, ...]} 会给每条课程加上 semester 字段
+    """
+    with open(path, "rt", encoding="utf-8") as fp:
+        if str(path).endswith(".ndjson"):
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(fp)
+    if isinstance(data, dict):
+        for semester, courses in data.items():
+            for course in courses:
+                yield {"semester": semester, **course}
+    else:
+        yield from data
+
+
+def one_semester(records: Iterable[dict], semester: str = None, seen: Optional[Set[str]] = None) -> Iterator[dict]:
+    """只产出同一学期的课程，供只收集一个学期的索引使用
+
+    给出 semester 时只保留该学期的课程；否则遇到第二个学期时抛出 ValueError。
+    没有 semester 字段的课程（单个学期的导出）总是保留。多个文件共用 seen 时跨文件检查
+    """
+    seen = set() if seen is None else seen
+    for record in records:
+        name = record.get("semester")
+        if name is not None:
+            if semester is not None:
+                if name != semester:
+                    continue
+            elif seen - {name}:
+                raise ValueError(f"课表包含多个学期：{'、'.join(sorted(seen | {name}))}，请用 --semester 选择一个")
+            seen.add(name)
+        yield record
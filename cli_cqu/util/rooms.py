@@ -0,0 +1,167 @@
+"""教室占用索引
+
+从多份课表中收集每间教室被占用的时间，每间教室保存为一个位图，第
+``((周次 - 1) * 7 + 星期偏移) * LESSONS + (节次 - 1)`` 位为 1 表示该时段有课。
+查询某个时段的空闲教室只需对每间教室做一次按位与::
+
+    index = RoomIndex()
+    index.add_all(courses)
+    index.free_rooms(week=7, day="二", lessons="3-4", building="D")
+
+全天（13、14 节）的课程占用当天所有节次。索引不区分学期，一个索引只应收集同一学期的课表。
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from ..model import Course
+from ..model import CourseRecord
+from ..model import ExperimentCourse
+from ..model import ExperimentCourseRecord
+from .datetime import DAY_MAP
+from .datetime import FULL_DAY
+from .datetime import parse_lesson
+from .datetime import parse_weeks
+
+__all__ = ("RoomIndex", "building_of", "parse_day", "parse_lessons")
+
+AnyCourse = Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]
+
+# 每天的节数
+LESSONS = 12
+P_BUILDING = re.compile(r"^\D*")
+
+
+def building_of(room: str) -> str:
+    "教室所在的楼，即开头的非数字部分，如 D1204 -> D、DYC301 -> DYC"
+    return P_BUILDING.match(room)[0]
+
+
+def parse_day(day: Union[str, int]) -> int:
+    "星期偏移，接受 一 至 日，或 1 至 7"
+    day = str(day).strip()
+    if day in DAY_MAP:
+        return DAY_MAP[day]
+    if day.isdigit() and 1 <= int(day) <= 7:
+        return int(day) - 1
+    raise ValueError(f"{day} 不是星期一至星期日")
+
+
+def parse_lessons(lessons: Union[str, int, Tuple[int, int]]) -> Tuple[int, int]:
+    "节次范围，接受 3、3-4 或 (3, 4)"
+    if isinstance(lessons, tuple):
+        a, b = lessons
+    elif "-" in str(lessons):
+        a, b = (int(i) for i in str(lessons).split("-"))
+    else:
+        a = b = int(lessons)
+    if not 1 <= a <= b <= LESSONS:
+        raise ValueError(f"{lessons} 不是 1 至 {LESSONS} 之间的节次范围")
+    return a, b
+
+
+class RoomIndex:
+    "教室 -> 占用位图"
+    def __init__(self):
+        self.rooms: Dict[str, int] = {}
+        # 楼 -> 教室
+        self.__buildings: Dict[str, Set[str]] = {}
+        # (周次字符串, 节次字符串) -> 位图
+        self.__masks: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def __contains__(self, room: str) -> bool:
+        return room in self.rooms
+
+    @staticmethod
+    def slot(week: int, day: int, lesson: int) -> int:
+        "时段对应的位"
+        return ((week - 1) * 7 + day) * LESSONS + lesson - 1
+
+    def mask(self, week: int, day: int, lessons: Tuple[int, int]) -> int:
+        "某周某天第 a 至 b 节的位图"
+        a, b = lessons
+        return ((1 << (b - a + 1)) - 1) << self.slot(week, day, a)
+
+    def course_mask(self, t_week: str, t_lesson: str) -> int:
+        "一行课程占用的所有时段"
+        key = (t_week, t_lesson)
+        mask = self.__masks.get(key)
+        if mask is None:
+            day, lessons = parse_lesson(t_lesson)
+            if lessons == FULL_DAY:
+                lessons = (0, 0)
+            # 与作息时间一致，超出范围的节次按全天的开始、结束处理
+            a, b = (i if 1 <= i <= LESSONS else d for i, d in zip(lessons, (1, LESSONS)))
+            day_mask = self.mask(1, day, (a, b)) if a <= b else 0
+            mask = 0
+            for week in parse_weeks(t_week):
+                mask |= day_mask << (week - 1) * 7 * LESSONS
+            self.__masks[key] = mask
+        return mask
+
+    def add_room(self, room: str, mask: int = 0):
+        self.rooms[room] = self.rooms.get(room, 0) | mask
+        self.__buildings.setdefault(building_of(room), set()).add(room)
+
+    def add(self, course: AnyCourse):
+        "收集一行课程，没有地点或没有安排时间（如线上课程）的课程被忽略"
+        room = course.location.strip()
+        if room and course.week_schedule.strip() and course.day_schedule.strip():
+            self.add_room(room, self.course_mask(course.week_schedule, course.day_schedule))
+
+    def add_all(self, courses: Iterable[AnyCourse]) -> "RoomIndex":
+        for course in courses:
+            self.add(course)
+        return self
+
+    def buildings(self) -> List[str]:
+        return sorted(self.__buildings)
+
+    def is_free(self, room: str, week: int, day: Union[str, int], lessons) -> bool:
+        "教室在该时段是否空闲，不在索引中的教室视为空闲"
+        return not self.rooms.get(room, 0) & self.mask(week, parse_day(day), parse_lessons(lessons))
+
+    def free_rooms(self, week: int, day: Union[str, int], lessons, building: str = None) -> List[str]:
+        "该时段空闲的教室，building 给出时只查找这栋楼"
+        mask = self.mask(week, parse_day(day), parse_lessons(lessons))
+        rooms = self.rooms if building is None else self.__buildings.get(building, ())
+        return sorted(room for room in rooms if not self.rooms[room] & mask)
+
+    def busy(self, room: str, week: int) -> List[Tuple[int, int]]:
+        "教室在某周被占用的 (星期偏移, 节次)"
+        bits = self.rooms.get(room, 0) >> self.slot(week, 0, 1)
+        return [(day, lesson) for day in range(7) for lesson in range(1, LESSONS + 1)
+                if bits >> (day * LESSONS + lesson - 1) & 1]
+
+    def save(self, path: Path):
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wt", encoding="utf-8") as fp:
+            json.dump({"version": 1, "lessons": LESSONS, "rooms": {k: f"{v:x}" for k, v in self.rooms.items()}},
+                      fp,
+                      ensure_ascii=False)
+        os.replace(str(tmp), str(path))
+
+    @classmethod
+    def load(cls, path: Path) -> "RoomIndex":
+        "读取 save 保存的索引，文件不存在时返回空索引"
+        index = cls()
+        if not Path(path).exists():
+            return index
+        with open(path, "rt", encoding="utf-8") as fp:
+            data = json.load(fp)
+        if data.get("lessons") != LESSONS:
+            raise ValueError(f"{path} 不是每天 {LESSONS} 节的教室索引")
+        for room, bits in data["rooms"].items():
+            index.add_room(room, int(bits, 16))
+        return index
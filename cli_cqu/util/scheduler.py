@@ -0,0 +1,236 @@
+"""全局请求调度
+
+所有发往 jxgl、oldjw 的请求都经过同一个 RequestScheduler：
+
+- 每个主机一个令牌桶，限制请求速率
+- 限制同时进行中的请求数
+- 为没有指定超时的请求加上默认超时
+- 连接错误、超时和 5xx 响应按带抖动的指数退避重试；POST 等非幂等的请求只在连接阶段失败（请求尚未发出）时重试，
+  以免重复提交
+- 并发上限只计入发出请求、收到响应头的阶段；``stream=True`` 的请求在读取响应体之前就已经让出名额
+
+ScheduledAdapter 是挂载到 Session 上的传输层，由 util.http.make_session 使用。
+
+HOST_OVERRIDES 可以把发往某个主机的请求改发到另一个地址，例如本地的 mock 服务器（见 cli_cqu.mock），
+只能由代码或 ``cli-cqu --hosts jxgl.cqu.edu.cn=127.0.0.1:8000,oldjw.cqu.edu.cn=127.0.0.1:8000`` 显式设置，
+override_hosts 会在标准错误输出提示。限速、Cookie 和响应的 url 仍按原来的主机计算。
+"""
+import random
+import sys
+import threading
+import time
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import Union
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+
+from requests import PreparedRequest
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectTimeout
+from requests.exceptions import ConnectionError
+from requests.exceptions import Timeout
+from urllib3.exceptions import NewConnectionError
+
+from .trace import span
+
+__all__ = ("TokenBucket", "RequestScheduler", "ScheduledAdapter", "SCHEDULER", "HOST_OVERRIDES", "override_hosts")
+
+# 主机 -> (每秒请求数, 突发容量)
+DEFAULT_RATES: Dict[str, Tuple[float, float]] = {
+    "jxgl.cqu.edu.cn": (10, 20),
+    "oldjw.cqu.edu.cn": (5, 10),
+}
+# 未列出的主机使用的速率
+DEFAULT_RATE = (10, 20)
+# (连接超时, 读取超时)，单位秒
+DEFAULT_TIMEOUT = (5, 30)
+# 可以安全重试的方法，其余方法只在连接阶段失败时重试
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"))
+
+
+def is_connect_error(err: Exception) -> bool:
+    "错误是否发生在建立连接时，此时请求还没有发出"
+    if isinstance(err, ConnectTimeout):
+        return True
+    if isinstance(err, ConnectionError) and err.args:
+        # requests 把连接失败包装为 ConnectionError(MaxRetryError(reason=NewConnectionError))
+        return isinstance(getattr(err.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class TokenBucket:
+    "线程安全的令牌桶"
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        "取走一个令牌，令牌不足时阻塞，返回等待的秒数"
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RequestScheduler:
+    """请求调度器
+
+    :param dict rates: 主机 -> (每秒请求数, 突发容量)
+    :param int max_in_flight: 同时进行中的请求数上限
+    :param timeout: 默认超时，与 requests 的 timeout 参数相同
+    :param int retries: 最大重试次数
+    :param float backoff: 第一次重试前的基准等待秒数，之后每次翻倍
+    :param float backoff_max: 单次等待的上限
+    """
+    def __init__(self,
+                 rates: Dict[str, Tuple[float, float]] = None,
+                 max_in_flight: int = 32,
+                 timeout=DEFAULT_TIMEOUT,
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 backoff_max: float = 8.0):
+        self.rates = dict(DEFAULT_RATES if rates is None else rates)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.__buckets: Dict[str, TokenBucket] = {}
+        self.__slots = threading.BoundedSemaphore(max_in_flight)
+        self.__lock = threading.Lock()
+        self.__stats = {"requests": 0, "retries": 0, "failures": 0, "queued_seconds": 0.0}
+
+    def stats(self) -> dict:
+        """计数器的快照
+
+        requests: 发出的请求数（含重试）；retries: 重试次数；
+        failures: 重试耗尽后仍失败的请求数；queued_seconds: 在令牌桶和并发上限处排队的总秒数
+        """
+        with self.__lock:
+            return dict(self.__stats)
+
+    def __count(self, name: str, value=1):
+        with self.__lock:
+            self.__stats[name] += value
+
+    def set_rate(self, host: str, rate: Optional[Tuple[float, float]]):
+        "修改 host 的 (每秒请求数, 突发容量)，None 表示恢复默认；已经创建的令牌桶随之重建"
+        with self.__lock:
+            if rate is None:
+                self.rates.pop(host, None)
+            else:
+                self.rates[host] = rate
+            self.__buckets.pop(host, None)
+
+    def __bucket(self, host: str) -> TokenBucket:
+        with self.__lock:
+            bucket = self.__buckets.get(host)
+            if bucket is None:
+                bucket = self.__buckets[host] = TokenBucket(*self.rates.get(host, DEFAULT_RATE))
+            return bucket
+
+    def delay(self, attempt: int) -> float:
+        "第 attempt 次重试前的等待时间，在 [0, 上限] 之间随机抖动"
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2**attempt))
+
+    def run(self, host: str, send: Callable[[], Response], method: str = "GET") -> Response:
+        """在限速和并发上限之内执行 send，必要时重试
+
+        method 不是幂等的方法时，只在连接阶段失败时重试，5xx 响应和读取超时直接返回或抛出。
+        send 返回时即让出并发名额，stream=True 的响应体在名额之外读取
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            t0 = time.monotonic()
+            self.__bucket(host).acquire()
+            self.__slots.acquire()
+            self.__count("queued_seconds", time.monotonic() - t0)
+            self.__count("requests")
+            resp, error = None, None
+            try:
+                resp = send()
+            except (ConnectionError, Timeout) as err:
+                error = err
+            finally:
+                self.__slots.release()
+
+            if resp is not None and resp.status_code < 500:
+                return resp
+            retryable = idempotent or (error is not None and is_connect_error(error))
+            if attempt == self.retries or not retryable:
+                self.__count("failures")
+                if resp is not None:
+                    return resp
+                raise error
+            if resp is not None and resp.raw is not None:
+                # 释放连接
+                resp.close()
+            self.__count("retries")
+            time.sleep(self.delay(attempt))
+
+
+# 进程内共享的调度器
+SCHEDULER = RequestScheduler()
+
+
+def parse_host_overrides(spec: str) -> Dict[str, str]:
+    "``主机=地址[:端口],...`` -> {主机: 地址[:端口]}"
+    overrides = {}
+    for item in spec.split(","):
+        if item.strip():
+            host, _, netloc = item.partition("=")
+            overrides[host.strip()] = netloc.strip()
+    return overrides
+
+
+# 主机名 -> 实际发送到的 地址[:端口]
+HOST_OVERRIDES: Dict[str, str] = {}
+
+
+def override_hosts(overrides: Union[str, Dict[str, str]]):
+    "把发往这些主机的请求改发到给出的地址，接受 parse_host_overrides 的格式；每一项都会在标准错误输出警告"
+    if isinstance(overrides, str):
+        overrides = parse_host_overrides(overrides)
+    for host, target in overrides.items():
+        print(f"警告：发往 {host} 的请求（包括登录密码）将改发到 {target}", file=sys.stderr)
+        HOST_OVERRIDES[host] = target
+
+
+class ScheduledAdapter(HTTPAdapter):
+    "经过 RequestScheduler 发出请求的传输层，其余参数与 HTTPAdapter 相同"
+    def __init__(self, scheduler: RequestScheduler = None, **kwargs):
+        self.scheduler = scheduler if scheduler is not None else SCHEDULER
+        super().__init__(**kwargs)
+
+    def send(self, request: PreparedRequest, timeout=None, **kwargs) -> Response:
+        if timeout is None:
+            timeout = self.scheduler.timeout
+        url = urlsplit(request.url)
+        target = HOST_OVERRIDES.get(url.hostname)
+        if target is not None:
+            original, request = request.url, request.copy()
+            request.url = urlunsplit(url._replace(netloc=target))
+        with span("http", f"{request.method} {url.hostname}{url.path}", url=request.url) as sp:
+            resp = self.scheduler.run(url.hostname,
+                                      lambda: super(ScheduledAdapter, self).send(request, timeout=timeout, **kwargs),
+                                      request.method or "GET")
+            if target is not None:
+                # 重定向、Cookie 仍按原来的地址处理
+                resp.url = original
+            if not kwargs.get("stream"):
+                # 把下载响应体的时间也算在区间内，Session 随后读取 content 时不再重复下载
+                sp.set(status=resp.status_code, bytes=len(resp.content))
+            else:
+                sp.set(status=resp.status_code)
+        return resp
@@ -0,0 +1,200 @@
+"""课程倒排索引
+
+收集多名学生的课程表，按任课教师、课程（课程号+名字）、类别、地点建立倒排表，
+回答“某位教师的所有教学班”“选了某门课的所有学生”“某地点本周的所有课程”这类查询::
+
+    index = CourseIndex()
+    index.add("20170001", courses)
+    index.query(teacher="张三")
+    index.students(identifier="CST00001高等数学")
+    index.query(location="D1204", week=7)
+
+所有字段完全相同的课程行视为同一个教学班，只保存一次，倒排表中保存教学班的编号。
+同一学生再次 add 时替换其之前的课程，remove 删除一名学生，没有学生的教学班随之从倒排表中移除。
+实验课没有类别，不出现在 classifier 的倒排表中。
+索引不区分学期，一个索引只应收集同一学期的课表。
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict
+from typing import FrozenSet
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Set
+from typing import Union
+
+from ..model import Course
+from ..model import CourseRecord
+from ..model import ExperimentCourse
+from ..model import ExperimentCourseRecord
+from ..model import record_from_dict
+from .datetime import parse_weeks
+
+__all__ = ("CourseIndex", "FIELDS")
+
+AnyCourse = Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]
+
+# 建立倒排表的字段
+FIELDS = ("teacher", "identifier", "classifier", "location")
+
+
+class CourseIndex:
+    "学生 -> 教学班，以及 字段 -> 值 -> 教学班 的倒排表"
+    def __init__(self):
+        # 编号 -> 教学班，已移除的为 None
+        self.sections: List[AnyCourse] = []
+        # 编号 -> 选了该教学班的学生
+        self.enrolled: List[Set[Hashable]] = []
+        # 编号 -> 有课的周次，没有安排时间的教学班为空集
+        self.__weeks: List[FrozenSet[int]] = []
+        # 学生 -> 教学班编号
+        self.courses: Dict[Hashable, Set[int]] = {}
+        self.postings: Dict[str, Dict[str, Set[int]]] = {field: {} for field in FIELDS}
+        # 课程行的所有字段 -> 编号
+        self.__ids: Dict[tuple, int] = {}
+        # 已移除、可以复用的编号
+        self.__free: List[int] = []
+
+    def __len__(self) -> int:
+        "教学班数"
+        return len(self.__ids)
+
+    def __contains__(self, student: Hashable) -> bool:
+        return student in self.courses
+
+    @staticmethod
+    def __key(data: dict) -> tuple:
+        # Course 与 ExperimentCourse 字段数相同，需要区分
+        return ("project_name" in data, ) + tuple(data.values())
+
+    def __section_id(self, course: AnyCourse) -> int:
+        data = course.dict()
+        key = self.__key(data)
+        i = self.__ids.get(key)
+        if i is None:
+            week_schedule = course.week_schedule.strip()
+            weeks = frozenset(parse_weeks(week_schedule)) if week_schedule else frozenset()
+            if self.__free:
+                i = self.__free.pop()
+                self.sections[i] = course
+                self.__weeks[i] = weeks
+            else:
+                i = len(self.sections)
+                self.sections.append(course)
+                self.enrolled.append(set())
+                self.__weeks.append(weeks)
+            self.__ids[key] = i
+            for field in FIELDS:
+                value = data.get(field)
+                if value:
+                    self.postings[field].setdefault(value, set()).add(i)
+        return i
+
+    def __drop_section(self, i: int):
+        course = self.sections[i]
+        data = course.dict()
+        del self.__ids[self.__key(data)]
+        for field in FIELDS:
+            value = data.get(field)
+            if value:
+                posting = self.postings[field][value]
+                posting.discard(i)
+                if not posting:
+                    del self.postings[field][value]
+        self.sections[i] = None
+        self.__weeks[i] = frozenset()
+        self.__free.append(i)
+
+    def add(self, student: Hashable, courses: Iterable[AnyCourse]):
+        "加入一名学生的课程表，替换该学生之前加入的课程"
+        self.remove(student)
+        ids = self.courses[student] = set()
+        for course in courses:
+            i = self.__section_id(course)
+            ids.add(i)
+            self.enrolled[i].add(student)
+
+    def remove(self, student: Hashable) -> bool:
+        "删除一名学生，学生不在索引中时返回 False"
+        ids = self.courses.pop(student, None)
+        if ids is None:
+            return False
+        for i in ids:
+            self.enrolled[i].discard(student)
+            if not self.enrolled[i]:
+                self.__drop_section(i)
+        return True
+
+    def values(self, field: str) -> List[str]:
+        "某个字段所有出现过的值"
+        return sorted(self.postings[field])
+
+    def section_ids(self, week: int = None, **terms: str) -> List[int]:
+        """满足所有条件的教学班编号，升序
+
+        :param week: 只保留该周有课的教学班，没有安排周次的教学班不满足任何一周
+        :param terms: 字段 -> 值，字段为 FIELDS 之一，没有条件时返回所有教学班
+        """
+        for field in terms:
+            if field not in self.postings:
+                raise ValueError(f"{field} 没有建立索引，可用的字段为 {', '.join(FIELDS)}")
+        postings = sorted((self.postings[f].get(v, set()) for f, v in terms.items()), key=len)
+        if postings:
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids &= posting
+        else:
+            ids = {i for i, s in enumerate(self.sections) if s is not None}
+        if week is not None:
+            ids = {i for i in ids if week in self.__weeks[i]}
+        return sorted(ids)
+
+    def query(self, week: int = None, **terms: str) -> List[AnyCourse]:
+        "满足所有条件的教学班，参数同 section_ids"
+        return [self.sections[i] for i in self.section_ids(week, **terms)]
+
+    def students(self, week: int = None, **terms: str) -> List[Hashable]:
+        "选了满足所有条件的教学班的学生，参数同 section_ids"
+        result = set()
+        for i in self.section_ids(week, **terms):
+            result |= self.enrolled[i]
+        return sorted(result, key=str)
+
+    def save(self, path: Path):
+        "保存为 JSON，教学班编号会被重新整理"
+        path = Path(path)
+        ids = {i: n for n, i in enumerate(i for i, s in enumerate(self.sections) if s is not None)}
+        data = {
+            "version": 1,
+            "sections": [s.dict() for s in self.sections if s is not None],
+            "students": {str(k): sorted(ids[i] for i in v) for k, v in self.courses.items()},
+        }
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wt", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(str(tmp), str(path))
+
+    @classmethod
+    def load(cls, path: Path) -> "CourseIndex":
+        "读取 save 保存的索引，文件不存在时返回空索引；学生统一读作字符串"
+        index = cls()
+        if not Path(path).exists():
+            return index
+        with open(path, "rt", encoding="utf-8") as fp:
+            data = json.load(fp)
+        # 保存时编号已经整理过，按顺序加入即得到相同的编号
+        for section in data["sections"]:
+            index.__section_id(record_from_dict(section))
+        for student, ids in data["students"].items():
+            index.courses[student] = set(ids)
+            for i in ids:
+                index.enrolled[i].add(student)
+        return index
+
+    def stats(self) -> Dict[str, int]:
+        "学生数、教学班数以及各字段不同值的个数"
+        counts = {"students": len(self.courses), "sections": len(self)}
+        counts.update((field, len(values)) for field, values in self.postings.items())
+        return counts
@@ -0,0 +1,194 @@
+"""持久化登录会话
+
+以用户名为键，把登录后得到的 cookie 连同过期时间保存在磁盘上，
+下次启动时先用一个轻量请求验证缓存的会话，仍然有效则跳过完整的登录流程。
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+
+from requests import Session
+
+from ..data import HOST
+from ..data.route import ROUTE_ENCODING
+from ..data.route import Route
+from .stream import read_text
+
+__all__ = ("SessionStore", "is_session_alive")
+
+# 需要保存的 cookie
+SESSION_COOKIES = ("DSafeId", "ASP.NET_SessionId", "_D_SID")
+# ASP.NET 会话的默认超时时间为 20 分钟，留一点余量
+DEFAULT_TTL = 18 * 60
+# 密码摘要的 PBKDF2 迭代次数
+PBKDF2_ITERATIONS = 100000
+
+
+def default_store_path() -> Path:
+    "会话文件的默认位置，遵循 XDG_CACHE_HOME"
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "cli_cqu" / "sessions.json"
+
+
+def pbkdf2(username: str, password: str, salt: str) -> str:
+    "帐号密码加盐的 PBKDF2-SHA256 摘要，十六进制"
+    material = f"{username}\0{password}".encode("utf-8")
+    return hashlib.pbkdf2_hmac("sha256", material, bytes.fromhex(salt), PBKDF2_ITERATIONS).hex()
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    "跨进程的互斥锁，锁住 path 这个专用的锁文件"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as fp:
+        if os.name == "nt":
+            import msvcrt
+            fp.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 重试 10 秒后仍失败则抛出 OSError
+                    msvcrt.locking(fp.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+
+class SessionStore:
+    """磁盘上的会话仓库
+
+    文件内容形如::
+
+        {
+            "<username>": {
+                "salt": "<随机盐，十六进制>",
+                "fingerprint": "<由帐号密码和盐计算得到的 PBKDF2 摘要>",
+                "cookies": {"DSafeId": ..., "ASP.NET_SessionId": ..., "_D_SID": ...},
+                "expires": 1580000000.0
+            }
+        }
+
+    只有当密码摘要一致时才会复用会话，避免输错密码却仍然登录成功。
+    摘要加了每条记录各自的随机盐，不能像 chkpwd 的结果那样直接用于登录。
+    计算摘要较慢，同一进程中验证过的密码会记住对应的摘要，保存时不再重新计算。
+    """
+    def __init__(self, path: Path = None, ttl: float = DEFAULT_TTL):
+        self.path = Path(path) if path is not None else default_store_path()
+        self.ttl = ttl
+        # 同一进程中的多个线程（例如 daemon）共用一个仓库时，读改写需要互斥；
+        # 批量任务的多个进程共用同一个文件，还要用锁文件互斥
+        self.__lock = threading.Lock()
+        self.__lock_path = self.path.with_name(f"{self.path.name}.lock")
+        # 用户名 -> (进程内的密码摘要, 盐, 摘要)
+        self.__known: Dict[str, Tuple[bytes, str, str]] = {}
+        self.__key = os.urandom(16)
+
+    def load(self, username: str, password: str) -> Optional[Dict[str, str]]:
+        "读取未过期的 cookie，不存在或已过期则返回 None"
+        entry = self.__read().get(username)
+        if entry is None:
+            return None
+        if not self.__verify(username, password, entry):
+            return None
+        if entry.get("expires", 0) <= time.time():
+            return None
+        return entry.get("cookies") or None
+
+    def save(self, username: str, password: str, cookies: Dict[str, str]):
+        "保存会话 cookie，并将过期时间顺延一个 ttl"
+        cookies = {k: v for k, v in cookies.items() if k in SESSION_COOKIES}
+        if not cookies:
+            return
+        salt, fingerprint = self.__fingerprint(username, password)
+        with self.__lock, file_lock(self.__lock_path):
+            data = self.__read()
+            data[username] = {
+                "salt": salt,
+                "fingerprint": fingerprint,
+                "cookies": cookies,
+                "expires": time.time() + self.ttl,
+            }
+            self.__write(data)
+
+    def discard(self, username: str):
+        "丢弃某个用户的会话"
+        with self.__lock, file_lock(self.__lock_path):
+            data = self.__read()
+            if data.pop(username, None) is not None:
+                self.__write(data)
+
+    def __memo(self, username: str, password: str) -> bytes:
+        return hmac.new(self.__key, f"{username}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def __fingerprint(self, username: str, password: str) -> Tuple[str, str]:
+        "(盐, 摘要)，同一进程中对同一密码复用之前的结果"
+        memo = self.__memo(username, password)
+        known = self.__known.get(username)
+        if known is not None and hmac.compare_digest(known[0], memo):
+            return known[1], known[2]
+        salt = os.urandom(16).hex()
+        fingerprint = pbkdf2(username, password, salt)
+        self.__known[username] = (memo, salt, fingerprint)
+        return salt, fingerprint
+
+    def __verify(self, username: str, password: str, entry: dict) -> bool:
+        salt, fingerprint = entry.get("salt"), entry.get("fingerprint")
+        if not isinstance(salt, str) or not isinstance(fingerprint, str):
+            return False
+        memo = self.__memo(username, password)
+        known = self.__known.get(username)
+        if known is not None and known[1:] == (salt, fingerprint):
+            return hmac.compare_digest(known[0], memo)
+        if not hmac.compare_digest(pbkdf2(username, password, salt), fingerprint):
+            return False
+        self.__known[username] = (memo, salt, fingerprint)
+        return True
+
+    def __read(self) -> dict:
+        try:
+            with open(self.path, "rt", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def __write(self, data: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        # cookie 等同于登录凭据，只允许本人读写
+        fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "wt", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(str(tmp), str(self.path))
+
+
+def is_session_alive(s: Session) -> bool:
+    """用一个轻量请求检查会话是否仍然有效
+
+    失效的会话会被重定向到登录页，或者重新下发设置 DSafeId 的跳转页。
+    """
+    resp = s.get(f"{HOST.PREFIX}{Route.mainform}", allow_redirects=False, stream=True)
+    if resp.status_code != 200:
+        resp.close()
+        return False
+    text = read_text(resp, ROUTE_ENCODING[Route.mainform])
+    return "DSafeId" not in text and 'id="Logon"' not in text
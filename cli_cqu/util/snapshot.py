@@ -0,0 +1,347 @@
+"""课表快照
+
+把一届学生各学期的课表归档为一个紧凑的二进制文件，代替逐个读取 courses-json 导出的缩进 JSON：
+
+- 教师、地点、类别、课程号+名字等重复出现的字符串只保存一次，课程行中只保存字符串编号
+- 所有字段完全相同的课程行只保存一次，一份课表只是课程行编号的列表
+- 学分、学时保存在 float64 的列数组中
+- 文件用 mmap 映射，打开时只读取文件头；按（学号, 学年学期）在有序目录中二分查找，
+  课程只在被访问时才构造为 Course、ExperimentCourse，字符串只在被访问时才解码
+
+::
+
+    write_snapshot("cohort.snap", [("20170001", "2019-2020学年第一学期", courses), ...])
+    with Snapshot.open("cohort.snap") as snap:
+        snap.semesters("20170001")
+        table = snap["20170001", "2019-2020学年第一学期"]
+        table[0].teacher
+
+文件格式（小端序）::
+
+    MAGIC                       8 字节
+    计数                        uint64 × 4：字符串数 S、课程行数 R、课表数 T、课程行编号数 N
+    字符串偏移                  uint32 × (S + 1)，字符串 i 为 UTF-8 数据的 [off[i], off[i+1])
+    课程行类型                  uint8 × R，0 为 Course，1 为 ExperimentCourse
+    数值列                      float64 × R，按 NUMBERS 的顺序各一列
+    字符串列                    uint32 × R，按 TEXTS 的顺序各一列，该类型没有的字段为空字符串
+    目录                        uint32 × 4 × T：学号、学年学期的字符串编号，课程行编号的起点、个数
+    课程行编号                  uint32 × N
+    UTF-8 数据
+
+除 UTF-8 数据外，各段都按 8 字节对齐；目录按（学号, 学年学期）排序。快照写出后不再修改，
+更新时读出旧快照、合并后整体重写。
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from ..model import Course
+from ..model import CourseRecord
+from ..model import ExperimentCourse
+from ..model import ExperimentCourseRecord
+
+__all__ = ("Snapshot", "SnapshotTable", "write_snapshot")
+
+MAGIC = b"CQUSNAP\x01"
+COUNTS = struct.Struct("<4Q")
+# 数值字段
+NUMBERS = ("score", "time_total", "time_teach", "time_practice")
+# 字符串字段，Course 与 ExperimentCourse 字段的并集
+TEXTS = ("identifier", "classifier", "teach_type", "exam_type", "project_name", "teacher", "hosting_teacher",
+         "week_schedule", "day_schedule", "location")
+# 课程行类型 -> (模型, 紧凑记录)
+KINDS = ((Course, CourseRecord), (ExperimentCourse, ExperimentCourseRecord))
+LITTLE = sys.byteorder == "little"
+
+AnyCourse = Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord, dict]
+
+
+def _layout(strings: int, rows: int, tables: int, refs: int) -> Dict[str, Tuple[int, str, int]]:
+    "各段的 (偏移, 类型码, 元素个数)，UTF-8 数据的长度由字符串偏移的最后一项给出"
+    sections = [("offsets", "I", strings + 1), ("kinds", "B", rows)]
+    sections += [(name, "d", rows) for name in NUMBERS]
+    sections += [(name, "I", rows) for name in TEXTS]
+    sections += [("directory", "I", 4 * tables), ("refs", "I", refs)]
+    layout = {}
+    offset = len(MAGIC) + COUNTS.size
+    for name, typecode, count in sections:
+        layout[name] = (offset, typecode, count)
+        offset += -(-count * array(typecode).itemsize // 8) * 8
+    layout["blob"] = (offset, "B", 0)
+    return layout
+
+
+def write_snapshot(path: Path, tables: Iterable[Tuple[str, str, Iterable[AnyCourse]]]) -> int:
+    """写出快照，返回课表数
+
+    :param tables: (学号, 学年学期, 课程) 的序列，课程可以是模型、紧凑记录或其 dict()；
+                   同一（学号, 学年学期）出现多次时以最后一次为准
+    """
+    strings: Dict[str, int] = {"": 0}
+    rows: Dict[tuple, int] = {}
+    kinds = array("B")
+    columns = {name: array("d") for name in NUMBERS}
+    columns.update((name, array("I")) for name in TEXTS)
+    entries: Dict[Tuple[str, str], array] = {}
+
+    def intern(s: str) -> int:
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    for student, semester, courses in tables:
+        ids = array("I")
+        for course in courses:
+            data = course if isinstance(course, dict) else course.dict()
+            kind = int("project_name" in data)
+            key = (kind, ) + tuple(float(data[name]) for name in NUMBERS) \
+                + tuple(intern(data[name]) if name in data else 0 for name in TEXTS)
+            i = rows.get(key)
+            if i is None:
+                i = rows[key] = len(kinds)
+                kinds.append(kind)
+                for name, value in zip(NUMBERS + TEXTS, key[1:]):
+                    columns[name].append(value)
+            ids.append(i)
+        student, semester = str(student), str(semester)
+        intern(student), intern(semester)
+        entries[student, semester] = ids
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    directory = array("I")
+    refs = array("I")
+    for student, semester in sorted(entries):
+        ids = entries[student, semester]
+        directory.extend((strings[student], strings[semester], len(refs), len(ids)))
+        refs.extend(ids)
+    arrays = {"offsets": offsets, "kinds": kinds, "directory": directory, "refs": refs, **columns}
+
+    path = Path(path)
+    layout = _layout(len(strings), len(kinds), len(entries), len(refs))
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as fp:
+        fp.write(MAGIC)
+        fp.write(COUNTS.pack(len(strings), len(kinds), len(entries), len(refs)))
+        for name, (offset, _, _) in layout.items():
+            fp.write(b"\0" * (offset - fp.tell()))
+            if name == "blob":
+                fp.write(blob)
+                continue
+            data = arrays[name]
+            if not LITTLE:
+                data = array(data.typecode, data)
+                data.byteswap()
+            data.tofile(fp)
+    os.replace(str(tmp), str(path))
+    return len(entries)
+
+
+class SnapshotTable(Sequence):
+    "快照中的一份课表，课程在被访问时才构造"
+    __slots__ = ("snapshot", "student", "semester", "start", "count")
+
+    def __init__(self, snapshot: "Snapshot", student: str, semester: str, start: int, count: int):
+        self.snapshot = snapshot
+        self.student = student
+        self.semester = semester
+        self.start = start
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.snapshot.course(self.snapshot.row_id(self.start + i))
+
+    def rows(self) -> List[int]:
+        "课程行编号"
+        return [self.snapshot.row_id(self.start + i) for i in range(self.count)]
+
+    def records(self) -> Iterator[Union[CourseRecord, ExperimentCourseRecord]]:
+        "逐条产出紧凑记录"
+        for i in self.rows():
+            yield self.snapshot.record(i)
+
+    def __repr__(self) -> str:
+        return f"SnapshotTable({self.student!r}, {self.semester!r}, {self.count} 门课程)"
+
+
+class Snapshot:
+    """只读的课表快照
+
+    :param buffer: 快照文件的内容，bytes 或 mmap；用 Snapshot.open 打开文件
+    """
+    def __init__(self, buffer):
+        self.__buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("不是课表快照文件")
+        counts = COUNTS.unpack_from(view, len(MAGIC))
+        self.__views = [view]
+        self.__arrays = {}
+        layout = _layout(*counts)
+        for name, (offset, typecode, count) in layout.items():
+            if name == "blob":
+                continue
+            size = count * array(typecode).itemsize
+            if LITTLE:
+                part = view[offset:offset + size]
+                data = part.cast(typecode)
+                self.__views += [part, data]
+            else:
+                data = array(typecode, bytes(view[offset:offset + size]))
+                data.byteswap()
+            self.__arrays[name] = data
+        offset = layout["blob"][0]
+        self.__blob = view[offset:offset + self.__arrays["offsets"][-1]]
+        self.__views.append(self.__blob)
+        # 已解码的字符串
+        self.__strings: List[str] = [None] * counts[0]
+        self.__strings[0] = ""
+        self.__directory = self.__arrays["directory"]
+        self.__refs = self.__arrays["refs"]
+
+    @classmethod
+    def open(cls, path: Path) -> "Snapshot":
+        "以 mmap 打开快照文件"
+        with open(path, "rb") as fp:
+            return cls(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self):
+        "释放映射，之后取得的 SnapshotTable 不再可用"
+        for view in reversed(self.__views):
+            view.release()
+        self.__views = []
+        self.__arrays = {}
+        if isinstance(self.__buffer, mmap.mmap):
+            self.__buffer.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, i: int) -> str:
+        "编号为 i 的字符串"
+        s = self.__strings[i]
+        if s is None:
+            offsets = self.__arrays["offsets"]
+            s = self.__strings[i] = str(self.__blob[offsets[i]:offsets[i + 1]], "utf-8")
+        return s
+
+    def row_id(self, i: int) -> int:
+        return self.__refs[i]
+
+    def __fields(self, row: int) -> Tuple[int, dict]:
+        kind = self.__arrays["kinds"][row]
+        fields = KINDS[kind][1].__slots__
+        return kind, {
+            name: self.__arrays[name][row] if name in NUMBERS else self.string(self.__arrays[name][row])
+            for name in fields
+        }
+
+    def course(self, row: int) -> Union[Course, ExperimentCourse]:
+        "课程行 row 对应的模型，写入时已经校验过，不再重复校验"
+        kind, fields = self.__fields(row)
+        return KINDS[kind][0].construct(**fields)
+
+    def record(self, row: int) -> Union[CourseRecord, ExperimentCourseRecord]:
+        "课程行 row 对应的紧凑记录"
+        kind, fields = self.__fields(row)
+        return KINDS[kind][1](**fields)
+
+    def __len__(self) -> int:
+        "课表数"
+        return len(self.__directory) // 4
+
+    def __key(self, i: int) -> Tuple[str, str]:
+        return self.string(self.__directory[4 * i]), self.string(self.__directory[4 * i + 1])
+
+    def __bisect(self, key: Tuple[str, str]) -> int:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __table(self, i: int) -> SnapshotTable:
+        d = self.__directory
+        return SnapshotTable(self, *self.__key(i), d[4 * i + 2], d[4 * i + 3])
+
+    def __getitem__(self, key: Tuple[str, str]) -> SnapshotTable:
+        "某名学生某个学期的课表"
+        i = self.__bisect(key)
+        if i == len(self) or self.__key(i) != key:
+            raise KeyError(key)
+        return self.__table(i)
+
+    def get(self, student: str, semester: str, default=None):
+        try:
+            return self[student, semester]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return self.get(*key) is not None
+
+    def tables(self, student: str = None) -> List[SnapshotTable]:
+        "某名学生各学期的课表，按学年学期排序；student 为 None 时为所有课表"
+        if student is None:
+            return [self.__table(i) for i in range(len(self))]
+        result = []
+        for i in range(self.__bisect((student, "")), len(self)):
+            if self.string(self.__directory[4 * i]) != student:
+                break
+            result.append(self.__table(i))
+        return result
+
+    def semesters(self, student: str) -> List[str]:
+        "某名学生有课表的学期"
+        return [table.semester for table in self.tables(student)]
+
+    def keys(self) -> Iterator[Tuple[str, str]]:
+        "所有的（学号, 学年学期），有序"
+        return (self.__key(i) for i in range(len(self)))
+
+    __iter__ = keys
+
+    def students(self) -> List[str]:
+        result = []
+        for student, _ in self.keys():
+            if not result or result[-1] != student:
+                result.append(student)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        "课表数、学生数、不重复的课程行数、字符串数"
+        return {
+            "tables": len(self),
+            "students": len(self.students()),
+            "rows": len(self.__arrays["kinds"]),
+            "strings": len(self.__strings),
+        }
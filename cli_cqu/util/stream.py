@@ -0,0 +1,108 @@
+"""响应体的流式解码
+
+jxgl、oldjw 的页面都是 GBK 编码，各路由的编码在 data.route.ROUTE_ENCODING 中显式给出，
+响应头的 Content-Type 声明了 charset 时以响应头为准，
+不再依赖 ``resp.text`` 的编码探测，也不再先取得完整的 ``resp.content`` 再整体 decode。
+
+- read_text 用增量解码器逐块解码，内存中只有分块的 bytes 和最终的 str
+- parse_html 把分块的 bytes 直接喂给 lxml 的增量解析器，内存中只有分块的 bytes 和 lxml 树
+- iter_elements 同样边下载边解析，但每当一个指定的元素结束就产出它；
+  调用方处理完后用 release 把它从树中删除，内存中只剩尚未处理的部分
+
+请求时加上 ``stream=True`` 才能避免 requests 预先读取整个响应体；
+对已经读取过的响应（例如来自 util.cache 的缓存）两者同样可用。
+"""
+import codecs
+import re
+from typing import Iterator
+
+from lxml import etree
+from lxml import html as lhtml
+from requests import Response
+
+__all__ = ("response_encoding", "iter_text", "read_text", "parse_html", "iter_elements", "release")
+
+# 每次从连接中读取的字节数
+CHUNK_SIZE = 64 * 1024
+P_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+# 与浏览器一致，声明为 gb2312 的页面按 GBK 解码，否则 GBK 独有的字会被替换
+ENCODING_ALIASES = {"gb2312": "gbk", "gb_2312-80": "gbk", "x-gbk": "gbk", "iso-ir-58": "gbk", "chinese": "gbk"}
+
+
+def response_encoding(resp: Response, default: str) -> str:
+    "响应头声明的编码，没有声明时为 default"
+    m = P_CHARSET.search(resp.headers.get("content-type", ""))
+    encoding = m[1].lower() if m else default
+    return ENCODING_ALIASES.get(encoding, encoding)
+
+
+def iter_text(resp: Response, encoding: str, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    "逐块解码响应体，无法解码的字节替换为 U+FFFD，与 resp.text 相同；encoding 参考 response_encoding"
+    decoder = codecs.getincrementaldecoder(response_encoding(resp, encoding))(errors="replace")
+    try:
+        for chunk in resp.iter_content(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+    finally:
+        resp.close()
+
+
+def read_text(resp: Response, encoding: str, chunk_size: int = CHUNK_SIZE) -> str:
+    "以给定编码解码整个响应体，不做编码探测"
+    return "".join(iter_text(resp, encoding, chunk_size))
+
+
+def parse_html(resp: Response, encoding: str, chunk_size: int = CHUNK_SIZE):
+    """边下载边解析 HTML，返回 lxml.html 的文档根节点，响应体为空时返回 None
+
+    结果与 ``lxml.html.document_fromstring(read_text(resp, encoding))`` 相同
+    """
+    parser = lhtml.HTMLParser(encoding=response_encoding(resp, encoding))
+    empty = True
+    try:
+        for chunk in resp.iter_content(chunk_size):
+            if empty and not chunk.strip():
+                continue
+            empty = False
+            parser.feed(chunk)
+    finally:
+        resp.close()
+    if empty:
+        return None
+    return parser.close()
+
+
+def iter_elements(resp: Response, encoding: str, tag: str, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """边下载边解析 HTML，每当一个 tag 元素结束时产出它（lxml.html 的元素）
+
+    元素结束时它的子孙已经完整，但之后的兄弟尚未解析。响应在读完或生成器关闭时关闭
+    """
+    parser = etree.HTMLPullParser(events=("end", ), tag=tag, encoding=response_encoding(resp, encoding))
+    parser.set_element_class_lookup(lhtml.HtmlElementClassLookup())
+    empty = True
+    try:
+        for chunk in resp.iter_content(chunk_size):
+            if empty and not chunk.strip():
+                continue
+            empty = False
+            parser.feed(chunk)
+            for _, el in parser.read_events():
+                yield el
+        if not empty:
+            parser.close()
+            for _, el in parser.read_events():
+                yield el
+    finally:
+        resp.close()
+
+
+def release(el):
+    "清空已经处理完的元素，并删除它之前的兄弟，使树不随文档增长"
+    el.clear()
+    parent = el.getparent()
+    while el.getprevious() is not None:
+        del parent[0]
@@ -0,0 +1,122 @@
+"""增量同步课程日历
+
+保存上一次导出时的课程快照，再次导出时只输出新增、变更和取消的事件：
+
+- 新增的事件 SEQUENCE 为 0
+- 内容有变化的事件 SEQUENCE 加一
+- 本次不再出现的事件 SEQUENCE 加一，并标记 STATUS:CANCELLED
+
+事件的 UID 由 calendar.event_uid 给出，在多次导出之间保持不变，日历应用据此更新已导入的事件；
+同一课程、周次段、节次有多行时由 calendar.iter_events 区分。
+"""
+import json
+import os
+from datetime import date
+from hashlib import sha1
+from pathlib import Path
+from typing import BinaryIO
+from typing import Dict
+from typing import Iterable
+from typing import Union
+
+from icalendar import Event
+
+from ..data.schedule import Schedule
+from ..model import Course
+from ..model import CourseRecord
+from ..model import ExperimentCourse
+from ..model import ExperimentCourseRecord
+from ..model import to_record
+from .calendar import build_event
+from .calendar import iter_events
+from .calendar import make_calendar
+
+__all__ = ("sync_ical", )
+
+AnyCourse = Union[Course, ExperimentCourse, CourseRecord, ExperimentCourseRecord]
+
+RECORDS = {
+    "Course": CourseRecord,
+    "ExperimentCourse": ExperimentCourseRecord,
+}
+
+
+def load_snapshot(path: Path) -> Dict[str, dict]:
+    "读取快照 {uid: {hash, sequence, kind, course[, cancelled]}}，不存在时返回空快照"
+    try:
+        with open(path, "rt", encoding="utf-8") as fp:
+            return json.load(fp)["events"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_snapshot(path: Path, events: Dict[str, dict]):
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wt", encoding="utf-8") as fp:
+        json.dump({"version": 1, "events": events}, fp, ensure_ascii=False)
+    os.replace(str(tmp), str(path))
+
+
+def _kind(course: AnyCourse) -> str:
+    return "Course" if isinstance(course, (Course, CourseRecord)) else "ExperimentCourse"
+
+
+def _digest(ev: Event) -> str:
+    "事件内容的摘要，用于判断事件是否有变化"
+    return sha1(ev.to_ical()).hexdigest()
+
+
+def sync_ical(courses: Iterable[AnyCourse], start: date, schedule: Schedule,
+              snapshot: Path, out: BinaryIO) -> Dict[str, int]:
+    """对比快照，将新增、变更、取消的事件写入 out，并更新快照
+
+    快照不存在时相当于全部事件都是新增的。
+
+    :return: {"added": n, "changed": n, "cancelled": n, "unchanged": n}
+    """
+    previous = load_snapshot(snapshot)
+    current: Dict[str, dict] = {}
+    counts = {"added": 0, "changed": 0, "cancelled": 0, "unchanged": 0}
+    cal = make_calendar()
+
+    for course, ev in iter_events(courses, start, schedule):
+        record = course if isinstance(course, (CourseRecord, ExperimentCourseRecord)) else to_record(course)
+        uid = str(ev["uid"])
+        digest = _digest(ev)
+        old = previous.get(uid)
+        if old is None:
+            sequence = 0
+            counts["added"] += 1
+        elif old["hash"] != digest or old.get("cancelled"):
+            sequence = old["sequence"] + 1
+            counts["changed"] += 1
+        else:
+            sequence = old["sequence"]
+            counts["unchanged"] += 1
+        current[uid] = {"hash": digest, "sequence": sequence, "kind": _kind(course), "course": record.dict()}
+        if old is None or old["hash"] != digest or old.get("cancelled"):
+            ev.add("sequence", sequence)
+            cal.add_component(ev)
+
+    for uid, old in previous.items():
+        if uid in current:
+            continue
+        if old.get("cancelled"):
+            # 已经通知过取消，保留记录，以便重新出现时 SEQUENCE 继续递增
+            current[uid] = old
+            continue
+        counts["cancelled"] += 1
+        current[uid] = dict(old, sequence=old["sequence"] + 1, cancelled=True)
+        course = RECORDS[old["kind"]](**old["course"])
+        events = build_event(course, start, schedule) + build_event(course, start, schedule, distinct=True)
+        for ev in events:
+            if str(ev["uid"]) == uid:
+                ev.add("sequence", old["sequence"] + 1)
+                ev.add("status", "CANCELLED")
+                cal.add_component(ev)
+                break
+
+    out.write(cal.to_ical())
+    save_snapshot(snapshot, current)
+    return counts
@@ -0,0 +1,181 @@
+"""运行耗时追踪
+
+在登录、HTTP 请求、页面解析、导出等阶段记录带耗时的区间（span）::
+
+    with span("parse", "parse_personal_courses_table", rows=n):
+        ...
+
+没有开启记录时 span 几乎没有开销。开启记录::
+
+    with recording() as tracer:
+        app.courses_json("a.json", semesters="all")
+    print(tracer.summary_table())
+    tracer.dump_chrome("trace.json")  # 用 chrome://tracing 或 Perfetto 打开
+
+只依赖标准库，可以在不加载 requests 等依赖时导入。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+
+__all__ = ("Span", "Tracer", "span", "recording", "current_tracer")
+
+
+class Span(NamedTuple):
+    "一个已结束的区间"
+    # 阶段：login、http、parse、export 等
+    category: str
+    name: str
+    # time.perf_counter() 的读数，秒
+    start: float
+    duration: float
+    process: int
+    thread: int
+    args: dict
+
+
+class _ActiveSpan:
+    "进行中的区间，可以在结束前用 set 补充参数"
+    __slots__ = ("tracer", "category", "name", "args", "t0")
+
+    def __init__(self, tracer: "Tracer", category: str, name: str, args: dict):
+        self.tracer = tracer
+        self.category = category
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self) -> "_ActiveSpan":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.add(
+            Span(self.category, self.name, self.t0, t1 - self.t0, os.getpid(), threading.get_ident(), self.args))
+
+
+class _NullSpan:
+    "未开启记录时使用的空区间"
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    "收集区间，线程安全"
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.__lock = threading.Lock()
+
+    def add(self, s: Span):
+        with self.__lock:
+            self.spans.append(s)
+
+    def merge(self, spans: Iterable[Span]):
+        "并入其他 Tracer（例如批量任务子进程）记录的区间"
+        with self.__lock:
+            self.spans.extend(Span(*s) for s in spans)
+
+    def chrome_trace(self) -> dict:
+        "Chrome Trace Event 格式（完整事件 ph=X，时间单位为微秒，以 Tracer 创建时刻为零点）"
+        events = [{
+            "name": s.name,
+            "cat": s.category,
+            "ph": "X",
+            "ts": round((s.start - self.origin) * 1e6, 1),
+            "dur": round(s.duration * 1e6, 1),
+            "pid": s.process,
+            "tid": s.thread,
+            "args": s.args,
+        } for s in self.spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump_chrome(self, filename: str):
+        with open(filename, "wt", encoding="utf-8") as fp:
+            json.dump(self.chrome_trace(), fp, ensure_ascii=False, default=str)
+
+    def summary(self) -> List[dict]:
+        """按 (阶段, 名称) 汇总，按总耗时降序
+
+        每项为 {category, name, count, total, mean, max}，时间单位为秒；
+        http 阶段另有 bytes（响应体字节数之和）
+        """
+        groups: Dict[tuple, dict] = {}
+        for s in self.spans:
+            g = groups.get((s.category, s.name))
+            if g is None:
+                g = groups[(s.category, s.name)] = {
+                    "category": s.category,
+                    "name": s.name,
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                }
+            g["count"] += 1
+            g["total"] += s.duration
+            g["max"] = max(g["max"], s.duration)
+            if "bytes" in s.args:
+                g["bytes"] = g.get("bytes", 0) + s.args["bytes"]
+        for g in groups.values():
+            g["mean"] = g["total"] / g["count"]
+        return sorted(groups.values(), key=lambda g: g["total"], reverse=True)
+
+    def summary_table(self) -> str:
+        "summary 的文本表格，时间单位为毫秒"
+        lines = [f"{'category':<10}{'name':<42}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}{'bytes':>12}"]
+        for g in self.summary():
+            lines.append(f"{g['category']:<10}{g['name'][:41]:<42}{g['count']:>8}{g['total'] * 1e3:>12.1f}"
+                         f"{g['mean'] * 1e3:>10.1f}{g['max'] * 1e3:>10.1f}{g.get('bytes', ''):>12}")
+        return "\n".join(lines)
+
+
+# 当前进程中开启的 Tracer，为 None 时不记录
+_current: Tracer = None
+
+
+def current_tracer() -> Tracer:
+    "正在记录的 Tracer，没有开启记录时为 None"
+    return _current
+
+
+def span(category: str, name: str, **args):
+    "记录一个区间，用作上下文管理器；args 会原样写入 Chrome trace 的 args"
+    tracer = _current
+    if tracer is None:
+        return _NULL_SPAN
+    return _ActiveSpan(tracer, category, name, args)
+
+
+@contextmanager
+def recording(tracer: Tracer = None) -> Iterator[Tracer]:
+    "在 with 块内开启记录，结束时恢复之前的状态"
+    global _current
+    previous = _current
+    _current = tracer if tracer is not None else Tracer()
+    try:
+        yield _current
+    finally:
+        _current = previous
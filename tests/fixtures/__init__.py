@@ -0,0 +1,21 @@
+"""离线 HTML 样本与合成数据
+
+*.html 是按 jxgl、oldjw 页面的结构编写的合成页面，不是线上页面的存档：行号、课程号、姓名都是虚构的
+（以 UTF-8 保存，线上的 oldjw 页面为 GBK 编码）。它们覆盖的是解析器依赖的表格结构，
+例如 hidevalue 合并的单元格和实验课表，而不能代替线上页面的回归测试。
+synth_* 函数（见 cli_cqu.mock.pages）按相同的结构生成任意行数的页面，用于测试和性能基准。
+"""
+from pathlib import Path
+
+from cli_cqu.mock.pages import synth_courses_table
+from cli_cqu.mock.pages import synth_personal_courses
+from cli_cqu.mock.pages import synth_transcript
+
+__all__ = ("load", "synth_courses_table", "synth_transcript", "synth_personal_courses")
+
+HERE = Path(__file__).parent
+
+
+def load(name: str) -> str:
+    "读取一个样本页面"
+    return (HERE / name).read_text(encoding="utf-8")
@@ -0,0 +1,37 @@
+import time
+
+from cli_cqu import aio
+
+
+class FakeApp:
+    def __init__(self, username, password, session=None):
+        if password == "wrong":
+            raise ValueError("账号或密码错误")
+        time.sleep(0.05)
+        self.username = username
+        self.session = session
+
+
+def fake_personal_courses(s):
+    return {"Sel_XNXQ": [{"text": "2019-2020学年第二学期", "value": 20191}]}
+
+
+def fake_personal_courses_table(s, data):
+    return [data["Sel_XNXQ"]]
+
+
+def test_courses_tables(monkeypatch):
+    monkeypatch.setattr(aio, "App", FakeApp)
+    monkeypatch.setattr(aio.Parsed.TeachingArrangement, "personal_courses", fake_personal_courses)
+    monkeypatch.setattr(aio.Parsed.TeachingArrangement, "personal_courses_table", fake_personal_courses_table)
+    accounts = [(str(i), "123456") for i in range(16)] + [("bad", "wrong")]
+
+    t0 = time.perf_counter()
+    results = dict(aio.courses_tables(accounts, limit_per_host=16))
+    elapsed = time.perf_counter() - t0
+
+    assert len(results) == 17
+    assert results["0"] == [20191]
+    assert isinstance(results["bad"], ValueError)
+    # 并发执行，总耗时应接近单个帐号的耗时
+    assert elapsed < 16 * 0.05
@@ -0,0 +1,80 @@
+import json
+import time
+from urllib.parse import parse_qs
+
+import pytest
+from requests import Session
+from requests.adapters import BaseAdapter
+
+from cli_cqu.app import App
+from cli_cqu.app import parse_semesters
+from cli_cqu.data import HOST
+from cli_cqu.data.route import Route
+from cli_cqu.util.cache import CacheAdapter
+from tests.fixtures import synth_courses_table
+from tests.fixtures import synth_personal_courses
+
+
+class FixtureAdapter(BaseAdapter):
+    "用样本页面应答课程表相关的请求"
+    def __init__(self, delay: float = 0):
+        super().__init__()
+        self.delay = delay
+
+    def send(self, request, **kwargs):
+        time.sleep(self.delay)
+        if request.url.endswith(Route.TeachingArrangement.personal_courses):
+            body = synth_personal_courses(4)
+        elif request.url.endswith(Route.TeachingArrangement.personal_courses_table):
+            xnxq = int(parse_qs(request.body)["Sel_XNXQ"][0])
+            body = synth_courses_table(xnxq % 10 + 1, seed=xnxq)
+        else:
+            raise AssertionError(request.url)
+        return CacheAdapter.build_response(request, 200, {"content-type": "text/html; charset=utf-8"},
+                                           body.encode("utf-8"))
+
+    def close(self):
+        pass
+
+
+def offline_app(adapter: BaseAdapter) -> App:
+    s = Session()
+    s.mount(HOST.PREFIX, adapter)
+    app = App.__new__(App)
+    app.session = s
+    return app
+
+
+@pytest.mark.parametrize("spec, n, ex", [
+    ("all", 3, [0, 1, 2]),
+    ("1", 3, [1]),
+    ("0-1,3", 4, [0, 1, 3]),
+])
+def test_parse_semesters(spec, n, ex):
+    assert parse_semesters(spec, n) == ex
+
+
+@pytest.mark.parametrize("spec", ["4", "a-b", "1-"])
+def test_parse_semesters_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_semesters(spec, 4)
+
+
+def test_courses_by_semester():
+    app = offline_app(FixtureAdapter(delay=0.05))
+    t0 = time.perf_counter()
+    tables = app.courses_by_semester("all", workers=4)
+    elapsed = time.perf_counter() - t0
+    assert list(tables) == ["2018-2019学年第二学期", "2018-2019学年第一学期", "2017-2018学年第二学期", "2017-2018学年第一学期"]
+    assert [len(t) for t in tables.values()] == [2, 1, 2, 1]
+    # 1 次学期列表 + 4 个学期并发
+    assert elapsed < 0.05 * 4
+
+
+def test_courses_ndjson(tmp_path):
+    app = offline_app(FixtureAdapter())
+    app.courses_ndjson(str(tmp_path / "courses"), "0-1", workers=2)
+    lines = (tmp_path / "courses.ndjson").read_text(encoding="utf-8").splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert len(rows) == 3
+    assert {row["semester"] for row in rows} == {"2018-2019学年第二学期", "2018-2019学年第一学期"}
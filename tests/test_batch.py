@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from cli_cqu.batch import check_job
+from cli_cqu.batch import load_jobs
+from cli_cqu.batch import log_name
+from cli_cqu.batch import run_batch
+from cli_cqu.batch import run_job
+from cli_cqu.mock import MockConfig
+from cli_cqu.mock import MockServer
+
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("\n".join([
+        "# 注释",
+        json.dumps({"username": "20170001", "password": "x", "command": "courses-json", "output": "a.json"}),
+        "",
+        json.dumps({"id": "b", "username": "20170002", "password": "x", "command": "assignments-json"}),
+    ]), encoding="utf-8")
+    jobs = load_jobs(path)
+    assert [j["id"] for j in jobs] == ["2-20170001", "b"]
+
+
+@pytest.mark.parametrize("job", [
+    {"username": "1", "password": "x", "command": "unknown"},
+    {"username": "1", "password": "x", "command": "courses-json", "output": "a.json"},
+    {"username": "1", "password": "x", "command": "courses-ical", "output": "a.ics", "semester": 0},
+    {"password": "x", "command": "assignments-json", "output": "a.json"},
+])
+def test_check_job_invalid(job):
+    with pytest.raises(ValueError):
+        check_job(job)
+
+
+def test_run_job_records_error():
+    result = run_job({"id": "x", "username": "1", "password": "x", "command": "courses-ical", "output": "a.ics"})
+    assert result["ok"] is False
+    assert "campus" in result["error"]
+    assert result["traceback"]
+
+
+def test_log_name():
+    used = set()
+    assert log_name("../../etc/passwd", used) == "_.._etc_passwd.json"
+    assert log_name("a/b", used) == "a_b.json"
+    assert log_name("a:b", used) == "a_b-2.json"
+    assert log_name("..", used) == "_.json"
+
+
+def test_run_batch(tmp_path, monkeypatch):
+    accounts = {"20170001": ("jxgl-pass", ""), "20170002": ("jxgl-pass-2", "")}
+    with MockServer(MockConfig(accounts=accounts, dsafeid_wait=0.05, courses=2)) as server:
+        # 子进程沿用本进程改发到 mock 服务器的设置，会话保存在临时目录
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        jobs = [{
+            "id": f"../{u}",
+            "username": u,
+            "password": p,
+            "command": "courses-json",
+            "semester": 0,
+            "output": str(tmp_path / u),
+        } for u, (p, _) in accounts.items()]
+        jobs.append({"id": "wrong", "username": "20170001", "password": "x", "command": "courses-json", "semester": 0,
+                     "output": str(tmp_path / "wrong")})
+        results = list(run_batch(jobs, tmp_path / "logs", 3))
+    assert sorted(r["id"] for r in results if r["ok"]) == ["../20170001", "../20170002"]
+    assert sorted(p.name for p in (tmp_path / "logs").iterdir()) == ["_20170001.json", "_20170002.json", "wrong.json"]
+    assert (tmp_path / "20170001.json").exists()
+    # 两个进程各自保存的会话都在同一个文件中
+    sessions = json.loads((tmp_path / "cache" / "cli_cqu" / "sessions.json").read_text(encoding="utf-8"))
+    assert sorted(sessions) == ["20170001", "20170002"]
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+from requests import Session
+from requests.adapters import BaseAdapter
+
+from cli_cqu.data import HOST
+from cli_cqu.data.route import Route
+from cli_cqu.util.cache import CacheAdapter
+from cli_cqu.util.cache import CacheMiss
+from cli_cqu.util.cache import ResponseCache
+
+COURSES = f"{HOST.PREFIX}{Route.TeachingArrangement.personal_courses}"
+TABLE = f"{HOST.PREFIX}{Route.TeachingArrangement.personal_courses_table}"
+
+
+class CountingAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.page = b""
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        body = self.page + f"{self.calls}".encode()
+        return CacheAdapter.build_response(request, 200, {"content-type": "text/html; charset=gbk"}, body)
+
+    def close(self):
+        pass
+
+
+def make(tmp_path, user="20170000", offline=False):
+    inner = CountingAdapter()
+    s = Session()
+    s.mount(HOST.PREFIX, CacheAdapter(ResponseCache(tmp_path), user, inner, offline))
+    return s, inner
+
+
+def test_hit(tmp_path):
+    s, inner = make(tmp_path)
+    assert s.get(COURSES).text == "1"
+    assert s.get(COURSES).text == "1"
+    assert inner.calls == 1
+
+
+def test_form_order(tmp_path):
+    s, inner = make(tmp_path)
+    s.post(TABLE, data={"Sel_XNXQ": 20190, "px": 0, "rad": "on"})
+    s.post(TABLE, data={"rad": "on", "px": 0, "Sel_XNXQ": 20190})
+    assert inner.calls == 1
+    s.post(TABLE, data={"Sel_XNXQ": 20191, "px": 0, "rad": "on"})
+    assert inner.calls == 2
+
+
+def test_per_user(tmp_path):
+    s, _ = make(tmp_path, "20170000")
+    s.get(COURSES)
+    s, inner = make(tmp_path, "20170001")
+    s.get(COURSES)
+    assert inner.calls == 1
+
+
+def test_uncached_route(tmp_path):
+    s, inner = make(tmp_path)
+    s.get(f"{HOST.PREFIX}{Route.home}")
+    s.get(f"{HOST.PREFIX}{Route.home}")
+    assert inner.calls == 2
+
+
+def test_expired_session(tmp_path):
+    s, inner = make(tmp_path)
+    # 会话失效时返回的跳转页和登录页不缓存
+    for page in (b"<script>document.cookie='DSafeId=AB12;';</script>", b'<form id="Logon">'):
+        inner.page = page
+        s.get(COURSES)
+        s.get(COURSES)
+    inner.page = b""
+    assert s.get(COURSES).text == "5"
+    assert s.get(COURSES).text == "5"
+    assert inner.calls == 5
+
+
+def test_offline(tmp_path):
+    s, _ = make(tmp_path)
+    s.get(COURSES)
+    s, inner = make(tmp_path, offline=True)
+    assert s.get(COURSES).text == "1"
+    with pytest.raises(CacheMiss):
+        s.post(TABLE, data={"Sel_XNXQ": 20190})
+    with pytest.raises(CacheMiss):
+        s.get(f"{HOST.PREFIX}{Route.home}")
+    assert inner.calls == 0
+
+
+def test_concurrent_put(tmp_path):
+    cache = ResponseCache(tmp_path)
+    bodies = [bytes([65 + i]) * 200000 for i in range(8)]
+
+    def put(body):
+        for _ in range(5):
+            cache.put("ab" * 32, 200, {}, body)
+
+    threads = [threading.Thread(target=put, args=(b, )) for b in bodies]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.get("ab" * 32)[1] in bodies
+    assert [p.name for p in cache.path("ab" * 32).parent.iterdir()] == ["ab" * 32]
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from cli_cqu.data.schedule import HuxiSchedule
+from cli_cqu.model import CourseRecord
+from cli_cqu.util.conflict import find_cohort_conflicts
+from cli_cqu.util.conflict import find_conflicts
+from cli_cqu.util.conflict import format_weeks
+from cli_cqu.util.datetime import lesson_minutes
+from cli_cqu.util.datetime import parse_weeks
+
+
+def course(name: str, week: str, lesson: str) -> CourseRecord:
+    return CourseRecord(name, 2.0, 32.0, 32.0, 0.0, "必修", "讲授", "考试", "张三", week, lesson, "D1204")
+
+
+@pytest.mark.parametrize("weeks, ex", [((1, ), "1"), ((1, 2, 3, 5), "1-3,5"), ((2, 4, 5, 6), "2,4-6")])
+def test_format_weeks(weeks, ex):
+    assert format_weeks(weeks) == ex
+    assert parse_weeks(ex) == weeks
+
+
+def test_find_conflicts():
+    a = course("A", "1-8", "二[3-4节]")
+    b = course("B", "6-10", "二[4-5节]")
+    c = course("C", "1-16", "二[5-6节]")
+    d = course("D", "1-16", "三[3-4节]")
+    online = course("E", "", "")
+    conflicts = find_conflicts([a, b, c, d, online])
+    assert [(x.first, x.second, x.weeks) for x in conflicts] == [(a, b, (6, 7, 8)), (b, c, (6, 7, 8, 9, 10))]
+    # 沙坪坝第 4 节 11:05-11:50
+    assert (conflicts[0].day, conflicts[0].start, conflicts[0].end) == (1, 11 * 60 + 5, 11 * 60 + 50)
+    assert str(conflicts[0]) == "第 6-8 周 星期二 11:05-11:50：A 与 B"
+
+
+def test_full_day():
+    conflicts = find_conflicts([course("A", "3", "五[14节]"), course("B", "1-4", "五[9-10节]")], HuxiSchedule())
+    assert [x.weeks for x in conflicts] == [(3, )]
+
+
+def test_cohort_only_within_table():
+    a = course("A", "1", "一[1-2节]")
+    b = course("B", "1", "一[2-3节]")
+    conflicts = find_cohort_conflicts({"x": [a], "y": [b], "z": [a, b]})
+    assert [(x.owner, x.first, x.second) for x in conflicts] == [("z", a, b)]
+
+
+def test_matches_pairwise():
+    rng = random.Random(7)
+    courses = []
+    for i in range(60):
+        first = rng.randint(1, 10)
+        lesson = rng.randint(1, 11)
+        courses.append(
+            course(str(i), f"{first}-{first + rng.randint(0, 6)}",
+                   f"{rng.choice('一二三四五')}[{lesson}-{lesson + rng.randint(0, 1)}节]"))
+    schedule = HuxiSchedule()
+    expected = set()
+    for i, x in enumerate(courses):
+        for j in range(i + 1, len(courses)):
+            y = courses[j]
+            (xa, xb), (ya, yb) = lesson_minutes(x.day_schedule, schedule), lesson_minutes(y.day_schedule, schedule)
+            weeks = sorted(set(parse_weeks(x.week_schedule)) & set(parse_weeks(y.week_schedule)))
+            if weeks and xa < yb and ya < xb:
+                expected.add((x.identifier, y.identifier, tuple(weeks)))
+    found = {(c.first.identifier, c.second.identifier, c.weeks) for c in find_conflicts(courses, schedule)}
+    assert found == expected
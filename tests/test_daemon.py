@@ -0,0 +1,86 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from cli_cqu.daemon import Daemon
+from cli_cqu.daemon import request
+from cli_cqu.daemon import serve
+from cli_cqu.util.login import DSAFE_WAIT
+from cli_cqu.mock import MockConfig
+from cli_cqu.mock import MockServer
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 域套接字")
+
+ACCOUNTS = {"20170001": ("jxgl-pass", "oldjw-pass")}
+
+
+@pytest.fixture
+def server():
+    with MockServer(MockConfig(accounts=ACCOUNTS, dsafeid_wait=0.05, courses=4, experiments=1)) as server:
+        yield server
+
+
+@pytest.fixture
+def socket_path(server, tmp_path):
+    path = tmp_path / "daemon.sock"
+    ready = threading.Event()
+    thread = threading.Thread(target=serve, args=(Daemon(), path, ready), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    yield path
+    request({"command": "stop"}, path)
+    thread.join(5)
+    assert not path.exists()
+
+
+def job(command: str, output, **fields) -> dict:
+    return {"command": command, "username": "20170001", "password": "jxgl-pass", "output": str(output), **fields}
+
+
+def test_keeps_session(server, socket_path, tmp_path):
+    first = request(job("courses-json", tmp_path / "a.json", semester=0), socket_path)
+    assert first["ok"], first
+    assert "下载课程表" in first["log"]
+    second = request(job("courses-json", tmp_path / "b", semesters="0-1"), socket_path)
+    assert second["ok"], second
+    # 第二条指令复用已登录的 App，不再登录
+    assert server.stats()["logins"] == 1
+    assert len(json.loads((tmp_path / "b.json").read_text(encoding="utf-8"))) == 2
+    assert request({"command": "ping"}, socket_path)["users"] == ["20170001"]
+
+
+def test_stdout_output(socket_path):
+    result = request(job("courses-ndjson", "-", semesters="0"), socket_path)
+    assert result["ok"], result
+    rows = [json.loads(line) for line in result["log"].splitlines()]
+    assert len(rows) == 5
+
+
+def test_errors(server, socket_path, tmp_path):
+    wrong = request(job("courses-json", tmp_path / "a.json", semester=0, password="wrong"), socket_path)
+    assert not wrong["ok"] and "密码" in wrong["error"]
+    missing = request(job("courses-ical", tmp_path / "a.ics", semester=0), socket_path)
+    assert not missing["ok"] and "campus" in missing["error"]
+    unknown = request(job("rm", tmp_path / "a"), socket_path)
+    assert not unknown["ok"]
+
+
+def test_refresh_relogin(server, tmp_path):
+    daemon = Daemon(keepalive=0)
+    app = daemon.app("20170001", "jxgl-pass")
+    assert daemon.app("20170001", "jxgl-pass") is app
+    app.session.cookies.clear()
+    used = daemon.accounts["20170001"].used
+    daemon.refresh()
+    account = daemon.accounts["20170001"]
+    assert account.app is not app
+    assert server.stats()["logins"] == 2
+    assert account.used == used and account.checked > used
+    assert account.app.dsafe_wait is daemon.dsafe_wait
+    assert not DSAFE_WAIT.adaptive
+    daemon.idle = 0
+    daemon.refresh()
+    assert not daemon.accounts
+    daemon.close()
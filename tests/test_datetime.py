@@ -3,6 +3,8 @@ from datetime import datetime
 from datetime import date
 from datetime import timezone, timedelta
 from cli_cqu.util.datetime import materialize_calendar
+from cli_cqu.util.datetime import materialize_calendars
+from cli_cqu.util.datetime import parse_lesson
 from typing import Tuple
 START = "2020-02-17"
 
@@ -34,3 +36,15 @@ def dt(*args):
 ])
 def test_materialize_calendar(tw: str, tl: str, ex: Tuple[dt, dt]):
     assert ex == materialize_calendar(tw, tl, start=date(2020, 2, 17))
+
+
+def test_materialize_calendars():
+    pairs = [("1", "一[1-2节]"), ("2", "二[14节]"), ("16", "五[9-11节]"), ("1", "一[1-2节]")]
+    start = date(2020, 2, 17)
+    assert materialize_calendars(pairs, start) == [materialize_calendar(w, l, start) for w, l in pairs]
+
+
+@pytest.mark.parametrize("tl", ["一[1节]", "八[1-2节]", "一[1-2]"])
+def test_parse_lesson_invalid(tl: str):
+    with pytest.raises(ValueError):
+        parse_lesson(tl)
@@ -0,0 +1,101 @@
+from datetime import date
+from io import BytesIO
+
+import pytest
+
+from cli_cqu.data.route import parse_personal_courses
+from cli_cqu.data.route import parse_personal_courses_table
+from cli_cqu.data.route import iter_whole_assignment
+from cli_cqu.data.route import parse_whole_assignment
+from cli_cqu.data.schedule import ShaPingBaSchedule
+from cli_cqu.model import Course
+from cli_cqu.model import ExperimentCourse
+from cli_cqu.util.calendar import make_ical
+from cli_cqu.util.calendar import write_ical
+from tests.fixtures import load
+from tests.fixtures import synth_courses_table
+from tests.fixtures import synth_transcript
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_courses_table(backend):
+    courses = parse_personal_courses_table(load("courses_table.html"), backend)
+    assert len(courses) == 34
+    assert sum(isinstance(c, Course) for c in courses) == 24
+    assert sum(isinstance(c, ExperimentCourse) for c in courses) == 10
+    # hidevalue 合并的单元格
+    assert courses[1].identifier == courses[0].identifier
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_experiment_courses(backend):
+    courses = parse_personal_courses_table(load("experiment_courses.html"), backend)
+    assert len(courses) == 12
+    assert all(isinstance(c, ExperimentCourse) for c in courses)
+    assert all(c.teacher != "" and c.location != "" for c in courses)
+
+
+def test_personal_courses():
+    info = parse_personal_courses(load("personal_courses.html"))
+    assert [i["value"] for i in info["Sel_XNXQ"]] == [20181, 20180, 20171, 20170]
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_transcript(backend):
+    table = parse_whole_assignment(load("transcript.html"), backend)
+    assert table["学号"] == "20170001"
+    assert table["查询时间"] == "2020-02-20 10:00:00"
+    assert len(table["详细"]) == 60
+    assert all(" " not in v and "\n" not in v for row in table["详细"] for v in row.values())
+
+
+def test_iter_transcript():
+    text = load("transcript.html")
+    rows = list(iter_whole_assignment(text))
+    assert rows == [{"学号": "20170001", **row} for row in parse_whole_assignment(text)["详细"]]
+    assert rows == list(iter_whole_assignment(text, "bs4"))
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_transcript_short_row(backend):
+    text = load("transcript.html")
+    # 去掉第一行课程的最后一个单元格
+    start = text.index("<tr><td>", text.index("<td>时间</td>"))
+    end = text.index("</tr>", start)
+    row = text[start:end]
+    text = text[:start] + row[:row.rindex("<td>")] + text[end:]
+    with pytest.raises((ValueError, IndexError)):
+        parse_whole_assignment(text, backend)
+    with pytest.raises((ValueError, IndexError)):
+        list(iter_whole_assignment(text, backend))
+
+
+def test_synth_scales():
+    text = synth_courses_table(1000, 500)
+    assert len(parse_personal_courses_table(text)) == 1500
+    assert len(parse_whole_assignment(synth_transcript(1000))["详细"]) == 1000
+
+
+def test_make_ical():
+    courses = parse_personal_courses_table(load("courses_table.html"))
+    cal = make_ical(courses, date(2020, 2, 17))
+    weeks = sum(len(c.week_schedule.split(",")) for c in courses)
+    assert len(cal.walk("VEVENT")) == weeks
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_compact_records(backend):
+    text = load("courses_table.html")
+    courses = parse_personal_courses_table(text, backend)
+    records = parse_personal_courses_table(text, backend, compact=True)
+    assert [r.dict() for r in records] == [c.dict() for c in courses]
+    assert [r.to_model() for r in records] == courses
+    assert make_ical(records, date(2020, 2, 17)).to_ical() == make_ical(courses, date(2020, 2, 17)).to_ical()
+
+
+def test_write_ical():
+    courses = parse_personal_courses_table(load("courses_table.html"), compact=True)
+    out = BytesIO()
+    n = write_ical(iter(courses), date(2020, 2, 17), ShaPingBaSchedule(), out)
+    assert out.getvalue() == make_ical(courses, date(2020, 2, 17), ShaPingBaSchedule()).to_ical()
+    assert n == out.getvalue().count(b"BEGIN:VEVENT")
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+from cli_cqu.data.route import parse_whole_assignment
+from cli_cqu.util.gpa import TranscriptTable
+from cli_cqu.util.gpa import parse_grade
+from cli_cqu.util.gpa import transcript_stats
+from tests.fixtures import load
+from tests.fixtures import synth_transcript
+
+
+def row(code, grade, credit="2.0", category="专业", term="2018-2019(1)"):
+    return {"课程编码": code, "成绩": grade, "学分": credit, "类别": category, "时间": term}
+
+
+@pytest.mark.parametrize("score, ex", [(100, 4.0), (90, 4.0), (89.5, 3.7), (60, 1.0), (59, 0.0), (0, 0.0)])
+def test_grade_point(score, ex):
+    assert TranscriptTable().grade_point(score) == ex
+
+
+def test_parse_grade():
+    assert parse_grade("87") == 87.0
+    assert parse_grade("优") == 95.0
+    assert math.isnan(parse_grade("合格"))
+
+
+def test_transcript_stats():
+    stats = transcript_stats({
+        "学号": "1",
+        "详细": [
+            row("a", "95", "4.0"),
+            row("b", "70", "2.0", category="通识"),
+            row("c", "合格", "1.0", term="2018-2019(2)"),
+            row("d", "不及格", "1.0", term="2018-2019(2)"),
+        ]
+    })
+    assert stats["课程数"] == 4
+    assert stats["学分"] == 8.0
+    assert stats["获得学分"] == 7.0
+    assert stats["GPA"] == pytest.approx((4.0 * 4 + 2.0 * 2) / 7)
+    assert stats["加权平均分"] == pytest.approx((95 * 4 + 70 * 2) / 7)
+    assert stats["类别"]["通识"]["GPA"] == 2.0
+    assert stats["学期"]["2018-2019(2)"]["GPA"] == 0.0
+
+
+def test_best_attempt():
+    transcript = {"学号": "1", "详细": [row("a", "50"), row("a", "75"), row("a", "62")]}
+    assert transcript_stats(transcript)["GPA"] == 2.7
+    assert transcript_stats(transcript, best_attempt=False)["课程数"] == 3
+
+
+def naive_gpa(transcript: dict) -> float:
+    best = {}
+    for r in transcript["详细"]:
+        score = parse_grade(r["成绩"])
+        if score == score and (r["课程编码"] not in best or score > best[r["课程编码"]][0]):
+            best[r["课程编码"]] = (score, float(r["学分"]))
+    table = TranscriptTable()
+    weights = sum(credit for _, credit in best.values())
+    return sum(table.grade_point(score) * credit for score, credit in best.values()) / weights
+
+
+def test_summarize_many():
+    transcripts = [parse_whole_assignment(synth_transcript(40, seed=i, student_id=f"2017{i:04}")) for i in range(30)]
+    table = TranscriptTable.from_transcripts(transcripts)
+    by_student = table.summarize("student")
+    assert len(by_student) == 30
+    for t in transcripts:
+        assert by_student[(t["学号"], )]["GPA"] == pytest.approx(naive_gpa(t))
+
+    by_term = table.summarize(("student", "term"))
+    assert sum(v["课程数"] for v in by_term.values()) == len(table)
+    assert table.summarize(())[()]["学分"] == pytest.approx(sum(table.credit))
+
+
+def test_fixture_transcript():
+    stats = transcript_stats(parse_whole_assignment(load("transcript.html")))
+    assert 0 < stats["GPA"] <= 4.0
+    assert stats["获得学分"] <= stats["学分"]
+
+
+def test_unknown_group():
+    with pytest.raises(ValueError):
+        TranscriptTable().summarize("teacher")
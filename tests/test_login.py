@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from cli_cqu.mock import MockConfig
+from cli_cqu.mock import MockServer
+from cli_cqu.util.http import make_session
+from cli_cqu.util.login import DSafeWait
+from cli_cqu.util.login import FormTemplate
+from cli_cqu.util.login import LoginFlow
+from cli_cqu.util.session import is_session_alive
+
+ACCOUNTS = {"20170001": ("jxgl-pass", ""), "20170002": ("jxgl-pass-2", "")}
+
+
+def converge(wait: DSafeWait, threshold: float, rounds: int = 30):
+    for _ in range(rounds):
+        w = wait.next()
+        wait.record(w, w >= threshold)
+
+
+def test_dsafe_wait_converges():
+    wait = DSafeWait(initial=0.68, resolution=0.02)
+    converge(wait, 0.3)
+    assert 0.3 <= wait.good <= 0.32
+    # 服务器收紧了要求
+    converge(wait, 0.9)
+    assert 0.9 <= wait.good <= 0.92
+    wait.record(wait.good, None)
+    assert 0.9 <= wait.good <= 0.92
+
+
+def test_dsafe_wait_one_probe_at_a_time():
+    wait = DSafeWait(initial=0.6, margin=0.05)
+    assert wait.next() == 0.3
+    # 不探测时多等待 margin
+    assert wait.next() == pytest.approx(0.65)
+    wait.record(0.3, None)
+    assert wait.next() == 0.3
+
+
+def test_dsafe_wait_not_adaptive():
+    # 只登录一次时不探测，等待 initial；等待不足时仍然增加
+    wait = DSafeWait(initial=0.6, margin=0.05, resolution=0.1, adaptive=False)
+    assert wait.next() == wait.next() == 0.6
+    wait.record(0.6, False)
+    assert wait.next() == pytest.approx(1.0)
+    wait.adaptive = True
+    assert wait.next() == pytest.approx(0.8)
+
+
+@pytest.fixture
+def server():
+    with MockServer(MockConfig(accounts=ACCOUNTS, dsafeid_wait=0.05)) as server:
+        yield server
+
+
+def login(username: str, password: str, template: FormTemplate, waits: list = None):
+    # 区间小于 resolution，不探测，每次等待 0.06 秒
+    wait = DSafeWait(initial=0.06, resolution=1, margin=0)
+    waits = [] if waits is None else waits
+
+    def sleep(seconds: float):
+        waits.append(seconds)
+        time.sleep(seconds)
+
+    flow = LoginFlow(make_session(), username, password, wait, template, sleep)
+    flow.run()
+    return flow
+
+
+def test_template_shared(server):
+    template = FormTemplate()
+    waits = []
+    first = login("20170001", "jxgl-pass", template, waits)
+    assert is_session_alive(first.session)
+    assert server.stats()["login_forms"] == 1
+    second = login("20170002", "jxgl-pass-2", template, waits)
+    assert is_session_alive(second.session)
+    assert not second.fresh
+    stats = server.stats()
+    assert stats["login_forms"] == 1 and stats["logins"] == 2
+    # 主页 2 次 + 取表单 1 次 + 提交 1 次，之后的登录不再取表单
+    assert stats["requests"] == 4 + 3 + 2
+    assert len(waits) == 2
+
+
+def test_stale_template(server):
+    template = FormTemplate()
+    login("20170001", "jxgl-pass", template)
+    server.rotate_viewstate()
+    flow = login("20170002", "jxgl-pass-2", template)
+    assert is_session_alive(flow.session)
+    stats = server.stats()
+    # 过期的表单换成返回页面中的新表单，不再单独获取
+    assert stats["stale_forms"] == 1 and stats["login_forms"] == 1 and stats["logins"] == 2
+    assert template.get() == flow.fields
+
+
+def test_wrong_password_keeps_template(server):
+    template = FormTemplate()
+    login("20170001", "jxgl-pass", template)
+    fields = template.get()
+    with pytest.raises(ValueError, match="账号或密码错误"):
+        login("20170002", "wrong", template)
+    assert template.get() is fields
+    assert server.stats()["stale_forms"] == 0
+
+
+def test_dsafe_retry():
+    # 等待不足时服务器重新下发 DSafeId，随后增加等待
+    with MockServer(MockConfig(accounts=ACCOUNTS, dsafeid_wait=0.3)):
+        wait = DSafeWait(initial=0.1, ceiling=0.6, resolution=10, margin=0)
+        flow = LoginFlow(make_session(), "20170001", "jxgl-pass", wait, FormTemplate())
+        flow.run()
+        assert is_session_alive(flow.session)
+        assert flow.dsafe_rounds == 2
+        assert (wait.bad, wait.good) == (0.1, 0.6)
+        flow = LoginFlow(make_session(), "20170001", "jxgl-pass", DSafeWait(initial=0.0, ceiling=0.0), FormTemplate())
+        with pytest.raises(ValueError, match="DSafeId"):
+            flow.run()
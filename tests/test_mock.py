@@ -0,0 +1,91 @@
+import pytest
+
+from cli_cqu.app import App
+from cli_cqu.data import HOST
+from cli_cqu.data.route import Parsed
+from cli_cqu.mock import MockConfig
+from cli_cqu.mock import MockServer
+from cli_cqu.util.http import make_adapter
+from cli_cqu.util.http import make_session
+from cli_cqu.util.scheduler import HOST_OVERRIDES
+from cli_cqu.util.scheduler import RequestScheduler
+from cli_cqu.util.scheduler import override_hosts
+from cli_cqu.util.session import is_session_alive
+
+ACCOUNTS = {"20170001": ("jxgl-pass", "oldjw-pass")}
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockServer(MockConfig(accounts=ACCOUNTS, dsafeid_wait=0.1, courses=6, experiments=2)) as server:
+        yield server
+
+
+def test_overrides_restored():
+    with MockServer() as server:
+        assert HOST_OVERRIDES[HOST.DOMAIN] == server.address
+    assert HOST.DOMAIN not in HOST_OVERRIDES
+
+
+def test_override_hosts_warns(monkeypatch, capsys):
+    monkeypatch.setattr("cli_cqu.util.scheduler.HOST_OVERRIDES", {})
+    from cli_cqu.util import scheduler
+    override_hosts(f"{HOST.DOMAIN}=127.0.0.1:1, ")
+    assert scheduler.HOST_OVERRIDES == {HOST.DOMAIN: "127.0.0.1:1"}
+    assert HOST.DOMAIN in capsys.readouterr().err
+
+
+def test_login_and_courses(server):
+    app = App("20170001", "jxgl-pass")
+    assert is_session_alive(app.session)
+    tables = app.courses_by_semester("0-1")
+    assert list(tables) == ["2018-2019学年第二学期", "2018-2019学年第一学期"]
+    assert all(len(t) == 8 for t in tables.values())
+
+
+def test_pages_are_stable(server):
+    a = App("20170001", "jxgl-pass")
+    b = App("20170001", "jxgl-pass")
+    param = {"Sel_XNXQ": 20181, "px": 0, "rad": "on"}
+    courses = Parsed.TeachingArrangement.personal_courses_table(a.session, param)
+    assert courses == Parsed.TeachingArrangement.personal_courses_table(b.session, param)
+
+
+def test_unknown_campus(server, monkeypatch, capsys):
+    app = App("20170001", "jxgl-pass")
+    # 输错的校区重新询问
+    answers = iter(["火星", "1", "0"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    app.mainloop("courses-conflicts")
+    assert "未知的校区 火星" in capsys.readouterr().out
+    # 参数给出的校区不存在时提示，不退出
+    app.mainloop("courses-conflicts", campus="火星", semesters="0")
+    assert "未知的校区 火星" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("username, password, message", [
+    ("20170001", "wrong", "账号或密码错误"),
+    ("20179999", "jxgl-pass", "不存在该账号"),
+])
+def test_login_failures(server, username, password, message):
+    with pytest.raises(ValueError, match=message):
+        App(username, password)
+
+
+def test_session_not_alive_before_login(server):
+    assert not is_session_alive(make_session())
+
+
+def test_oldjw(server):
+    table = Parsed.Assignment.whole_assignment("20170001", "oldjw-pass")
+    assert table["学号"] == "20170001"
+    assert len(table["详细"]) == 60
+    with pytest.raises(ValueError):
+        Parsed.Assignment.whole_assignment("20170001", "jxgl-pass")
+
+
+def test_error_injection():
+    with MockServer(MockConfig(error_rate=1.0)) as server:
+        s = make_session(make_adapter(scheduler=RequestScheduler(retries=1, backoff=0.01)))
+        assert s.get(f"{HOST.PREFIX}/home.aspx").status_code == 500
+        assert server.stats()["errors_injected"] == 2
@@ -0,0 +1,43 @@
+import pytest
+
+from cli_cqu.data.route import parse_personal_courses_table
+
+TABLE = """<html><body>
+<table>
+<thead><tr>{head}</tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+</body></html>"""
+
+COURSE_ROWS = """
+<tr><td>1</td><td>[10001]高等数学</td><td>5.0</td><td>80</td><td>80</td><td>0</td><td>必修</td><td>讲授</td><td>考试</td><td>张三</td><td>1-16</td><td>一[1-2节]</td><td>D1234</td></tr>
+<tr><td>2</td><td hidevalue="[10001]高等数学"></td><td hidevalue="5.0"></td><td hidevalue="80"></td><td hidevalue="80"></td><td hidevalue="0"></td><td hidevalue="必修"></td><td hidevalue="讲授"></td><td hidevalue="考试"></td><td hidevalue="张三"></td><td>1-9,11-16</td><td>三[3-4节]</td><td>D1234</td></tr>
+"""
+
+EXPERIMENT_ROWS = """
+<tr><td>1</td><td>[20001]大学物理实验</td><td>1.0</td><td>32</td><td>0</td><td>32</td><td>示波器的使用</td><td>李四</td><td>王五</td><td>3</td><td>五[5-8节]</td><td>物理实验室</td></tr>
+<tr><td>2</td><td hidevalue="[20001]大学物理实验"></td><td hidevalue="1.0"></td><td hidevalue="32"></td><td hidevalue="0"></td><td hidevalue="32"></td><td>牛顿环</td><td hidevalue="李四"></td><td hidevalue="王五"></td><td>5</td><td>五[5-8节]</td><td hidevalue="物理实验室"></td></tr>
+"""
+
+
+def page(width: int, rows: str) -> str:
+    return TABLE.format(head="<td>x</td>" * width, rows=rows)
+
+
+@pytest.mark.parametrize("text", [
+    page(13, COURSE_ROWS),
+    page(12, EXPERIMENT_ROWS),
+    page(13, COURSE_ROWS) + page(12, EXPERIMENT_ROWS),
+    page(3, COURSE_ROWS + EXPERIMENT_ROWS),
+])
+def test_backends_agree(text):
+    expected = parse_personal_courses_table(text, "bs4")
+    assert expected
+    assert parse_personal_courses_table(text, "lxml") == expected
+
+
+def test_unknown_layout():
+    with pytest.raises(ValueError):
+        parse_personal_courses_table(page(3, "<tr><td>1</td><td>2</td></tr>"), "lxml")
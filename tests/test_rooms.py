@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from cli_cqu.model import CourseRecord
+from cli_cqu.model import ExperimentCourseRecord
+from cli_cqu.model import record_from_dict
+from cli_cqu.util.datetime import parse_weeks
+from cli_cqu.util.ndjson import one_semester
+from cli_cqu.util.ndjson import read_records
+from cli_cqu.util.rooms import RoomIndex
+from cli_cqu.util.rooms import building_of
+from cli_cqu.util.rooms import parse_day
+
+
+def course(week: str, lesson: str, location: str) -> CourseRecord:
+    return CourseRecord("CST00001高等数学", 4.0, 64.0, 64.0, 0.0, "必修", "讲授", "考试", "张三", week, lesson,
+                        location)
+
+
+@pytest.mark.parametrize("tw, ex", [("1", (1, )), ("1-3,5", (1, 2, 3, 5)), ("3-4, 1-2", (1, 2, 3, 4))])
+def test_parse_weeks(tw, ex):
+    assert parse_weeks(tw) == ex
+
+
+@pytest.mark.parametrize("tw", ["", "1-", "一"])
+def test_parse_weeks_invalid(tw):
+    with pytest.raises(ValueError):
+        parse_weeks(tw)
+
+
+@pytest.mark.parametrize("room, ex", [("D1204", "D"), ("DYC301", "DYC"), ("实验楼", "实验楼")])
+def test_building_of(room, ex):
+    assert building_of(room) == ex
+
+
+@pytest.mark.parametrize("day, ex", [("一", 0), ("日", 6), ("2", 1), (7, 6)])
+def test_parse_day(day, ex):
+    assert parse_day(day) == ex
+
+
+def test_free_rooms():
+    index = RoomIndex().add_all([
+        course("1-8", "二[3-4节]", "D1204"),
+        course("7", "二[1-2节]", "D1205"),
+        course("1-16", "三[13-14节]", "DYC301"),
+        course("1", "一[1-2节]", ""),
+    ])
+    assert len(index) == 3
+    assert index.buildings() == ["D", "DYC"]
+    assert index.free_rooms(7, "二", "3-4") == ["D1205", "DYC301"]
+    assert index.free_rooms(9, "二", "3-4", building="D") == ["D1204", "D1205"]
+    assert index.free_rooms(7, 2, "2-3", building="D") == []
+    assert index.free_rooms(3, "三", 12) == ["D1204", "D1205"]
+    assert index.is_free("D1204", 7, "二", (5, 5))
+    assert index.busy("D1205", 7) == [(1, 1), (1, 2)]
+
+
+def test_unscheduled():
+    index = RoomIndex().add_all([
+        course("", "", "线上"),
+        course("1-16", "", "D1204"),
+        course("", "一[1-2节]", "D1205"),
+        course("1", "一[1-2节]", "D1206"),
+    ])
+    assert list(index.rooms) == ["D1206"]
+
+
+def test_invalid_query():
+    with pytest.raises(ValueError):
+        RoomIndex().free_rooms(1, "八", "1-2")
+    with pytest.raises(ValueError):
+        RoomIndex().free_rooms(1, "一", "4-3")
+
+
+def test_save_load(tmp_path):
+    index = RoomIndex().add_all([course("1-16", "五[5-6节]", "A101")])
+    index.save(tmp_path / "rooms.json")
+    loaded = RoomIndex.load(tmp_path / "rooms.json")
+    assert loaded.rooms == index.rooms
+    assert loaded.free_rooms(3, "五", "6", building="A") == []
+    assert len(RoomIndex.load(tmp_path / "missing.json")) == 0
+
+
+def test_read_records(tmp_path):
+    c = course("1", "一[1-2节]", "D1204").dict()
+    e = ExperimentCourseRecord("CST00002物理实验", 1.0, 16.0, 0.0, 16.0, "光学", "李四", "王五", "2", "二[5-8节]",
+                               "实验楼").dict()
+    (tmp_path / "a.json").write_text(json.dumps({"2020-2021学年第一学期": [c, e]}), encoding="utf-8")
+    (tmp_path / "b.ndjson").write_text(json.dumps(c) + "\n\n", encoding="utf-8")
+    records = list(read_records(tmp_path / "a.json"))
+    assert records[0]["semester"] == "2020-2021学年第一学期"
+    assert [type(record_from_dict(r)) for r in records] == [CourseRecord, ExperimentCourseRecord]
+    assert [record_from_dict(r) for r in read_records(tmp_path / "b.ndjson")] == [CourseRecord(**c)]
+
+
+def test_one_semester():
+    first, second = "2019-2020学年第一学期", "2019-2020学年第二学期"
+    records = [{"semester": first, "n": 1}, {"n": 2}, {"semester": second, "n": 3}, {"semester": first, "n": 4}]
+    assert [r["n"] for r in one_semester(records, second)] == [2, 3]
+    seen = set()
+    assert [r["n"] for r in one_semester(records[:2], None, seen)] == [1, 2]
+    # 另一个文件中的其他学期
+    with pytest.raises(ValueError, match="多个学期"):
+        list(one_semester(records[2:], None, seen))
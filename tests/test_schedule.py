@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from cli_cqu.data.schedule import ArraySchedule
+from cli_cqu.data.schedule import HuxiSchedule
+from cli_cqu.data.schedule import ShaPingBaSchedule
+from cli_cqu.data.schedule import available_schedules
+from cli_cqu.data.schedule import find_schedule
+from cli_cqu.util.datetime import lesson_minutes
+from cli_cqu.util.datetime import lesson_offset
+
+
+@pytest.mark.parametrize("schedule, index, ex", [
+    (HuxiSchedule(), 1, (timedelta(hours=8, minutes=30), timedelta(hours=9, minutes=15))),
+    (HuxiSchedule(), 12, (timedelta(hours=21, minutes=35), timedelta(hours=23, minutes=59))),
+    (HuxiSchedule(), 14, (timedelta(hours=8, minutes=30), timedelta(hours=23, minutes=59))),
+    (ShaPingBaSchedule(), 5, (timedelta(hours=14, minutes=30), timedelta(hours=15, minutes=15))),
+    (ShaPingBaSchedule(), 13, (timedelta(hours=8), timedelta(hours=23, minutes=59))),
+    (ShaPingBaSchedule(), 0, (timedelta(hours=8), timedelta(hours=23, minutes=59))),
+])
+def test_builtin(schedule, index, ex):
+    assert schedule[index] == ex
+
+
+def test_get_default():
+    default = (timedelta(0), timedelta(1))
+    assert ShaPingBaSchedule().get(20, default) == default
+
+
+def test_get_on_class():
+    assert HuxiSchedule.get(1) == HuxiSchedule()[1]
+    assert ShaPingBaSchedule.get(20) == ShaPingBaSchedule()[13]
+    assert ShaPingBaSchedule.get(20, (timedelta(0), timedelta(1))) == (timedelta(0), timedelta(1))
+
+
+@pytest.mark.parametrize("campus, ex", [("0", "沙坪坝"), ("1", "虎溪"), ("虎溪", "虎溪"), ("huxi", "虎溪"), (" 沙坪坝校区 ", "沙坪坝")])
+def test_find_schedule(campus, ex):
+    assert find_schedule(campus, available_schedules("/nonexistent")).name == ex
+
+
+def test_find_schedule_unknown():
+    with pytest.raises(ValueError):
+        find_schedule("2", available_schedules("/nonexistent"))
+
+
+def test_user_schedules(tmp_path):
+    path = tmp_path / "schedules.json"
+    summer = {"name": "虎溪", "lessons": [["07:50", "08:35"], ["08:45", "09:30"]]}
+    extra = {"name": "两江", "aliases": ["lj"], "lessons": [["09:00", "09:45"]], "full_day": ["09:00", "22:00"]}
+    path.write_text(json.dumps([summer, extra]), encoding="utf-8")
+    schedules = available_schedules(path)
+    assert [s.name for s in schedules] == ["沙坪坝", "虎溪", "两江"]
+    assert len(find_schedule("1", schedules)) == 2
+    assert find_schedule("lj", schedules)[14] == (timedelta(hours=9), timedelta(hours=22))
+
+
+class DictSchedule:
+    "只实现 __getitem__ 的作息时间"
+    def __init__(self, schedule: ArraySchedule):
+        self.schedule = schedule
+
+    def __getitem__(self, index):
+        return self.schedule[index]
+
+
+@pytest.mark.parametrize("lesson", ["一[1-2节]", "三[9-12节]", "日[14节]", "五[11-13节]"])
+def test_lesson_minutes(lesson):
+    schedule = HuxiSchedule()
+    a, b = lesson_minutes(lesson, schedule)
+    assert (timedelta(minutes=a), timedelta(minutes=b)) == lesson_offset(lesson, schedule)
+    assert lesson_offset(lesson, schedule) == lesson_offset(lesson, DictSchedule(schedule))
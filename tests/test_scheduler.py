@@ -0,0 +1,103 @@
+import time
+
+import pytest
+from requests import Response
+from requests.exceptions import ConnectTimeout
+from requests.exceptions import ConnectionError
+from requests.exceptions import ReadTimeout
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+
+from cli_cqu.util.scheduler import RequestScheduler
+from cli_cqu.util.scheduler import TokenBucket
+
+
+def response(status: int) -> Response:
+    resp = Response()
+    resp.status_code = status
+    return resp
+
+
+def flaky(*outcomes):
+    "依次返回（或抛出）outcomes 中的结果"
+    outcomes = list(outcomes)
+
+    def send():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return response(outcome)
+
+    return send
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=5)
+    t0 = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # 5 个突发令牌之后，剩下 10 个以 100/s 的速率发放
+    assert time.monotonic() - t0 >= 0.09
+
+
+def test_retry_5xx():
+    scheduler = RequestScheduler(retries=3, backoff=0)
+    resp = scheduler.run("jxgl.cqu.edu.cn", flaky(502, 503, 200))
+    assert resp.status_code == 200
+    assert scheduler.stats()["retries"] == 2
+    assert scheduler.stats()["requests"] == 3
+
+
+def test_retry_connection_error():
+    scheduler = RequestScheduler(retries=1, backoff=0)
+    assert scheduler.run("jxgl.cqu.edu.cn", flaky(ConnectionError(), 200)).status_code == 200
+    with pytest.raises(ConnectionError):
+        scheduler.run("jxgl.cqu.edu.cn", flaky(ConnectionError(), ConnectionError()))
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_no_retry_4xx():
+    scheduler = RequestScheduler(retries=3, backoff=0)
+    assert scheduler.run("jxgl.cqu.edu.cn", flaky(404)).status_code == 404
+    assert scheduler.stats()["retries"] == 0
+
+
+def test_give_up_5xx():
+    scheduler = RequestScheduler(retries=2, backoff=0)
+    assert scheduler.run("jxgl.cqu.edu.cn", flaky(500, 500, 500)).status_code == 500
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_queued_seconds():
+    scheduler = RequestScheduler(rates={"oldjw.cqu.edu.cn": (50, 1)}, backoff=0)
+    for _ in range(3):
+        scheduler.run("oldjw.cqu.edu.cn", flaky(200))
+    assert scheduler.stats()["queued_seconds"] >= 0.03
+
+
+def test_set_rate():
+    scheduler = RequestScheduler(rates={"a": (1, 1)}, backoff=0)
+    scheduler.run("a", flaky(200))
+    # 已经创建的令牌桶随之重建，不再按每秒 1 个请求等待
+    scheduler.set_rate("a", (1000, 10))
+    t0 = time.monotonic()
+    for _ in range(3):
+        scheduler.run("a", flaky(200))
+    assert time.monotonic() - t0 < 0.5
+    scheduler.set_rate("a", None)
+    assert "a" not in scheduler.rates
+
+
+def test_post_retries_only_connect_errors():
+    scheduler = RequestScheduler(retries=3, backoff=0)
+    # 服务器可能已经处理了请求，不重复提交
+    assert scheduler.run("jxgl.cqu.edu.cn", flaky(502, 200), "POST").status_code == 502
+    with pytest.raises(ReadTimeout):
+        scheduler.run("jxgl.cqu.edu.cn", flaky(ReadTimeout(), 200), "POST")
+    with pytest.raises(ConnectionError):
+        scheduler.run("jxgl.cqu.edu.cn", flaky(ConnectionError("Connection aborted."), 200), "POST")
+    assert scheduler.stats()["retries"] == 0 and scheduler.stats()["failures"] == 3
+    # 连接阶段的失败说明请求还没有发出，可以重试
+    refused = ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+    assert scheduler.run("jxgl.cqu.edu.cn", flaky(ConnectTimeout(), refused, 200), "POST").status_code == 200
+    assert scheduler.stats()["retries"] == 2
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import cli_cqu
+from cli_cqu.model import CourseRecord
+from cli_cqu.model import ExperimentCourseRecord
+from cli_cqu.util.search import CourseIndex
+
+
+def course(name: str, teacher: str, location: str, week: str = "1-16", classifier: str = "必修") -> CourseRecord:
+    return CourseRecord(name, 2.0, 32.0, 32.0, 0.0, classifier, "讲授", "考试", teacher, week, "一[1-2节]", location)
+
+
+MATH_A = course("CST00001高等数学", "张三", "D1204")
+MATH_B = course("CST00001高等数学", "李四", "D1205")
+PE = course("PE0001体育", "张三", "风雨操场", week="1-8", classifier="选修")
+LAB = ExperimentCourseRecord("PHY001物理实验", 1.0, 16.0, 0.0, 16.0, "光学", "王五", "赵六", "9", "二[5-8节]", "D1204")
+
+
+@pytest.fixture
+def index():
+    index = CourseIndex()
+    index.add("1", [MATH_A, PE])
+    index.add("2", [MATH_A, LAB])
+    index.add("3", [MATH_B, PE])
+    return index
+
+
+def test_query(index):
+    assert len(index) == 4
+    assert index.query(teacher="张三") == [MATH_A, PE]
+    assert index.query(teacher="张三", classifier="选修") == [PE]
+    assert index.query(location="D1204") == [MATH_A, LAB]
+    assert index.query(location="D1204", week=9) == [MATH_A, LAB]
+    assert index.query(teacher="张三", week=9) == [MATH_A]
+    assert index.query(teacher="nobody") == []
+    assert index.students(identifier="CST00001高等数学") == ["1", "2", "3"]
+    assert index.students(teacher="王五") == ["2"]
+    assert index.values("classifier") == ["必修", "选修"]
+
+
+def test_unknown_field(index):
+    with pytest.raises(ValueError):
+        index.query(hosting_teacher="赵六")
+
+
+def test_incremental(index):
+    assert index.remove("2")
+    assert not index.remove("2")
+    assert index.query(location="D1204") == [MATH_A]
+    assert "王五" not in index.postings["teacher"]
+    index.add("1", [MATH_B])
+    assert index.students(teacher="张三") == ["3"]
+    assert index.query(teacher="张三") == [PE]
+    index.add("4", [LAB])
+    assert index.query(teacher="王五") == [LAB]
+    assert index.stats() == {"students": 3, "sections": 3, "teacher": 3, "identifier": 3, "classifier": 2, "location": 3}
+
+
+def test_unscheduled(index):
+    online = course("MOOC001网络课程", "张三", "线上", week="")
+    index.add("4", [online])
+    assert index.query(teacher="张三") == [MATH_A, PE, online]
+    assert index.query(teacher="张三", week=3) == [MATH_A, PE]
+    assert index.students(week=9) == ["1", "2", "3"]
+
+
+def test_save_load(index, tmp_path):
+    index.remove("1")
+    index.save(tmp_path / "index.json")
+    loaded = CourseIndex.load(tmp_path / "index.json")
+    assert loaded.stats() == index.stats()
+    assert loaded.query(teacher="张三") == index.query(teacher="张三")
+    assert loaded.students(location="D1204") == ["2"]
+    assert len(CourseIndex.load(tmp_path / "missing.json")) == 0
+
+
+def test_cli_semester(tmp_path, monkeypatch, capsys):
+    tables = {"2019-2020学年第一学期": [MATH_A.dict()], "2019-2020学年第二学期": [PE.dict()]}
+    (tmp_path / "1.json").write_text(json.dumps(tables, ensure_ascii=False), encoding="utf-8")
+    argv = ["cli-cqu", "search", "--course-index", str(tmp_path / "index.json"), "--add", str(tmp_path / "1.json")]
+    # 文件中有两个学期，不给出 --semester 时拒绝加入
+    monkeypatch.setattr("sys.argv", argv)
+    with pytest.raises(SystemExit):
+        cli_cqu.cli_main()
+    assert "多个学期" in capsys.readouterr().err
+    monkeypatch.setattr("sys.argv", argv + ["--semester", "2019-2020学年第二学期", "--teacher", "张三"])
+    cli_cqu.cli_main()
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [PE.dict()]
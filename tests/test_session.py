@@ -0,0 +1,47 @@
+import json
+
+from cli_cqu.data.js_equality import chkpwd
+from cli_cqu.util.session import SessionStore
+
+COOKIES = {"DSafeId": "ABC123", "ASP.NET_SessionId": "abc123", "_D_SID": "DEF456", "other": "x"}
+
+
+def test_save_and_load(tmp_path):
+    store = SessionStore(tmp_path / "sessions.json")
+    store.save("20170000", "123456", COOKIES)
+    assert store.load("20170000", "123456") == {"DSafeId": "ABC123", "ASP.NET_SessionId": "abc123", "_D_SID": "DEF456"}
+    assert store.load("20170001", "123456") is None
+
+
+def test_wrong_password(tmp_path):
+    store = SessionStore(tmp_path / "sessions.json")
+    store.save("20170000", "123456", COOKIES)
+    assert store.load("20170000", "654321") is None
+
+
+def test_expired(tmp_path):
+    store = SessionStore(tmp_path / "sessions.json", ttl=-1)
+    store.save("20170000", "123456", COOKIES)
+    assert store.load("20170000", "123456") is None
+
+
+def test_discard(tmp_path):
+    store = SessionStore(tmp_path / "sessions.json")
+    store.save("20170000", "123456", COOKIES)
+    store.discard("20170000")
+    assert store.load("20170000", "123456") is None
+
+
+def test_salted_fingerprint(tmp_path):
+    path = tmp_path / "sessions.json"
+    SessionStore(path).save("20170000", "123456", COOKIES)
+    SessionStore(path).save("20170001", "123456", COOKIES)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    # 文件中没有可以直接用于登录的 chkpwd 结果，相同的密码得到不同的摘要
+    assert chkpwd("20170000", "123456") not in path.read_text(encoding="utf-8")
+    assert data["20170000"]["salt"] != data["20170001"]["salt"]
+    assert data["20170000"]["fingerprint"] != data["20170001"]["fingerprint"]
+    # 另一个进程中也能验证
+    store = SessionStore(path)
+    assert store.load("20170000", "654321") is None
+    assert store.load("20170000", "123456") is not None
@@ -0,0 +1,76 @@
+import pytest
+
+from cli_cqu.model import Course
+from cli_cqu.model import CourseRecord
+from cli_cqu.model import ExperimentCourse
+from cli_cqu.model import ExperimentCourseRecord
+from cli_cqu.util.snapshot import Snapshot
+from cli_cqu.util.snapshot import write_snapshot
+
+MATH = CourseRecord("CST00001高等数学", 5.0, 80.0, 80.0, 0.0, "必修", "讲授", "考试", "张三", "1-16", "一[1-2节]", "D1204")
+PE = Course(identifier="PE0001体育", score=1, time_total=32, time_teach=32, time_practice=0, classifier="选修",
+            teach_type="讲授", exam_type="考查", teacher="李四", week_schedule="1-8", day_schedule="三[3-4节]",
+            location="风雨操场")
+LAB = ExperimentCourseRecord("PHY001物理实验", 1.0, 16.0, 0.0, 16.0, "光学", "王五", "赵六", "9", "二[5-8节]", "D1204")
+FIRST = "2019-2020学年第一学期"
+SECOND = "2019-2020学年第二学期"
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "cohort.snap"
+    write_snapshot(path, [
+        ("2", FIRST, [MATH, LAB]),
+        ("1", SECOND, [PE]),
+        ("1", FIRST, [MATH, PE.dict(), LAB.to_model()]),
+        ("3", FIRST, []),
+        ("2", FIRST, [MATH, PE]),
+    ])
+    return path
+
+
+def test_round_trip(path):
+    with Snapshot.open(path) as snap:
+        table = snap["1", FIRST]
+        assert [c.dict() for c in table] == [MATH.dict(), PE.dict(), LAB.dict()]
+        assert isinstance(table[1], Course) and isinstance(table[2], ExperimentCourse)
+        assert table[-1] == LAB.to_model()
+        assert table[1:] == [PE, LAB.to_model()]
+        assert list(table.records()) == [MATH, CourseRecord.from_model(PE), LAB]
+        # 后出现的同一份课表替换之前的
+        assert list(snap["2", FIRST].records()) == [MATH, CourseRecord.from_model(PE)]
+        assert len(snap["3", FIRST]) == 0
+
+
+def test_directory(path):
+    with Snapshot.open(path) as snap:
+        assert list(snap) == [("1", FIRST), ("1", SECOND), ("2", FIRST), ("3", FIRST)]
+        assert snap.students() == ["1", "2", "3"]
+        assert snap.semesters("1") == [FIRST, SECOND]
+        assert snap.semesters("0") == snap.semesters("4") == []
+        assert ("2", SECOND) not in snap and ("3", FIRST) in snap
+        assert snap.get("2", SECOND) is None
+        with pytest.raises(KeyError):
+            snap["1", ""]
+
+
+def test_interned(path):
+    with Snapshot.open(path) as snap:
+        # 相同的课程行只保存一次
+        assert snap.stats() == {"tables": 4, "students": 3, "rows": 3, "strings": 27}
+        assert snap["1", FIRST].rows()[0] == snap["2", FIRST].rows()[0]
+
+
+def test_buffer(path):
+    snap = Snapshot(path.read_bytes())
+    assert [c.teacher for c in snap["1", FIRST]] == ["张三", "李四", "王五"]
+    with pytest.raises(ValueError):
+        Snapshot(b"not a snapshot" * 4)
+
+
+def test_closed(path):
+    snap = Snapshot.open(path)
+    table = snap["1", FIRST]
+    snap.close()
+    with pytest.raises(ValueError):
+        table[0]
@@ -0,0 +1,64 @@
+"""启动耗时：在子进程中检查导入 cli_cqu、执行轻量指令时加载了哪些模块
+
+只检查模块是否被加载，不比较耗时，以免在较慢的机器上误报
+"""
+import json
+import subprocess
+import sys
+
+HEAVY = ("requests", "bs4", "lxml", "icalendar", "pydantic")
+
+
+def importtime(code: str) -> dict:
+    "运行 code，返回 {模块名: 累计导入耗时（微秒）}"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True,
+                          check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def loaded_modules(code: str) -> set:
+    "运行 code，返回之后 sys.modules 中的模块名"
+    proc = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True)
+    return set(json.loads(proc.stdout.splitlines()[-1]))
+
+
+def test_import_is_light():
+    modules = importtime("import cli_cqu")
+    assert "cli_cqu" in modules
+    assert not [m for m in modules if m.split(".")[0] in HEAVY]
+
+
+def test_version_is_light():
+    modules = importtime("import sys; sys.argv = ['cli-cqu', '--version']\n"
+                         "import cli_cqu\n"
+                         "try:\n    cli_cqu.cli_main()\nexcept SystemExit:\n    pass")
+    assert not [m for m in modules if m.split(".")[0] in HEAVY]
+
+
+def test_help_is_light():
+    modules = loaded_modules("import sys; sys.argv = ['cli-cqu', 'help']\n"
+                             "import cli_cqu\n"
+                             "cli_cqu.cli_main()")
+    assert "cli_cqu.help" in modules
+    for name in ("requests", "bs4", "lxml", "cli_cqu.app"):
+        assert name not in modules
+
+
+def test_assignments_skip_icalendar():
+    modules = importtime("import cli_cqu.app")
+    assert "requests" in modules
+    assert "icalendar" not in modules
@@ -0,0 +1,135 @@
+from io import BytesIO
+
+import pytest
+from lxml import html as lhtml
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from cli_cqu.data.parser import iter_courses_rows
+from cli_cqu.data.parser import iter_courses_tree
+from cli_cqu.data.parser import iter_transcript
+from cli_cqu.data.parser import iter_transcript_rows
+from cli_cqu.data.parser import parse_courses_table
+from cli_cqu.data.parser import parse_transcript
+from cli_cqu.data.parser import parse_transcript_tree
+from cli_cqu.data.route import iter_personal_courses_response
+from cli_cqu.util.stream import iter_elements
+from cli_cqu.util.stream import parse_html
+from cli_cqu.util.stream import read_text
+from cli_cqu.util.stream import response_encoding
+from tests.fixtures import load
+from tests.fixtures import synth_courses_table
+from tests.fixtures import synth_transcript
+
+
+def response(body: bytes, content_type: str = "text/html") -> Response:
+    resp = Response()
+    resp.status_code = 200
+    resp.headers = CaseInsensitiveDict({"Content-Type": content_type})
+    resp.raw = BytesIO(body)
+    return resp
+
+
+@pytest.mark.parametrize("content_type, ex", [
+    ("text/html", "gbk"),
+    ("text/html; charset=utf-8", "utf-8"),
+    ("text/html; charset=GB2312", "gbk"),
+    ('text/html; charset="gb18030"', "gb18030"),
+])
+def test_response_encoding(content_type, ex):
+    assert response_encoding(response(b"", content_type), "gbk") == ex
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_read_text_across_chunks(chunk_size):
+    text = "学年学期：2019-2020学年第一学期 綦"
+    resp = response(text.encode("gbk"))
+    assert read_text(resp, "gbk", chunk_size) == text
+
+
+def test_read_text_replaces_invalid_bytes():
+    assert read_text(response(b"ab\xff"), "gbk") == "ab�"
+
+
+@pytest.mark.parametrize("chunk_size", [7, 65536])
+def test_parse_html_courses(chunk_size):
+    text = synth_courses_table(30, 5)
+    root = parse_html(response(text.encode("gbk")), "gbk", chunk_size)
+    assert list(iter_courses_tree(root)) == parse_courses_table(text)
+
+
+def test_parse_html_transcript():
+    text = load("transcript.html")
+    root = parse_html(response(text.encode("gbk"), "text/html; charset=gb2312"), "gbk", 100)
+    assert parse_transcript_tree(root) == parse_transcript(text)
+    text = synth_transcript(200)
+    root = parse_html(response(text.encode("gbk")), "gbk")
+    assert parse_transcript_tree(root) == parse_transcript(text)
+
+
+def test_parse_html_empty():
+    assert parse_html(response(b"  \r\n"), "gbk") is None
+    assert list(iter_personal_courses_response(response(b""))) == []
+
+
+@pytest.mark.parametrize("backend", ["lxml", "bs4"])
+def test_courses_response_backends(backend):
+    text = load("courses_table.html")
+    rows = list(iter_personal_courses_response(response(text.encode("gbk")), backend, compact=True))
+    assert rows == parse_courses_table(text, compact=True)
+
+
+def test_matches_document_fromstring():
+    text = load("personal_courses.html")
+    root = parse_html(response(text.encode("gbk")), "gbk", 16)
+    assert lhtml.tostring(root) == lhtml.tostring(lhtml.document_fromstring(text))
+
+
+@pytest.mark.parametrize("name", ["courses_table.html", "experiment_courses.html"])
+@pytest.mark.parametrize("chunk_size", [7, 65536])
+def test_iter_courses_rows(name, chunk_size):
+    text = load(name)
+    rows = iter_courses_rows(iter_elements(response(text.encode("gbk")), "gbk", "tr", chunk_size), compact=True)
+    assert list(rows) == parse_courses_table(text, compact=True)
+
+
+def test_iter_courses_rows_incremental():
+    text = synth_courses_table(300, 20)
+    body = text.encode("gbk")
+    resp = response(body)
+    trs = []
+
+    def elements():
+        for tr in iter_elements(resp, "gbk", "tr", 1024):
+            trs.append(tr)
+            yield tr
+
+    rows = iter_courses_rows(elements())
+    assert next(rows) == parse_courses_table(text)[0]
+    # 第一行产出时响应体还没有读完
+    assert resp.raw.tell() < len(body)
+    assert [next(rows)] + list(rows) == parse_courses_table(text)[1:]
+    # 处理完的行已经从树中删除
+    tbody = trs[-1].getparent()
+    assert len(tbody) == 1 and len(trs[-1]) == 0
+
+
+@pytest.mark.parametrize("chunk_size", [100, 65536])
+def test_iter_transcript_rows(chunk_size):
+    for text in (load("transcript.html"), synth_transcript(200)):
+        trs = iter_elements(response(text.encode("gbk")), "gbk", "tr", chunk_size)
+        assert list(iter_transcript_rows(trs)) == list(iter_transcript(text))
+    assert list(iter_transcript_rows(iter_elements(response(b""), "gbk", "tr"))) == []
+
+
+def test_iter_transcript_rows_short_row():
+    text = load("transcript.html")
+    # 去掉第二行课程的最后一个单元格，之前的一行照常产出
+    start = text.index("<tr><td>", text.index("<tr><td>", text.index("<td>时间</td>")) + 1)
+    end = text.index("</tr>", start)
+    row = text[start:end]
+    text = text[:start] + row[:row.rindex("<td>")] + text[end:]
+    rows = iter_transcript_rows(iter_elements(response(text.encode("utf-8")), "utf-8", "tr"))
+    assert next(rows)["学号"] == "20170001"
+    with pytest.raises(ValueError):
+        next(rows)
@@ -0,0 +1,71 @@
+from datetime import date
+from io import BytesIO
+
+from icalendar import Calendar
+
+from cli_cqu.data.route import parse_personal_courses_table
+from cli_cqu.data.schedule import ShaPingBaSchedule
+from cli_cqu.model import CourseRecord
+from cli_cqu.util.calendar import make_ical
+from cli_cqu.util.sync import sync_ical
+from tests.fixtures import load
+
+START = date(2020, 2, 17)
+
+
+def sync(courses, snapshot):
+    out = BytesIO()
+    counts = sync_ical(courses, START, ShaPingBaSchedule(), snapshot, out)
+    events = {str(ev["uid"]): ev for ev in Calendar.from_ical(out.getvalue()).walk("VEVENT")}
+    return counts, events
+
+
+def test_sync(tmp_path):
+    snapshot = tmp_path / "courses.snapshot.json"
+    courses = parse_personal_courses_table(load("courses_table.html"), compact=True)
+
+    counts, events = sync(courses, snapshot)
+    assert counts["added"] == len(events) > 0
+    assert all(int(ev["sequence"]) == 0 for ev in events.values())
+
+    # 没有变化时不输出事件
+    counts, events = sync(courses, snapshot)
+    assert counts["added"] == counts["changed"] == counts["cancelled"] == 0
+    assert events == {}
+
+    # 换教室、删掉一门课
+    courses[0].location = "D1999"
+    removed = courses.pop()
+    counts, events = sync(courses, snapshot)
+    assert counts["changed"] >= 1 and counts["cancelled"] >= 1
+    changed = [ev for ev in events.values() if str(ev["location"]) == "D1999"]
+    assert changed and all(int(ev["sequence"]) == 1 for ev in changed)
+    cancelled = [ev for ev in events.values() if ev.get("status") == "CANCELLED"]
+    assert cancelled and all(str(ev["summary"]) == removed.identifier for ev in cancelled)
+
+    # 取消只通知一次，重新出现时 SEQUENCE 继续递增
+    counts, events = sync(courses, snapshot)
+    assert events == {}
+    courses.append(removed)
+    counts, events = sync(courses, snapshot)
+    assert [int(ev["sequence"]) for ev in events.values()] == [2] * len(events)
+
+
+def test_same_slot(tmp_path):
+    snapshot = tmp_path / "courses.snapshot.json"
+    first = parse_personal_courses_table(load("courses_table.html"), compact=True)[0]
+    # 同一课程、周次、节次，但地点和教师不同的两行
+    second = CourseRecord(**dict(first.dict(), location="D1999", teacher="李四"))
+    courses = [first, second, second]
+    weeks = len(first.week_schedule.split(","))
+
+    uids = [str(ev["uid"]) for ev in make_ical(courses, START).walk("VEVENT")]
+    assert len(uids) == len(set(uids)) == 2 * weeks
+    counts, events = sync(courses, snapshot)
+    assert counts["added"] == len(events) == 2 * weeks
+    assert {str(ev["location"]) for ev in events.values()} == {first.location, "D1999"}
+
+    # 去掉第二行只取消它的事件
+    counts, events = sync([first], snapshot)
+    assert counts["cancelled"] == weeks and counts["unchanged"] == weeks
+    assert all(str(ev["location"]) == "D1999" and ev["status"] == "CANCELLED" for ev in events.values())
@@ -0,0 +1,70 @@
+import json
+import threading
+
+from cli_cqu.batch import run_job
+from cli_cqu.util.trace import Tracer
+from cli_cqu.util.trace import current_tracer
+from cli_cqu.util.trace import recording
+from cli_cqu.util.trace import span
+from tests.test_app import FixtureAdapter
+from tests.test_app import offline_app
+
+
+def test_span_without_recording():
+    assert current_tracer() is None
+    with span("parse", "nothing") as sp:
+        sp.set(rows=1)
+
+
+def test_recording():
+    with recording() as tracer:
+        with span("http", "GET /a", url="/a") as sp:
+            sp.set(status=200, bytes=10)
+        with span("http", "GET /a"):
+            pass
+        try:
+            with span("parse", "broken"):
+                raise ValueError
+        except ValueError:
+            pass
+    assert current_tracer() is None
+    assert [s.name for s in tracer.spans] == ["GET /a", "GET /a", "broken"]
+    assert tracer.spans[0].args == {"url": "/a", "status": 200, "bytes": 10}
+    assert tracer.spans[2].args == {"error": "ValueError"}
+
+    summary = {(g["category"], g["name"]): g for g in tracer.summary()}
+    assert summary[("http", "GET /a")]["count"] == 2
+    assert summary[("http", "GET /a")]["bytes"] == 10
+    assert "GET /a" in tracer.summary_table()
+
+
+def test_chrome_trace(tmp_path):
+    with recording() as tracer:
+        threads = [threading.Thread(target=lambda: span("export", "x").__enter__().__exit__(None, None, None))
+                   for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    tracer.dump_chrome(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+    assert len(events) == 3
+    assert all(e["ph"] == "X" and e["ts"] >= 0 and e["dur"] >= 0 for e in events)
+
+
+def test_app_phases():
+    app = offline_app(FixtureAdapter())
+    with recording() as tracer:
+        app.courses_by_semester("all", workers=2)
+    names = [s.name for s in tracer.spans if s.category == "parse"]
+    assert names.count("personal_courses_table[lxml]") == 4
+    assert names.count("personal_courses") == 1
+
+
+def test_batch_profile():
+    result = run_job({"id": "x", "command": "courses-json", "profile": True})
+    assert not result["ok"]
+    assert result["profile"] == [] and result["spans"] == []
+    tracer = Tracer()
+    tracer.merge(result["spans"])
+    assert tracer.spans == []